@@ -0,0 +1,147 @@
+"""
+In-process audio ingest for Whisper
+Decodes uploads straight from memory into the float32, mono, 16 kHz NumPy
+array Whisper expects, so transcription needs no temp file and no ffmpeg
+process per request.
+
+- Raw 16 kHz little-endian PCM (audio/L16, audio/pcm, *.pcm) skips decoding
+- WAV is parsed with the standard library
+- webm/opus/ogg/mp3/m4a are decoded with PyAV (bundled FFmpeg libraries);
+  without PyAV they fall back to an ffmpeg process fed through pipes
+"""
+
+import io
+import subprocess
+import wave
+
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    av = None
+
+SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE
+
+PCM_MIME_TYPES = {'audio/l16', 'audio/pcm', 'audio/x-pcm', 'audio/raw'}
+
+
+class AudioDecodeError(ValueError):
+    """The upload could not be decoded as audio"""
+
+
+def is_raw_pcm(content_type=None, filename=None, declared_format=None):
+    """True when the client says the payload is raw 16 kHz s16le PCM"""
+    if declared_format and declared_format.lower() in ('pcm', 'pcm16', 's16le'):
+        return True
+    if content_type and content_type.split(';')[0].strip().lower() in PCM_MIME_TYPES:
+        return True
+    return bool(filename and filename.lower().endswith('.pcm'))
+
+
+def pcm16_to_float(data):
+    """s16le bytes -> float32 samples in [-1, 1]"""
+    if len(data) % 2:
+        data = data[:-1]
+    return np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def resample(samples, source_rate, target_rate=SAMPLE_RATE):
+    """Resample mono float32 audio (box-filtered linear interpolation)"""
+    if source_rate == target_rate or samples.size == 0:
+        return samples.astype(np.float32, copy=False)
+
+    if source_rate > target_rate:
+        # Crude low-pass before decimating to keep aliasing out of the speech band
+        width = int(round(source_rate / target_rate))
+        if width > 1:
+            samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode='same')
+
+    duration = samples.size / source_rate
+    target_size = int(round(duration * target_rate))
+    positions = np.linspace(0, samples.size - 1, target_size)
+    return np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+
+
+def _decode_wav(data):
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width * 8} bits")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return resample(samples, rate)
+
+
+def _decode_av(data):
+    resampler = av.AudioResampler(format='flt', layout='mono', rate=SAMPLE_RATE)
+    chunks = []
+    try:
+        with av.open(io.BytesIO(data), mode='r') as container:
+            if not container.streams.audio:
+                raise AudioDecodeError("No audio stream found")
+            for frame in container.decode(audio=0):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise AudioDecodeError(f"Could not decode audio: {e}")
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+
+def _decode_ffmpeg_pipe(data):
+    # Same command whisper.load_audio uses, but reading from stdin instead of a file
+    cmd = ['ffmpeg', '-nostdin', '-threads', '0', '-i', 'pipe:0',
+           '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-']
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise AudioDecodeError("Compressed audio needs PyAV (pip install av) or ffmpeg")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Could not decode audio: {e.stderr.decode(errors='replace')[-200:]}")
+    return pcm16_to_float(out)
+
+
+def decode_audio(data, content_type=None, filename=None, declared_format=None):
+    """
+    Decode an audio upload into Whisper's input format
+
+    Args:
+        data: Raw upload bytes
+        content_type: MIME type sent by the client (optional)
+        filename: Upload filename (optional)
+        declared_format: Explicit format hint, e.g. "pcm16" (optional)
+
+    Returns:
+        float32 mono NumPy array at 16 kHz
+    """
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+
+    if is_raw_pcm(content_type, filename, declared_format):
+        return pcm16_to_float(data)
+
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        try:
+            return _decode_wav(data)
+        except wave.Error:
+            pass  # e.g. float or extensible WAV: let FFmpeg handle it
+
+    if av is not None:
+        return _decode_av(data)
+    return _decode_ffmpeg_pipe(data)
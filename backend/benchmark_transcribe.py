@@ -0,0 +1,110 @@
+"""
+Hand2Voice - Long Recording Transcription Benchmark
+Compares wall-clock time of the sequential path (one Whisper job over the
+whole recording) with parallel chunked transcription.
+
+Usage:
+    python benchmark_transcribe.py                       # synthesized 3-minute clip
+    python benchmark_transcribe.py lecture.webm          # your own recording
+    python benchmark_transcribe.py --minutes 5 --workers 4 --model base
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from audio_ingest import SAMPLE_RATE, decode_audio
+from inference_pool import InferencePool
+import chunked_transcribe
+
+
+def synthesize_speech_like(minutes, seed=0):
+    """Noise 'phrases' of 2-6s separated by short pauses (timing only, not real words)"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < minutes * 60 * SAMPLE_RATE:
+        phrase = int(rng.uniform(2, 6) * SAMPLE_RATE)
+        t = np.arange(phrase) / SAMPLE_RATE
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)  # ~4 syllables per second
+        parts.append((rng.standard_normal(phrase) * 0.1 * envelope).astype(np.float32))
+        pause = int(rng.uniform(0.3, 0.8) * SAMPLE_RATE)
+        parts.append((rng.standard_normal(pause) * 0.002).astype(np.float32))
+        total += phrase + pause
+    return np.concatenate(parts)
+
+
+def start_pool(workers, threads, model):
+    """Start a transcription-only pool and wait until its workers are warm"""
+    pool = InferencePool(transcribe_workers=workers, torch_threads=threads, whisper_model=model)
+    pool.start()
+    warmup = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    for future in [pool.submit('transcribe', {'audio': warmup}) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def word_overlap(a, b):
+    """Share of words two transcripts have in common (sanity check)"""
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return len(a & b) / max(len(a | b), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='?', help='Recording to transcribe (default: synthesized)')
+    parser.add_argument('--minutes', type=float, default=3, help='Length of the synthesized clip')
+    parser.add_argument('--workers', type=int, default=max(2, (os.cpu_count() or 2) // 2),
+                        help='Worker processes for the chunked run')
+    parser.add_argument('--model', default=os.getenv('WHISPER_MODEL', 'base'))
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+
+    print("=" * 60)
+    print("🎙️  HAND2VOICE - LONG RECORDING TRANSCRIPTION BENCHMARK")
+    print("=" * 60)
+
+    if args.audio:
+        with open(args.audio, 'rb') as f:
+            audio = decode_audio(f.read(), filename=args.audio)
+    else:
+        audio = synthesize_speech_like(args.minutes)
+    seconds = len(audio) / SAMPLE_RATE
+    chunks = chunked_transcribe.split_at_silence(audio)
+    print(f"\n📼 Audio: {seconds:.0f}s, {len(chunks)} chunk(s), Whisper '{args.model}', {cores} cores")
+
+    # Current path: one job, Whisper walks the 30s windows sequentially
+    print("\n⏱️  Sequential (1 worker, all cores)...")
+    pool = start_pool(1, cores, args.model)
+    try:
+        start = time.perf_counter()
+        sequential = pool.run('transcribe', {'audio': audio})
+        sequential_time = time.perf_counter() - start
+    finally:
+        pool.stop()
+    print(f"   {sequential_time:.1f}s (RTF {sequential_time / seconds:.3f})")
+
+    threads = max(1, cores // args.workers)
+    print(f"\n⏱️  Chunked ({args.workers} workers x {threads} threads)...")
+    pool = start_pool(args.workers, threads, args.model)
+    try:
+        start = time.perf_counter()
+        chunked = chunked_transcribe.transcribe(pool, audio)
+        chunked_time = time.perf_counter() - start
+    finally:
+        pool.stop()
+    print(f"   {chunked_time:.1f}s (RTF {chunked_time / seconds:.3f})")
+
+    print("\n" + "=" * 60)
+    print(f"🚀 Speedup: {sequential_time / chunked_time:.2f}x")
+    print(f"📝 Word overlap with the sequential transcript: "
+          f"{word_overlap(sequential['text'], chunked['text']):.0%}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
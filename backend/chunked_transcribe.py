@@ -0,0 +1,217 @@
+"""
+Parallel chunked transcription for long recordings
+Whisper works through long audio one 30-second window after another, so a
+single request's latency grows with the recording. Here long audio is cut at
+pauses into chunks of about one Whisper window. The chunks are transcribed
+as separate jobs, so the inference pool spreads them over its workers, and
+the texts are stitched back together.
+
+Cuts land on the latest pause in each search window. Where there is no
+real pause, the next chunk starts OVERLAP seconds early, and the words
+transcribed twice are removed when stitching.
+
+With a deadline, decoding stops between chunks: chunks still queued when it
+passes are dropped, and the text of the chunks finished in order so far
+comes back as a partial transcript.
+"""
+
+import re
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from audio_ingest import SAMPLE_RATE
+from inference_pool import DeadlineExceededError, DEADLINE_GRACE
+
+CHUNK_THRESHOLD = 45.0  # seconds; shorter audio is transcribed in one job
+TARGET_CHUNK = 28.0     # preferred chunk length (a Whisper window is 30s)
+MIN_CHUNK = 15.0        # earliest point in a chunk to look for a cut
+OVERLAP = 1.0           # seconds shared by chunks cut without a pause
+FRAME = 0.03            # energy frame length in seconds
+SMOOTHING = 0.3         # seconds of energy averaged when looking for a pause
+SILENCE_RATIO = 0.15    # a pause is quieter than this fraction of the median energy
+MAX_OVERLAP_WORDS = 8   # boundary words compared when stitching
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def frame_energy(audio, sample_rate=SAMPLE_RATE):
+    """RMS energy per FRAME-second frame"""
+    size = max(int(FRAME * sample_rate), 1)
+    count = len(audio) // size
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:count * size].reshape(count, size)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def split_at_silence(audio, sample_rate=SAMPLE_RATE):
+    """
+    Plan chunk boundaries
+
+    Args:
+        audio: float32 mono samples
+        sample_rate: Sample rate of the audio
+
+    Returns:
+        List of (start, end) sample offsets; consecutive chunks overlap where
+        no pause was found
+    """
+    total = len(audio)
+    if total <= CHUNK_THRESHOLD * sample_rate:
+        return [(0, total)]
+
+    energy = frame_energy(audio, sample_rate)
+    window = max(int(SMOOTHING / FRAME), 1)
+    smoothed = np.convolve(energy, np.ones(window) / window, mode='same')
+    silence = np.median(energy) * SILENCE_RATIO
+    frame_size = int(FRAME * sample_rate)
+
+    chunks = []
+    start = 0
+    while total - start > TARGET_CHUNK * sample_rate:
+        low = (start + int(MIN_CHUNK * sample_rate)) // frame_size
+        high = (start + int(TARGET_CHUNK * sample_rate)) // frame_size
+        pauses = np.nonzero(smoothed[low:high] <= silence)[0]
+        # The latest pause keeps chunks long; without one, the quietest point
+        cut_frame = low + int(pauses[-1] if len(pauses) else np.argmin(smoothed[low:high]))
+        cut = cut_frame * frame_size + frame_size // 2
+
+        chunks.append((start, cut))
+        if len(pauses):
+            start = cut
+        else:
+            # Forced cut mid-speech: re-read the last second in the next chunk
+            start = cut - int(OVERLAP * sample_rate)
+
+    chunks.append((start, total))
+    return chunks
+
+
+def _words(text):
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def stitch(texts, overlaps=None):
+    """
+    Join chunk transcripts, dropping words repeated across a boundary
+
+    At boundaries that overlap, the longest run of words that ends the
+    previous text and begins the next one (allowing a couple of leading
+    fragment words) is kept only once.
+
+    Args:
+        texts: Chunk transcripts in order
+        overlaps: overlaps[i] is True when chunk i + 1 re-reads the end of
+                  chunk i (default: every boundary)
+    """
+    result = []
+    for index, text in enumerate(texts):
+        tokens = text.split()
+        if not tokens:
+            continue
+        if result and (overlaps is None or overlaps[index - 1]):
+            previous = _words(' '.join(result[-MAX_OVERLAP_WORDS:]))
+            normalized = [' '.join(_words(t)) for t in tokens[:MAX_OVERLAP_WORDS + 2]]
+            drop = 0
+            for size in range(min(MAX_OVERLAP_WORDS, len(previous)), 0, -1):
+                tail = previous[-size:]
+                for skip in range(3):
+                    if normalized[skip:skip + size] == tail:
+                        drop = skip + size
+                        break
+                if drop:
+                    break
+            tokens = tokens[drop:]
+        result.extend(tokens)
+    return ' '.join(result)
+
+
+def plan(audio, sample_rate=SAMPLE_RATE):
+    """
+    Split audio into transcribe jobs
+
+    Returns:
+        (payloads, combine) where combine merges the per-chunk results, in
+        payload order, into {'text': ..., 'chunks': n}
+    """
+    chunks = split_at_silence(audio, sample_rate)
+    payloads = [{'audio': np.ascontiguousarray(audio[start:end])} for start, end in chunks]
+    overlaps = [following[0] < current[1] for current, following in zip(chunks, chunks[1:])]
+
+    def combine(results):
+        # results may be a leading subset of the chunks (a partial transcript)
+        texts = [r['text'].strip() for r in results]
+        return {'text': stitch(texts, overlaps), 'chunks': len(results)}
+
+    return payloads, combine
+
+
+class Transcription:
+    """Handle for a transcription running on the pool"""
+
+    def __init__(self, futures, combine, deadline=None):
+        self.futures = futures
+        self.deadline = deadline
+        self._combine = combine
+
+    def result(self, timeout=None):
+        """
+        Wait for all chunks; {'text': ..., 'chunks': n}
+
+        Past the deadline, returns the chunks finished in order so far with
+        'partial': True, or raises DeadlineExceededError if there are none.
+        Without a deadline, timeout bounds the wait for the whole transcript
+        (TimeoutError; the chunks not yet running are dropped).
+        """
+        if self.deadline is not None:
+            return self._partial_result()
+        end = time.monotonic() + timeout if timeout is not None else None
+        try:
+            return self._combine([future.result(None if end is None else max(end - time.monotonic(), 0))
+                                  for future in self.futures])
+        except BaseException:
+            self.cancel()
+            raise
+
+    def _partial_result(self):
+        wait(self.futures, timeout=max(self.deadline - time.monotonic(), 0) + DEADLINE_GRACE)
+        results = []
+        for future in self.futures:
+            if not future.done() or future.cancelled() or future.exception() is not None:
+                break
+            results.append(future.result())
+
+        if len(results) == len(self.futures):
+            return self._combine(results)
+        self.cancel()
+        if not results:
+            error = next((f.exception() for f in self.futures
+                          if f.done() and not f.cancelled() and f.exception() is not None), None)
+            if error is not None and not isinstance(error, TimeoutError):
+                raise error
+            raise DeadlineExceededError("Deadline exceeded before any audio was transcribed")
+        return dict(self._combine(results), partial=True, total_chunks=len(self.futures))
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+def submit(pool, audio, priority=None, deadline=None):
+    """Start transcribing audio on the inference pool, in parallel chunks when it is long"""
+    payloads, combine = plan(audio)
+    return Transcription([pool.submit('transcribe', payload, priority, deadline) for payload in payloads],
+                         combine, deadline)
+
+
+def transcribe(pool, audio, timeout=None, priority=None, deadline=None):
+    """
+    Transcribe audio on the inference pool, in parallel chunks when it is long
+
+    Returns:
+        {'text': ..., 'chunks': n}, plus 'partial': True and 'total_chunks'
+        when the deadline cut the transcript short
+    """
+    return submit(pool, audio, priority, deadline).result(timeout)
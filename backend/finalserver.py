@@ -1,46 +1,148 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import json
+import logging
+import math
 import os
 from datetime import datetime
 import hashlib
-import whisper
-from vision.vision_engine import VisualAssistant
+import hmac
+import signal
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import wraps
+import memory_probe
+import profiling
+import traffic_capture
+from profiling import profiled, PROFILE_HEADER
+from structured_logging import setup_logging, init_app, get_logger, log_event, REQUEST_ID_HEADER
+
+# ==================== SERVER ROLES ====================
+# SERVER_ROLES picks the services this node runs, e.g. "auth,history" for a
+# node that needs neither Whisper nor the vision stack. Only the modules the
+# enabled roles need are imported; other routes answer 503.
+ALL_ROLES = ('auth', 'history', 'vision', 'speech')
+ROLES = {role.strip().lower() for role in os.getenv('SERVER_ROLES', ','.join(ALL_ROLES)).split(',')
+         if role.strip()}
+if ROLES - set(ALL_ROLES):
+    raise ValueError(f"Unknown SERVER_ROLES: {', '.join(sorted(ROLES - set(ALL_ROLES)))} "
+                     f"(choose from {', '.join(ALL_ROLES)})")
+
+if 'history' in ROLES:
+    from history_index import HistoryIndex
+    from history_store import HistoryArchive, IdempotencyKeys
+if 'vision' in ROLES:
+    from vision.vision_engine import VisualAssistant
+    from vision.frame_quality import (select_best, score_frame, assess_frame, decode_image,
+                                      public_scores)
+    from vision import scene_memory
+if 'speech' in ROLES:
+    from audio_ingest import decode_audio, is_raw_pcm, AudioDecodeError, SAMPLE_RATE
+    import chunked_transcribe
+if {'vision', 'speech'} <= ROLES:
+    from voice_commands import route_command
+if ROLES & {'vision', 'speech'}:
+    from inference_pool import InferencePool, priority_class, DEADLINE_GRACE
+    from jobs import JobManager
+    from model_swap import ModelSwapper, SwapInProgressError
+
+PRIORITY_HEADER = 'X-Priority'  # priority class of an inference request (see inference_pool.py)
+DEADLINE_HEADER = 'X-Deadline-Ms'  # how long the client will wait for the response, in ms
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'  # must match ADMIN_TOKEN for /api/admin/* endpoints
+CLIENT_ID_HEADER = 'X-Client-ID'  # client identity owning async jobs (see jobs.py)
 
 app = Flask(__name__)
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:3000", "http://localhost:3001"],
         "methods": ["GET", "POST"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", REQUEST_ID_HEADER, PROFILE_HEADER, PRIORITY_HEADER,
+                          DEADLINE_HEADER, CLIENT_ID_HEADER],
+        "expose_headers": [REQUEST_ID_HEADER]
     }
 })
 
+setup_logging()
+init_app(app)
+logger = get_logger('server')
+capture = traffic_capture.init_app(app)  # None unless TRAFFIC_CAPTURE=1
+memory = memory_probe.init_app(app)  # None unless MEMORY_PROBE=1
+
 # ==================== FILE STORAGE ====================
 USERS_FILE = 'users.json'
 HISTORY_FILE = 'history.json'
+IDEMPOTENCY_FILE = 'idempotency_keys.json'
+HISTORY_LIMIT = 100
+MAX_BATCH_ENTRIES = 500
+MAX_SEARCH_RESULTS = 50
+MAX_PAGE_SIZE = 100
+MAX_BURST_FRAMES = 5
+MAX_BATCH_IMAGES = 10
+BATCH_PARALLELISM = 4  # concurrent analyses per batch request when fanning out
+MAX_JOB_WAIT = 30  # longest long-poll, in seconds
+JOB_HEARTBEAT = 15  # seconds between SSE keep-alives
+ASK_TIMEOUT = 60  # seconds /api/ask waits for each inference step when the client sets no deadline
 
-# ==================== LOAD MODELS AT STARTUP ====================
-print("=" * 60)
-print("Loading AI Models...")
-print("=" * 60)
-
-# Load Vision Assistant
-print("Loading Vision Assistant...")
-vision_assistant = VisualAssistant()
-print("Vision Assistant ready!")
+# Serializes load -> modify -> save cycles on the history file
+history_lock = threading.Lock()
 
-# Load Whisper model
-print("Loading Whisper model...")
-whisper_model = whisper.load_model("base")
-print("Whisper model ready!")
+# ==================== LOAD MODELS AT STARTUP ====================
+vision_assistant = None
+inference = None
+jobs = None
+scenes = None
+swapper = None
 
-print("=" * 60)
-print("All models loaded successfully!")
-print("=" * 60)
+if ROLES & {'vision', 'speech'}:
+    print("=" * 60)
+    print("Loading AI Models...")
+    print("=" * 60)
+    
+    if 'vision' in ROLES:
+        # Load Vision Assistant
+        print("Loading Vision Assistant...")
+        vision_assistant = VisualAssistant()
+        print("Vision Assistant ready!")
+        
+        # Last described frame per session for the "changes" mode
+        scenes = scene_memory.SceneMemory()
+    
+    # Inference runs in a worker pool; Whisper loads in the worker processes
+    # when the pool starts (see inference_pool.py for the settings)
+    inference = InferencePool.from_env(vision=vision_assistant, speech='speech' in ROLES)
+    if 'speech' in ROLES:
+        print(f"Inference pool: {inference.transcribe_workers} transcription worker(s), "
+              f"{inference.torch_threads} torch thread(s) each, Whisper '{inference.whisper_model}'")
+    
+    # Async job API on top of the pool (results kept for JOB_RESULT_TTL seconds)
+    jobs = JobManager(inference)
+    
+    # Hot model swaps (POST /api/admin/models or SIGHUP)
+    swapper = ModelSwapper(inference, vision_assistant)
+    
+    print("=" * 60)
 
 # ==================== HELPER FUNCTIONS ====================
 
+def requires_role(*roles):
+    """Answer 503 unless one of the roles is enabled on this server"""
+    def decorator(view):
+        if ROLES & set(roles):
+            return view
+        
+        @wraps(view)
+        def disabled(*args, **kwargs):
+            # Let preflights through so browsers see the JSON error
+            if request.method == 'OPTIONS':
+                return '', 204
+            return jsonify({
+                'success': False,
+                'error': f"The {' / '.join(roles)} service is not enabled on this server"
+            }), 503
+        return disabled
+    return decorator
+
 def hash_password(password):
     """Simple password hashing (use bcrypt or similar in production!)"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -70,12 +172,161 @@ def load_history():
 
 def save_history(history_data):
     """Save history for all users"""
-    with open(HISTORY_FILE, 'w') as f:
+    # Write to a temp file and swap it in so a crash never leaves a half-written file
+    temp_file = HISTORY_FILE + '.tmp'
+    with open(temp_file, 'w') as f:
         json.dump(history_data, f, indent=2)
+    os.replace(temp_file, HISTORY_FILE)
+
+def valid_timestamp(value):
+    """True for an ISO 8601 date or datetime string (what search and the archive compare)"""
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def insert_history_entry(history_data, email, entry, pending, idempotency_key=None):
+    """
+    Insert an entry at the top of a user's history, enforcing the entry cap
+    
+    Only history_data and the archive change here: the idempotency key and
+    the search index are updated by commit_history() once history.json has
+    been saved, so a failed save leaves nothing that claims the entry exists.
+    
+    Args:
+        history_data: Full history dict as returned by load_history()
+        email: Normalized user email
+        entry: History entry dict (timestamp must already be set)
+        pending: List collecting the inserts for commit_history()
+        idempotency_key: Optional key; an entry with the same key is not added
+            again while the key is remembered (IDEMPOTENCY_TTL_HOURS), even
+            after the entry has been archived
+        
+    Returns:
+        True if the entry was added, False if it was a duplicate
+    """
+    user_history = history_data.setdefault(email, [])
+    
+    if idempotency_key:
+        if idempotency_keys.seen(email, idempotency_key):
+            return False
+        if any(p_email == email and p_key == idempotency_key for p_email, _, p_key, _ in pending):
+            return False
+    
+    user_history.insert(0, entry)  # Add to beginning
+    
+    # Keep the last HISTORY_LIMIT entries hot; older ones move to the archive.
+    # The archive is written first, so a crash can duplicate an entry but never lose it.
+    overflow = user_history[HISTORY_LIMIT:]
+    if overflow:
+        history_archive.append(email, overflow)
+        del user_history[HISTORY_LIMIT:]
+    pending.append((email, entry, idempotency_key, overflow))
+    return True
+
+def commit_history(history_data, pending):
+    """
+    Save history.json, then remember the inserts' keys and index their entries
+    
+    Only the hot tier is indexed here; searches index archive segments as they reach them.
+    """
+    save_history(history_data)
+    for email, entry, key, overflow in pending:
+        search_index.add(email, entry)
+        search_index.remove(email, overflow)
+        if key:
+            idempotency_keys.add(email, key)
+    idempotency_keys.save()  # after the entries, so a crash can't drop one yet keep its key
+
+def request_priority(default=None):
+    """
+    Priority class asked for by the client ("emergency", "command", ...)
+    
+    Read from the 'priority' form field or the X-Priority header; unknown
+    values fall back to default (None lets the pool decide by job kind).
+    """
+    return priority_class(request.form.get('priority') or request.headers.get(PRIORITY_HEADER),
+                          default)
+
+def request_deadline():
+    """
+    Deadline of the request as a time.monotonic() value, or None
+    
+    Read from the 'deadline_ms' form field or the X-Deadline-Ms header: how
+    many milliseconds the client waits, counted from the request's arrival.
+    Queued inference past the deadline is dropped and upstream calls are
+    cut off there.
+    """
+    value = request.form.get('deadline_ms') or request.headers.get(DEADLINE_HEADER)
+    try:
+        budget = max(float(value), 0) / 1000
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(budget):
+        return None
+    waited = time.perf_counter() - g.get('request_start', time.perf_counter())
+    return time.monotonic() - waited + budget
+
+def job_owner():
+    """
+    Client identity async jobs are tied to, or None
+    
+    Read from the X-Client-ID header or the 'session_id' field. A job
+    submitted with an owner can only be read, streamed or cancelled by a
+    request carrying the same identity.
+    """
+    return (request.headers.get(CLIENT_ID_HEADER) or request.form.get('session_id')
+            or request.args.get('session_id') or None)
+
+def deadline_exceeded(error):
+    """504 for a request whose deadline passed before a result was ready"""
+    log_event(logger, 'request.deadline_exceeded', path=request.path, error=str(error))
+    return jsonify({
+        'success': False,
+        'error': str(error) or 'Deadline exceeded'
+    }), 504
+
+def requires_admin(view):
+    """Answer 403 unless the request carries the ADMIN_TOKEN (unset: admin endpoints are off)"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        token = os.getenv('ADMIN_TOKEN')
+        given = request.headers.get(ADMIN_TOKEN_HEADER, '')
+        if not token or not hmac.compare_digest(given.encode(), token.encode()):
+            return jsonify({
+                'success': False,
+                'error': 'Admin token required' if token else 'Admin endpoints are disabled (set ADMIN_TOKEN)'
+            }), 403
+        return view(*args, **kwargs)
+    return guarded
+
+def retention_days(email):
+    """Archive retention for a user: users.json override, else HISTORY_RETENTION_DAYS"""
+    user = load_users().get(email) or {}
+    try:
+        return int(user.get('history_retention_days', os.getenv('HISTORY_RETENTION_DAYS', 0)))
+    except (TypeError, ValueError):
+        return 0
+
+if 'history' in ROLES:
+    # Older history lives in compressed monthly archive segments
+    history_archive = HistoryArchive(retention_days=retention_days)
+    
+    # Keys of entries already added, so retried uploads are not applied twice
+    idempotency_keys = IdempotencyKeys(IDEMPOTENCY_FILE)
+    
+    # Search index over the hot tier, kept up to date by the history endpoints;
+    # archive segments are indexed on first search and cached until they change
+    search_index = HistoryIndex(read_segment=history_archive.read_segment)
+    search_index.build(load_history())
 
 # ==================== AUTH ENDPOINTS ====================
 
 @app.route('/api/auth/signup', methods=['POST'])
+@requires_role('auth')
 def signup():
     try:
         data = request.json
@@ -104,10 +355,16 @@ def signup():
         }
         save_users(users)
         
-        # Initialize empty history for new user
-        history_data = load_history()
-        history_data[email] = []
-        save_history(history_data)
+        # Initialize empty history for new user (on nodes that serve history)
+        if 'history' in ROLES:
+            with history_lock:
+                history_data = load_history()
+                history_data[email] = []
+                save_history(history_data)
+                search_index.clear(email, archived=history_archive.segments(email))
+                history_archive.clear(email)
+                idempotency_keys.clear(email)
+                idempotency_keys.save()
         
         # Return user without password
         user_response = {
@@ -119,10 +376,11 @@ def signup():
         return jsonify({'success': True, 'user': user_response})
     
     except Exception as e:
-        print(f"Signup error: {str(e)}")
+        logger.exception("Signup error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 @app.route('/api/auth/login', methods=['POST'])
+@requires_role('auth')
 def login():
     try:
         data = request.json
@@ -155,10 +413,11 @@ def login():
         return jsonify({'success': True, 'user': user_response})
     
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.exception("Login error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 @app.route('/api/auth/update-profile', methods=['POST'])
+@requires_role('auth')
 def update_profile():
     try:
         data = request.json
@@ -179,26 +438,47 @@ def update_profile():
             users[email]['name'] = data['name']
         if 'disabilities' in data:
             users[email]['disabilities'] = data['disabilities']
+        if 'history_retention_days' in data:
+            # Days archived history is kept; 0 keeps it forever, null falls back to HISTORY_RETENTION_DAYS
+            days = data['history_retention_days']
+            if days is None:
+                users[email].pop('history_retention_days', None)
+            elif isinstance(days, int) and not isinstance(days, bool) and days >= 0:
+                users[email]['history_retention_days'] = days
+            else:
+                return jsonify({'success': False, 'error': 'Invalid history_retention_days'}), 400
         
         save_users(users)
         
+        if 'history_retention_days' in data and 'history' in ROLES:
+            # Apply a shorter period now instead of at the next daily check
+            history_archive.prune(email, force=True)
+        
         user_response = {
             'name': users[email]['name'],
             'email': users[email]['email'],
-            'disabilities': users[email]['disabilities']
+            'disabilities': users[email]['disabilities'],
+            'history_retention_days': users[email].get('history_retention_days')
         }
         
         return jsonify({'success': True, 'user': user_response})
     
     except Exception as e:
-        print(f"Update profile error: {str(e)}")
+        logger.exception("Update profile error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 # ==================== HISTORY ENDPOINTS ====================
 
 @app.route('/api/history/get', methods=['POST'])
+@requires_role('history')
 def get_history():
-    """Get history for a specific user"""
+    """
+    Get history for a specific user
+    
+    Without "limit" this returns the recent (hot) entries as before. With
+    "offset"/"limit" it pages through the full history, newest first,
+    reading archived entries only when the page reaches past the hot tier.
+    """
     try:
         data = request.json
         
@@ -211,13 +491,39 @@ def get_history():
         history_data = load_history()
         user_history = history_data.get(email, [])
         
-        return jsonify({'success': True, 'history': user_history})
+        if data.get('limit') is None:
+            return jsonify({
+                'success': True,
+                'history': user_history,
+                'has_more': bool(history_archive.segments(email))
+            })
+        
+        try:
+            offset = max(int(data.get('offset') or 0), 0)
+            limit = min(max(int(data['limit']), 1), MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Invalid offset or limit'}), 400
+        
+        page = user_history[offset:offset + limit]
+        has_more = offset + limit < len(user_history) or bool(history_archive.segments(email))
+        if len(page) < limit:
+            archived, has_more = history_archive.page(
+                email, max(offset - len(user_history), 0), limit - len(page))
+            page += archived
+        
+        return jsonify({
+            'success': True,
+            'history': page,
+            'offset': offset,
+            'has_more': has_more
+        })
     
     except Exception as e:
-        print(f"Get history error: {str(e)}")
+        logger.exception("Get history error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 @app.route('/api/history/add', methods=['POST'])
+@requires_role('history')
 def add_history():
     """Add a new history entry for a user"""
     try:
@@ -232,34 +538,156 @@ def add_history():
         # Normalize email to lowercase
         email = data['email'].lower().strip()
         
-        history_data = load_history()
-        
-        # Initialize user history if doesn't exist
-        if email not in history_data:
-            history_data[email] = []
-        
         # Add the new entry
         history_entry = data['entry']
         history_entry['timestamp'] = datetime.now().isoformat()
         
-        history_data[email].insert(0, history_entry)  # Add to beginning
-        
-        # Keep only last 100 entries per user
-        history_data[email] = history_data[email][:100]
-        
-        save_history(history_data)
+        with history_lock:
+            history_data = load_history()
+            pending = []
+            added = insert_history_entry(history_data, email, history_entry, pending,
+                                         data.get('idempotency_key'))
+            if added:
+                commit_history(history_data, pending)
         
         return jsonify({
             'success': True, 
-            'message': 'History entry added',
+            'message': 'History entry added' if added else 'Duplicate entry ignored',
             'history': history_data[email]
         })
     
     except Exception as e:
-        print(f"Add history error: {str(e)}")
+        logger.exception("Add history error")
+        return jsonify({'success': False, 'error': 'Server error occurred'}), 500
+
+@app.route('/api/history/add-batch', methods=['POST'])
+@requires_role('history')
+def add_history_batch():
+    """
+    Add many history entries, possibly for several users, in one load/save cycle.
+    
+    Body: {"batch_id": optional, "entries": [{"email", "entry", "idempotency_key"}]}
+    Entries are applied in the order given, so the last one ends up newest.
+    The batch is all-or-nothing: one invalid item rejects the whole request.
+    """
+    try:
+        data = request.json or {}
+        items = data.get('entries')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': 'Entries required'}), 400
+        
+        if len(items) > MAX_BATCH_ENTRIES:
+            return jsonify({
+                'success': False,
+                'error': f'Too many entries (max {MAX_BATCH_ENTRIES})'
+            }), 400
+        
+        batch_id = data.get('batch_id')
+        now = datetime.now().isoformat()
+        prepared = []
+        
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('email') or not isinstance(item.get('entry'), dict):
+                return jsonify({
+                    'success': False,
+                    'error': f'Entry {index} needs an email and an entry object'
+                }), 400
+            
+            entry = dict(item['entry'])
+            # Replayed offline entries keep the time they were recorded on the client
+            entry['timestamp'] = entry.get('timestamp') or now
+            if not valid_timestamp(entry['timestamp']):
+                return jsonify({
+                    'success': False,
+                    'error': f'Entry {index} has an invalid timestamp (expected ISO 8601)'
+                }), 400
+            
+            key = item.get('idempotency_key')
+            if not key and batch_id:
+                key = f"{batch_id}:{index}"
+            
+            prepared.append((item['email'].lower().strip(), entry, key))
+        
+        results = []
+        counts = {}
+        
+        with history_lock:
+            history_data = load_history()
+            pending = []
+            
+            for index, (email, entry, key) in enumerate(prepared):
+                added = insert_history_entry(history_data, email, entry, pending, key)
+                results.append({
+                    'index': index,
+                    'email': email,
+                    'status': 'added' if added else 'duplicate'
+                })
+                counts[email] = counts.get(email, 0) + (1 if added else 0)
+            
+            if pending:
+                commit_history(history_data, pending)
+        
+        added_total = sum(counts.values())
+        
+        return jsonify({
+            'success': True,
+            'added': added_total,
+            'duplicates': len(results) - added_total,
+            'results': results,
+            'users': {email: {'added': n, 'total': len(history_data.get(email, []))}
+                      for email, n in counts.items()}
+        })
+    
+    except Exception as e:
+        logger.exception("Add history batch error")
+        return jsonify({'success': False, 'error': 'Server error occurred'}), 500
+
+@app.route('/api/history/search', methods=['POST'])
+@requires_role('history')
+def search_history():
+    """
+    Search a user's history
+    
+    Body: {"email", "query", "mode", "type", "date_from", "date_to", "limit"}
+    Results are ranked by relevance (newest first when the query is empty)
+    and carry a snippet around the matching words. Hot entries come from the
+    in-memory index; archive segments in the date range are indexed on first
+    search and reused until they are appended to or pruned.
+    """
+    try:
+        data = request.json or {}
+        
+        if not data.get('email'):
+            return jsonify({'success': False, 'error': 'Email required'}), 400
+        
+        # Normalize email to lowercase
+        email = data['email'].lower().strip()
+        
+        try:
+            limit = min(max(int(data.get('limit') or 10), 1), MAX_SEARCH_RESULTS)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+        
+        results, total = search_index.search(
+            email,
+            query=data.get('query') or '',
+            mode=data.get('mode'),
+            entry_type=data.get('type'),
+            date_from=data.get('date_from'),
+            date_to=data.get('date_to'),
+            limit=limit,
+            archived=history_archive.segments_between(email, data.get('date_from'), data.get('date_to'))
+        )
+        
+        return jsonify({'success': True, 'results': results, 'total': total})
+    
+    except Exception as e:
+        logger.exception("Search history error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 @app.route('/api/history/clear', methods=['POST'])
+@requires_role('history')
 def clear_history():
     """Clear all history for a user"""
     try:
@@ -271,19 +699,108 @@ def clear_history():
         # Normalize email to lowercase
         email = data['email'].lower().strip()
         
-        history_data = load_history()
-        history_data[email] = []
-        save_history(history_data)
+        with history_lock:
+            history_data = load_history()
+            history_data[email] = []
+            save_history(history_data)
+            search_index.clear(email, archived=history_archive.segments(email))
+            history_archive.clear(email)
         
         return jsonify({'success': True, 'message': 'History cleared'})
     
     except Exception as e:
-        print(f"Clear history error: {str(e)}")
+        logger.exception("Clear history error")
         return jsonify({'success': False, 'error': 'Server error occurred'}), 500
 
 # ==================== VISION ANALYSIS ENDPOINTS ====================
 
+def prepare_analysis():
+    """
+    Read the uploaded frame burst and pick the best frame
+    
+    Returns:
+        (analysis, None) with mode/image/scores/hint, or (None, error message)
+    """
+    if 'image' not in request.files:
+        return None, 'No image provided'
+    
+    mode = request.form.get('mode', 'general')
+    # Clients may send a short burst of frames; the best one is analyzed
+    image_files = request.files.getlist('image')[:MAX_BURST_FRAMES]
+    
+    log_event(logger, 'analyze.received', level=logging.DEBUG,
+              mode=mode, frames=len(image_files))
+    
+    images = [f.read() for f in image_files]
+    frames = [decode_image(data) for data in images]
+    if any(frame is None for frame in frames):
+        return None, 'Invalid image data'
+    
+    best_index, scores = select_best(frames)
+    
+    return {
+        'mode': mode,
+        'image': images[best_index],
+        'frame': frames[best_index],
+        'scores': scores,
+        # Hopeless frames get an instant hint instead of a remote call
+        'hint': assess_frame(scores)
+    }, None
+
+def narrate_changes(analysis, session_id, deadline=None):
+    """
+    "changes" mode: describe only what changed since the session's last narration
+    
+    The first frame of a session (or after the camera moved to a new scene)
+    gets a full description. Later frames are compared locally: an unchanged
+    scene is answered at once, otherwise only the changed region is sent,
+    with the earlier description as context.
+    
+    Returns:
+        Response fields: description, changed, new_scene, change_fraction
+    """
+    gray = scene_memory.change_gray(analysis['frame'])
+    scene = scenes.get(session_id)
+    change = scene_memory.detect_change(scene['gray'], gray) if scene else None
+    
+    if change is None or change['fraction'] >= scene_memory.NEW_SCENE_FRACTION:
+        description = inference.run('analyze', {'image': analysis['image'], 'mode': 'general'},
+                                    priority=request_priority(), deadline=deadline)
+        scenes.remember(session_id, gray, description=description)
+        return {
+            'description': description,
+            'changed': True,
+            'new_scene': True,
+            'change_fraction': change['fraction'] if change else None
+        }
+    
+    if change['fraction'] < scene_memory.NO_CHANGE_FRACTION:
+        # The stored frame is kept, so slow changes still add up
+        scenes.unchanged()
+        return {
+            'description': scene_memory.NO_CHANGE_TEXT,
+            'changed': False,
+            'new_scene': False,
+            'change_fraction': change['fraction']
+        }
+    
+    region, cropped = scene_memory.crop_changed(analysis['frame'], change['box'])
+    description = inference.run('analyze_changes', {
+        'image': region,
+        'context': scene_memory.SceneMemory.context(scene)
+    }, priority=request_priority(), deadline=deadline)
+    scenes.remember(session_id, gray, change=description)
+    return {
+        'description': description,
+        'changed': True,
+        'new_scene': False,
+        'cropped': cropped,
+        'change_fraction': change['fraction']
+    }
+
 @app.route('/api/analyze', methods=['POST', 'OPTIONS'])
+@requires_role('vision')
+@profiled
 def analyze_image():
     """Analyze image using Vision Assistant"""
     # Handle preflight request
@@ -291,45 +808,241 @@ def analyze_image():
         return '', 204
     
     try:
-        if 'image' not in request.files:
+        deadline = request_deadline()
+        analysis, error = prepare_analysis()
+        if error:
             return jsonify({
                 'success': False, 
-                'error': 'No image provided'
+                'error': error
             }), 400
         
-        mode = request.form.get('mode', 'general')
-        image_file = request.files['image']
-        
-        print(f"Received image for analysis (mode: {mode})")
-        
-        # Save temporarily
-        temp_path = 'temp_capture.jpg'
-        image_file.save(temp_path)
+        mode, scores = analysis['mode'], analysis['scores']
+        if analysis['hint']:
+            return jsonify({
+                'success': True,
+                'description': analysis['hint'],
+                'mode': mode,
+                'skipped': True,
+                'quality': public_scores(scores)
+            })
         
-        # Analyze using the vision assistant
-        result = vision_assistant.analyze_image(temp_path, mode=mode)
+        if mode == 'changes':
+            session_id = request.form.get('session_id')
+            if not session_id:
+                return jsonify({
+                    'success': False,
+                    'error': "session_id is required for 'changes' mode"
+                }), 400
+            start = time.perf_counter()
+            narration = narrate_changes(analysis, session_id, deadline)
+            log_event(logger, 'analyze.changes',
+                      duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                      changed=narration['changed'], new_scene=narration['new_scene'],
+                      change_fraction=narration['change_fraction'])
+            return jsonify(dict(narration, success=True, mode=mode, quality=public_scores(scores)))
         
-        # Clean up
-        os.remove(temp_path)
+        # Analyze the chosen upload straight from memory
+        start = time.perf_counter()
+        result = inference.run('analyze', {'image': analysis['image'], 'mode': mode},
+                               priority=request_priority(), deadline=deadline)
         
-        print(f"Analysis complete: {result[:100]}...")
+        log_event(logger, 'analyze.done', mode=mode,
+                  duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                  result_chars=len(result))
         
         return jsonify({
             'success': True,
             'description': result,
-            'mode': mode
+            'mode': mode,
+            'quality': public_scores(scores)
         })
     
+    except TimeoutError as e:
+        return deadline_exceeded(e)
     except Exception as e:
-        print(f"Error during analysis: {str(e)}")
+        logger.exception("Error during analysis")
         return jsonify({
             'success': False, 
             'error': str(e)
         }), 500
 
+@app.route('/api/analyze/batch', methods=['POST', 'OPTIONS'])
+@requires_role('vision')
+@profiled
+def analyze_batch():
+    """
+    Analyze several images (a sweep of a room, a row of labels) in one call
+    
+    Form fields: image (repeated, up to MAX_BATCH_IMAGES), mode,
+    strategy ("parallel": one analysis per image, at most BATCH_PARALLELISM
+    at a time; "single": all images in one multimodal request) and
+    summary ("true" adds a merged summary). Hazard checks always run per
+    image so every frame gets its own hazard level. Past the request
+    deadline, the images analyzed so far come back with 'partial': true.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        image_files = request.files.getlist('image')
+        if not image_files:
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
+        if len(image_files) > MAX_BATCH_IMAGES:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_IMAGES} images per batch'
+            }), 400
+        
+        mode = request.form.get('mode', 'general')
+        strategy = request.form.get('strategy', 'parallel')
+        if strategy not in ('parallel', 'single'):
+            return jsonify({'success': False, 'error': "strategy must be 'parallel' or 'single'"}), 400
+        if mode == 'hazard':
+            strategy = 'parallel'
+        want_summary = request.form.get('summary', '').lower() in ('1', 'true', 'yes')
+        priority = request_priority()
+        deadline = request_deadline()
+        
+        results = []
+        pending = []  # (index, image) that need a remote call
+        for index, image_file in enumerate(image_files):
+            data = image_file.read()
+            frame = decode_image(data)
+            if frame is None:
+                results.append({'index': index, 'error': 'Invalid image data'})
+                continue
+            scores = score_frame(frame)
+            result = {'index': index, 'quality': public_scores(scores)}
+            hint = assess_frame(scores)
+            if hint:
+                # Hopeless frames get an instant hint instead of a remote call
+                result.update(description=hint, skipped=True)
+            else:
+                pending.append((index, data))
+            results.append(result)
+        
+        start = time.perf_counter()
+        summary = None
+        partial = False
+        if pending and strategy == 'single':
+            batch = inference.run('analyze_batch', {
+                'images': [data for _, data in pending],
+                'mode': mode,
+                'summary': want_summary
+            }, priority=priority, deadline=deadline)
+            for (index, _), description in zip(pending, batch['descriptions']):
+                if description is None:
+                    results[index]['error'] = 'Deadline exceeded'
+                else:
+                    results[index]['description'] = description
+            summary = batch['summary']
+            partial = batch['partial']
+        elif pending:
+            # Bounded fan-out: keep at most BATCH_PARALLELISM analyses in flight
+            queued = list(pending)
+            running = {}
+            while queued or running:
+                while queued and len(running) < BATCH_PARALLELISM:
+                    index, data = queued.pop(0)
+                    running[inference.submit('analyze', {'image': data, 'mode': mode},
+                                             priority, deadline)] = index
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0) + DEADLINE_GRACE
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Deadline passed: answer with the images analyzed so far
+                    for future, index in running.items():
+                        future.cancel()
+                        results[index]['error'] = 'Deadline exceeded'
+                    for index, _ in queued:
+                        results[index]['error'] = 'Deadline exceeded'
+                    partial = True
+                    break
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        results[index]['description'] = future.result()
+                    except TimeoutError as e:
+                        results[index]['error'] = str(e)
+                        partial = True
+                    except Exception as e:
+                        logger.warning("Batch image %d failed: %s", index, e)
+                        results[index]['error'] = str(e)
+        
+        if want_summary and summary is None and not partial:
+            descriptions = [r['description'] for r in results if r.get('description')]
+            if len(descriptions) > 1:
+                try:
+                    summary = inference.run('summarize', {'descriptions': descriptions},
+                                            priority=priority, deadline=deadline)
+                except TimeoutError:
+                    partial = True
+            elif descriptions:
+                summary = descriptions[0]
+        
+        log_event(logger, 'analyze_batch.done', mode=mode, strategy=strategy,
+                  images=len(results), analyzed=len(pending), partial=partial,
+                  duration_ms=round((time.perf_counter() - start) * 1000, 1))
+        
+        return jsonify({
+            'success': True,
+            'mode': mode,
+            'strategy': strategy,
+            'results': results,
+            'summary': summary,
+            'partial': partial
+        })
+    
+    except TimeoutError as e:
+        return deadline_exceeded(e)
+    except Exception as e:
+        logger.exception("Error during batch analysis")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/vision/stats', methods=['GET'])
+@requires_role('vision')
+def vision_stats():
+    """Token usage per analysis mode, upstream pool health and model cascade stats"""
+    return jsonify({
+        'success': True,
+        'model': vision_assistant.model_name,
+        'tokens': vision_assistant.get_token_stats(),
+        'upstreams': vision_assistant.get_upstream_stats(),
+        'cascade': vision_assistant.get_cascade_stats(),
+        'scenes': scenes.stats()
+    })
+
 # ==================== SPEECH TRANSCRIPTION ENDPOINTS ====================
 
+def read_audio():
+    """
+    Read and decode the uploaded audio
+    
+    Returns:
+        (audio, None) as Whisper's float32 16 kHz input, or (None, error message)
+    """
+    if 'audio' in request.files:
+        audio_file = request.files['audio']
+        data = audio_file.read()
+        content_type, filename = audio_file.mimetype, audio_file.filename
+    elif is_raw_pcm(request.mimetype):
+        # Raw 16 kHz PCM posted as the request body
+        data = request.get_data()
+        content_type, filename = request.mimetype, None
+    else:
+        return None, 'No audio file provided'
+    
+    # Decode in memory straight into Whisper's float32 16 kHz input
+    try:
+        return decode_audio(data, content_type, filename, request.form.get('format')), None
+    except AudioDecodeError as e:
+        return None, str(e)
+
 @app.route('/api/transcribe', methods=['POST', 'OPTIONS'])
+@requires_role('speech')
+@profiled
 def transcribe_audio():
     """Transcribe audio using Whisper"""
     # Handle preflight request
@@ -337,44 +1050,366 @@ def transcribe_audio():
         return '', 204
     
     try:
-        if 'audio' not in request.files:
+        audio, error = read_audio()
+        if error:
             return jsonify({
-                'error': 'No audio file provided',
+                'error': error,
                 'success': False
             }), 400
         
-        audio_file = request.files['audio']
-        
-        # Save temporarily
-        temp_path = 'temp_audio.webm'
-        audio_file.save(temp_path)
+        start = time.perf_counter()
         
-        print(f"🎤 Transcribing audio...")
+        # Transcribe (long recordings in parallel chunks); past the deadline
+        # the chunks finished so far come back as a partial transcript
+        result = chunked_transcribe.transcribe(inference, audio, priority=request_priority(),
+                                               deadline=request_deadline())
         
-        # Transcribe
-        result = whisper_model.transcribe(
-            temp_path,
-            language='en',
-            fp16=False
-        )
-        
-        # Clean up
-        os.remove(temp_path)
-        
-        print(f"✅ Transcription: {result['text']}")
+        log_event(logger, 'transcribe.done',
+                  duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                  audio_s=round(len(audio) / SAMPLE_RATE, 1),
+                  chunks=result['chunks'],
+                  partial=result.get('partial', False),
+                  text_chars=len(result['text']))
         
         return jsonify({
             'text': result['text'].strip(),
+            'partial': result.get('partial', False),
             'success': True
         })
     
+    except TimeoutError as e:
+        return deadline_exceeded(e)
     except Exception as e:
-        print(f"❌ Transcription error: {str(e)}")
+        logger.exception("Transcription error")
         return jsonify({
             'error': str(e),
             'success': False
         }), 500
 
+# ==================== VOICE + VISION ====================
+
+@app.route('/api/ask', methods=['POST', 'OPTIONS'])
+@requires_role('vision')
+@requires_role('speech')
+@profiled
+def ask():
+    """
+    Answer a spoken command about the current frame in one round trip
+    
+    Form fields: audio (the command), image (one or more frames), mode
+    (used when the command is just "what do you see"). Whisper runs on the
+    pool while the frames are decoded and scored on this thread.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        audio, error = read_audio()
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        start = time.perf_counter()
+        # A spoken command is interactive: ahead of routine descriptions and dictation
+        priority = request_priority('command')
+        deadline = request_deadline()
+        transcription = chunked_transcribe.submit(inference, audio, priority, deadline)
+        
+        analysis, error = prepare_analysis()
+        if error:
+            transcription.cancel()
+            return jsonify({'success': False, 'error': error}), 400
+        
+        # Without a client deadline a stuck worker must not hold this thread forever
+        command = transcription.result(ASK_TIMEOUT)['text'].strip()
+        mode, prompt = route_command(command, default_mode=analysis['mode'])
+        quality = public_scores(analysis['scores'])
+        
+        if analysis['hint']:
+            return jsonify({
+                'success': True,
+                'command': command,
+                'description': analysis['hint'],
+                'mode': mode,
+                'skipped': True,
+                'quality': quality
+            })
+        
+        if prompt:
+            result = inference.run('analyze_custom', {'image': analysis['image'], 'prompt': prompt},
+                                   timeout=ASK_TIMEOUT, priority=priority, deadline=deadline)
+        else:
+            result = inference.run('analyze', {'image': analysis['image'], 'mode': mode},
+                                   timeout=ASK_TIMEOUT, priority=priority, deadline=deadline)
+        
+        log_event(logger, 'ask.done', mode=mode,
+                  duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                  command=command, result_chars=len(result))
+        
+        return jsonify({
+            'success': True,
+            'command': command,
+            'description': result,
+            'mode': mode,
+            'quality': quality
+        })
+    
+    except TimeoutError as e:
+        return deadline_exceeded(e)
+    except Exception as e:
+        logger.exception("Ask error")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ==================== ASYNC JOB ENDPOINTS ====================
+
+def job_accepted(record):
+    """202 response pointing the client at the job"""
+    return jsonify({
+        'success': True,
+        'job_id': record.id,
+        'status': record.snapshot()['status']
+    }), 202
+
+@app.route('/api/jobs/analyze', methods=['POST', 'OPTIONS'])
+@requires_role('vision')
+def submit_analyze_job():
+    """Queue an image analysis and return its job id immediately"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        analysis, error = prepare_analysis()
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        mode, quality = analysis['mode'], public_scores(analysis['scores'])
+        if analysis['hint']:
+            record = jobs.completed('analyze', {
+                'description': analysis['hint'],
+                'mode': mode,
+                'skipped': True,
+                'quality': quality
+            }, owner=job_owner())
+        else:
+            record = jobs.submit(
+                'analyze', {'image': analysis['image'], 'mode': mode},
+                shape=lambda result: {'description': result, 'mode': mode, 'quality': quality},
+                owner=job_owner(), priority=request_priority(), deadline=request_deadline())
+        return job_accepted(record)
+    
+    except Exception as e:
+        logger.exception("Error queueing analysis")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/transcribe', methods=['POST', 'OPTIONS'])
+@requires_role('speech')
+def submit_transcribe_job():
+    """Queue a transcription and return its job id immediately"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        audio, error = read_audio()
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        payloads, combine = chunked_transcribe.plan(audio)
+        record = jobs.submit_many('transcribe', payloads, combine,
+                                  shape=lambda result: {'text': result['text'].strip()},
+                                  owner=job_owner(), priority=request_priority(),
+                                  deadline=request_deadline())
+        return job_accepted(record)
+    
+    except Exception as e:
+        logger.exception("Error queueing transcription")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@requires_role('vision', 'speech')
+def get_job(job_id):
+    """Job status; ?wait=N long-polls up to N seconds for the result"""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_JOB_WAIT)
+    except ValueError:
+        wait = 0
+    
+    record = jobs.wait(job_id, wait, job_owner())
+    if record is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({'success': True, **record.snapshot()})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@requires_role('vision', 'speech')
+def job_events(job_id):
+    """Server-sent events: status now, heartbeats while running, then the result"""
+    record = jobs.get(job_id, job_owner())
+    if record is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    def stream():
+        yield f"event: status\ndata: {json.dumps(record.snapshot())}\n\n"
+        while not record.done.wait(JOB_HEARTBEAT):
+            # Comment lines keep proxies from closing an idle stream
+            yield ": heartbeat\n\n"
+        yield f"event: result\ndata: {json.dumps(record.snapshot())}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@requires_role('vision', 'speech')
+def cancel_job(job_id):
+    """Cancel a queued or running job (a part already running finishes; its result is dropped)"""
+    record = jobs.cancel(job_id, job_owner())
+    if record is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({'success': True, **record.snapshot()})
+
+# ==================== MODEL ADMIN ====================
+
+@app.route('/api/admin/models', methods=['GET'])
+@requires_role('vision', 'speech')
+@requires_admin
+def get_models():
+    """Models serving traffic and the state of the last hot swap"""
+    return jsonify({'success': True, **swapper.status()})
+
+@app.route('/api/admin/models', methods=['POST'])
+@requires_role('vision', 'speech')
+@requires_admin
+def swap_models():
+    """
+    Swap models without downtime (see model_swap.py)
+    
+    JSON body: whisper_model, gemini_models (list or comma-separated) and/or
+    cascade (VISION_CASCADE spec). Answers 202 at once; poll GET for the result.
+    """
+    data = request.get_json(silent=True) or {}
+    gemini_models = data.get('gemini_models')
+    if isinstance(gemini_models, str):
+        gemini_models = [m.strip() for m in gemini_models.split(',') if m.strip()]
+    
+    try:
+        status = swapper.start(data.get('whisper_model') or None, gemini_models or None,
+                               data.get('cascade'))
+    except SwapInProgressError as e:
+        return jsonify({'success': False, 'error': str(e), **swapper.status()}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'swap': status}), 202
+
+def swap_models_from_env(signum, frame):
+    """SIGHUP: re-read .env and swap the models whose setting changed"""
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    current = swapper.current()
+    whisper_model = os.getenv('WHISPER_MODEL')
+    gemini_models = [m.strip() for m in os.getenv('GEMINI_MODELS', '').split(',') if m.strip()]
+    cascade = os.getenv('VISION_CASCADE', '')
+    try:
+        swapper.start(
+            whisper_model if current['whisper_model'] and whisper_model != current['whisper_model'] else None,
+            gemini_models if current['gemini_models'] and gemini_models
+            and gemini_models != current['gemini_models'] else None,
+            cascade if vision_assistant else None)
+        logger.info("SIGHUP: model swap started")
+    except (SwapInProgressError, ValueError) as e:
+        logger.warning("SIGHUP: no model swap (%s)", e)
+
+# ==================== MEMORY ====================
+
+def worker_pids():
+    """PIDs of the inference worker processes"""
+    if not inference:
+        return []
+    return [pid for lane in inference.stats().values() for pid in lane.get('pids', []) if pid]
+
+@app.route('/api/memory', methods=['GET'])
+@requires_admin
+def memory_stats():
+    """Server and worker RSS, per-endpoint request deltas and kept snapshots (see memory_probe.py)"""
+    return jsonify({
+        'success': True,
+        'usage': memory_probe.memory_usage(worker_pids()),
+        'requests': memory.stats() if memory else None,
+        'snapshots': memory_probe.list_snapshots()
+    })
+
+@app.route('/api/memory/snapshots', methods=['POST'])
+@requires_admin
+def memory_snapshot():
+    """Take a tracemalloc snapshot (starts tracing on the first one)"""
+    return jsonify({'success': True, 'snapshot': memory_probe.take_snapshot()})
+
+@app.route('/api/memory/diff', methods=['GET'])
+@requires_admin
+def memory_diff():
+    """
+    Allocation growth between snapshots: ?from=<id>[&to=<id>][&limit=20][&group=lineno]
+    
+    Without 'to', compares against the current heap.
+    """
+    try:
+        from_id = int(request.args['from'])
+        to_id = int(request.args['to']) if request.args.get('to') else None
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except (KeyError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': "'from' (snapshot id) is required; 'to' and 'limit' must be integers"
+        }), 400
+    
+    try:
+        diff = memory_probe.diff_snapshots(from_id, to_id, limit, request.args.get('group', 'lineno'))
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f"Unknown snapshot {e}"}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, **diff})
+
+# ==================== PROFILING ====================
+
+@app.route('/api/profiles', methods=['GET'])
+@requires_admin
+def list_profiles():
+    """Recent request profiles (see profiling.py; needs PROFILING_ENABLED=1)"""
+    return jsonify({
+        'success': True,
+        'enabled': profiling.ENABLED,
+        'directory': profiling.PROFILE_DIR,
+        'profiles': profiling.recent_profiles(),
+        'capture': capture.stats() if capture else None
+    })
+
 # ==================== HEALTH CHECK ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -382,11 +1417,9 @@ def health():
     return jsonify({
         'status': 'ok',
         'message': 'Hand2Voice Unified Server is running',
-        'services': {
-            'auth': 'running',
-            'vision': 'running',
-            'speech': 'running'
-        }
+        'services': {role: 'running' if role in ROLES else 'disabled' for role in ALL_ROLES},
+        'inference': inference.stats() if inference else None,
+        'jobs': jobs.stats() if jobs else None
     })
 
 # ==================== MAIN ====================
@@ -396,6 +1429,7 @@ if __name__ == '__main__':
     print("Hand2Voice Unified Server")
     print("=" * 60)
     print("Server running at: http://localhost:5004")
+    print(f"Roles: {', '.join(role for role in ALL_ROLES if role in ROLES)}")
     print("=" * 60)
     print("\nAvailable Endpoints:")
     print("\nAuthentication:")
@@ -405,13 +1439,43 @@ if __name__ == '__main__':
     print("\nHistory:")
     print("  - POST /api/history/get")
     print("  - POST /api/history/add")
+    print("  - POST /api/history/add-batch")
+    print("  - POST /api/history/search")
     print("  - POST /api/history/clear")
     print("\nVision Analysis:")
     print("  - POST /api/analyze")
+    print("  - POST /api/analyze/batch")
+    print("  - GET  /api/vision/stats")
     print("\nSpeech Transcription:")
     print("  - POST /api/transcribe")
+    print("\nVoice + Vision:")
+    print("  - POST /api/ask")
+    print("\nAsync Jobs:")
+    print("  - POST /api/jobs/analyze")
+    print("  - POST /api/jobs/transcribe")
+    print("  - GET  /api/jobs/<job_id>?wait=N")
+    print("  - GET  /api/jobs/<job_id>/events")
+    print("  - POST /api/jobs/<job_id>/cancel")
+    print("\nModel Admin (X-Admin-Token):")
+    print("  - GET  /api/admin/models")
+    print("  - POST /api/admin/models")
+    print("\nMemory (X-Admin-Token):")
+    print("  - GET  /api/memory")
+    print("  - POST /api/memory/snapshots")
+    print("  - GET  /api/memory/diff?from=<id>&to=<id>")
+    print("\nProfiling:")
+    print("  - GET  /api/profiles")
     print("\nHealth Check:")
     print("  - GET  /api/health")
     print("=" * 60 + "\n")
     
-    app.run(debug=True, port=5004, host='0.0.0.0')
\ No newline at end of file
+    # Start inference workers now instead of on the first request
+    if inference:
+        inference.start()
+    
+    # `kill -HUP <pid>` after editing model settings in .env swaps them in
+    if swapper and hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, swap_models_from_env)
+    
+    # The reloader would import this module twice and start a second worker pool
+    app.run(debug=True, port=5004, host='0.0.0.0', use_reloader=False)
\ No newline at end of file
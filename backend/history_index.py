@@ -0,0 +1,444 @@
+"""
+Full-text search over user history
+A per-user inverted index of descriptions and transcripts, ranked with BM25.
+The hot tier is indexed in memory: built once from history.json at startup
+and then updated incrementally whenever entries are added, archived or
+cleared. Archive segments are indexed the first time a search reaches them
+and the index is reused until the segment file changes (see SegmentCache),
+so startup does not read the archive and repeated searches do not decompress
+it again.
+
+Environment:
+    HISTORY_SEARCH_CACHE   archived entries whose segment indexes are kept in
+                           memory (default 50000); least recently searched
+                           segments are dropped first
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from structured_logging import get_logger
+
+logger = get_logger('history')
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MIN_PREFIX = 3  # query terms this long also match longer words ("label" -> "labels")
+SNIPPET_CHARS = 160
+SEARCH_FIELDS = ('result', 'text', 'description')
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _env_int(name, default):
+    """Integer setting; a malformed value falls back to the default instead of failing the import"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid %s=%r, using %d", name, value, default)
+        return default
+
+
+SEGMENT_CACHE_ENTRIES = _env_int('HISTORY_SEARCH_CACHE', 50000)
+
+
+def tokenize(text):
+    """Lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def entry_text(entry):
+    """Searchable text of a history entry"""
+    return ' '.join(str(entry[field]) for field in SEARCH_FIELDS if entry.get(field))
+
+
+def entry_key(entry):
+    """Stable identity of an entry (entries have no id of their own)"""
+    digest = hashlib.sha1(entry_text(entry).encode('utf-8')).hexdigest()[:12]
+    return f"{entry.get('timestamp')}|{entry.get('type')}|{digest}"
+
+
+def make_snippet(text, terms, width=SNIPPET_CHARS):
+    """Window of text around the first matching term"""
+    if len(text) <= width:
+        return text
+
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [p for p in positions if p >= 0]
+    if not positions:
+        return text[:width].rstrip() + '…'
+
+    start = max(min(positions) - width // 3, 0)
+    # Start and end on word boundaries
+    if start > 0:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < min(positions) else start
+    end = start + width
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+
+    snippet = text[start:end].strip()
+    return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
+
+
+def term_score(tf, df, n, length, avg_length, exact=True):
+    """BM25 contribution of one index term to one document"""
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    # Prefix matches count a little less than exact ones
+    weight = idf if exact else idf * 0.7
+    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+    return weight * tf * (BM25_K1 + 1) / norm
+
+
+def matched_terms(term, words):
+    """Words matched by a query term (exact, or prefix for longer terms)"""
+    if len(term) < MIN_PREFIX:
+        return [term] if term in words else []
+    return [w for w in words if w.startswith(term)]
+
+
+class _UserIndex:
+    """Inverted index for one user's entries"""
+
+    def __init__(self):
+        self.docs = {}      # key -> (entry, term counts, length)
+        self.postings = {}  # term -> {key: term frequency}
+        self.total_length = 0
+
+    def add(self, entry):
+        key = entry_key(entry)
+        if key in self.docs:
+            self.remove(key)
+
+        counts = Counter(tokenize(entry_text(entry)))
+        length = sum(counts.values())
+        self.docs[key] = (entry, counts, length)
+        self.total_length += length
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[key] = tf
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        _, counts, length = doc
+        self.total_length -= length
+        for term in counts:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[term]
+
+    def expand(self, term):
+        """Index terms matched by a query term (exact, or prefix for longer terms)"""
+        return matched_terms(term, self.postings)
+
+    def score(self, terms, archive=None):
+        """
+        BM25 score per document key
+
+        Args:
+            terms: Query terms
+            archive: Optional ArchiveScan whose documents count towards the
+                     corpus statistics (document count, lengths, frequencies)
+        """
+        n = len(self.docs) + (archive.n if archive else 0)
+        total_length = self.total_length + (archive.total_length if archive else 0)
+        avg_length = total_length / n if n else 0
+        scores = {}
+
+        for term in terms:
+            for index_term in self.expand(term):
+                posting = self.postings[index_term]
+                df = len(posting) + (archive.df.get(index_term, 0) if archive else 0)
+                for key, tf in posting.items():
+                    scores[key] = scores.get(key, 0) + term_score(
+                        tf, df, n, self.docs[key][2], avg_length, index_term == term)
+        return scores
+
+
+class ArchiveSegment:
+    """Inverted index of one archive segment, built once from its entries"""
+
+    def __init__(self, entries):
+        self.docs = []      # (entry, term counts, length), newest first
+        self.postings = {}  # term -> {document number: term frequency}
+        self.total_length = 0
+        for entry in entries:
+            counts = Counter(tokenize(entry_text(entry)))
+            length = sum(counts.values())
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[len(self.docs)] = tf
+            self.docs.append((entry, counts, length))
+            self.total_length += length
+
+
+class SegmentCache:
+    """
+    ArchiveSegment per segment file, reused until the file changes
+
+    Segments are append-only, so a cached index is current as long as the
+    file's size and mtime are; an append or a rewrite rebuilds it on the
+    next search. Segments deleted by a clear are dropped through
+    HistoryIndex.clear; pruned ones age out. The cache holds at most
+    `max_entries` archived entries, evicting the least recently searched
+    segments.
+    """
+
+    def __init__(self, read_segment, max_entries=None):
+        """
+        Args:
+            read_segment: Callable path -> entries of that segment, newest first
+            max_entries: Entry budget (default: HISTORY_SEARCH_CACHE env)
+        """
+        self.read_segment = read_segment
+        self.max_entries = SEGMENT_CACHE_ENTRIES if max_entries is None else max_entries
+        self.segments = OrderedDict()  # path -> ((mtime, size), ArchiveSegment)
+        self.entries = 0
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Index of the segment at path, or None if it no longer exists"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.discard(path)
+            return None
+        # Stat before reading: an append racing the read gives a newer stamp next time
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self.segments.get(path)
+            if cached and cached[0] == stamp:
+                self.segments.move_to_end(path)
+                return cached[1]
+
+        # Decompress and tokenize outside the lock
+        segment = ArchiveSegment(self.read_segment(path))
+        with self._lock:
+            old = self.segments.pop(path, None)
+            if old:
+                self.entries -= len(old[1].docs)
+            self.segments[path] = (stamp, segment)
+            self.entries += len(segment.docs)
+            self.builds += 1
+            while self.entries > self.max_entries and len(self.segments) > 1:
+                _, (_, evicted) = self.segments.popitem(last=False)
+                self.entries -= len(evicted.docs)
+        return segment
+
+    def discard(self, path):
+        with self._lock:
+            old = self.segments.pop(path, None)
+            if old:
+                self.entries -= len(old[1].docs)
+
+    def stats(self):
+        with self._lock:
+            return {'segments': len(self.segments), 'entries': self.entries, 'builds': self.builds}
+
+
+class ArchiveScan:
+    """
+    One pass over the indexed archive segments for a search
+
+    Keeps only the entries that match the query (or, for an empty query, the
+    newest `limit` entries that pass the filters) plus the corpus totals BM25
+    needs, so per-search work is proportional to the hits rather than the
+    archive.
+    """
+
+    def __init__(self, terms, matches, limit):
+        self.terms = terms
+        self.matches = matches
+        self.limit = limit
+        self.n = 0
+        self.total_length = 0
+        self.df = Counter()   # index term -> archived documents containing it
+        self.docs = []        # (entry, term counts, length) of the hits kept
+        self.listed = 0       # filtered entries seen for an empty query
+
+    def scan(self, segments):
+        """
+        Args:
+            segments: ArchiveSegments, newest first
+        """
+        for segment in segments:
+            self.n += len(segment.docs)
+            self.total_length += segment.total_length
+            if not self.terms:
+                for doc in segment.docs:
+                    if self.matches(doc[0]):
+                        self.listed += 1
+                        if len(self.docs) < self.limit:  # entries arrive newest first
+                            self.docs.append(doc)
+                continue
+            hits = set()
+            for term in self.terms:
+                for word in matched_terms(term, segment.postings):
+                    posting = segment.postings[word]
+                    self.df[word] += len(posting)
+                    hits.update(posting)
+            self.docs.extend(segment.docs[number] for number in sorted(hits))
+        return self
+
+    def score(self, hot_n, hot_length, hot_df):
+        """
+        BM25 scores of the kept hits against the combined hot + archived corpus
+
+        Args:
+            hot_n: Documents in the hot index
+            hot_length: Total token length of the hot index
+            hot_df: Callable index term -> hot documents containing it
+        """
+        n = hot_n + self.n
+        avg_length = (hot_length + self.total_length) / n if n else 0
+        scored = []
+        for entry, counts, length in self.docs:
+            score = 0.0
+            for term in self.terms:
+                for word in matched_terms(term, counts):
+                    score += term_score(counts[word], hot_df(word) + self.df[word],
+                                        n, length, avg_length, word == term)
+            scored.append((score, entry))
+        return scored
+
+
+class HistoryIndex:
+    """Per-user search index kept in step with history.json"""
+
+    def __init__(self, read_segment=None):
+        """
+        Args:
+            read_segment: Optional callable path -> entries of an archive
+                          segment, newest first; enables archive search
+        """
+        self.users = {}
+        self.archive = SegmentCache(read_segment) if read_segment else None
+        self._lock = threading.Lock()
+
+    def build(self, history_data):
+        """(Re)build the whole index from the full history dict"""
+        users = {}
+        for email, entries in history_data.items():
+            index = users[email] = _UserIndex()
+            for entry in entries:
+                index.add(entry)
+        with self._lock:
+            self.users = users
+
+    def add(self, email, entry):
+        with self._lock:
+            self.users.setdefault(email, _UserIndex()).add(entry)
+
+    def remove(self, email, entries):
+        """Drop entries (e.g. trimmed by the history cap)"""
+        with self._lock:
+            index = self.users.get(email)
+            if index is not None:
+                for entry in entries:
+                    index.remove(entry_key(entry))
+
+    def clear(self, email, archived=()):
+        """
+        Forget a user
+
+        Args:
+            email: Normalized user email
+            archived: The user's archive segment paths, dropped from the cache
+        """
+        with self._lock:
+            self.users.pop(email, None)
+        if self.archive:
+            for path in archived:
+                self.archive.discard(path)
+
+    def search(self, email, query='', mode=None, entry_type=None,
+               date_from=None, date_to=None, limit=10, archived=None):
+        """
+        Search one user's history
+
+        Args:
+            email: Normalized user email
+            query: Free text; empty lists the filtered entries newest first
+            mode: Only entries with this mode (e.g. "text", "hazard", "transcription")
+            entry_type: Only entries of this type ("vision" / "speech")
+            date_from: ISO date or datetime; entries on or after it
+            date_to: ISO date or datetime; entries on or before it (a date includes the whole day)
+            limit: Maximum number of results
+            archived: Optional iterable of archive segment paths (newest
+                      first), ranked together with the hot tier; needs read_segment
+
+        Returns:
+            (results, total) where results are dicts with entry, score and snippet
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+
+        def matches(entry):
+            timestamp = entry.get('timestamp') or ''
+            if mode and entry.get('mode') != mode:
+                return False
+            if entry_type and entry.get('type') != entry_type:
+                return False
+            if date_from and timestamp < date_from:
+                return False
+            # Compare on the date_to prefix so "2026-02-11" covers that whole day
+            if date_to and timestamp[:len(date_to)] > date_to:
+                return False
+            return True
+
+        # Archive I/O happens before taking the lock
+        archive = None
+        if archived is not None and self.archive:
+            segments = (self.archive.get(path) for path in archived)
+            archive = ArchiveScan(terms, matches, limit).scan(segment for segment in segments if segment)
+
+        with self._lock:
+            index = self.users.get(email) or _UserIndex()
+
+            if terms:
+                scored = [(score, index.docs[key][0])
+                          for key, score in index.score(terms, archive).items()]
+                if archive:
+                    scored += archive.score(len(index.docs), index.total_length,
+                                            lambda word: len(index.postings.get(word, ())))
+            else:
+                scored = [(0.0, entry) for entry, _, _ in index.docs.values()]
+
+        hits = [(score, entry) for score, entry in scored if matches(entry)]
+        total = len(hits)
+        if archive and not terms:
+            hits += [(0.0, entry) for entry, _, _ in archive.docs]
+            total += archive.listed
+        hits.sort(key=lambda hit: (hit[0], hit[1].get('timestamp') or ''), reverse=True)
+
+        results = [{
+            'entry': entry,
+            'score': round(score, 3),
+            'snippet': make_snippet(entry_text(entry), terms)
+        } for score, entry in hits[:limit]]
+        return results, total
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'users': len(self.users),
+                'entries': sum(len(index.docs) for index in self.users.values()),
+                'terms': sum(len(index.postings) for index in self.users.values())
+            }
+        if self.archive:
+            stats['archive'] = self.archive.stats()
+        return stats
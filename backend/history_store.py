@@ -0,0 +1,266 @@
+"""
+Archive tier for user history
+history.json stays a small hot tier (the newest HISTORY_LIMIT entries per
+user). Entries pushed out of it are appended to compressed, per-month archive
+segments instead of being dropped:
+
+    history_archive/<user hash>/<YYYY-MM>.jsonl.gz
+
+Each write appends one gzip member to the segment for the entries' month, so
+archiving costs the same however large the archive grows. Reads decompress
+segments newest first and stop as soon as a page is filled.
+
+Environment:
+    HISTORY_ARCHIVE_DIR      archive location (default history_archive)
+    HISTORY_RETENTION_DAYS   days archived entries are kept (default 0 = forever);
+                             a user's "history_retention_days" in users.json overrides it
+    IDEMPOTENCY_TTL_HOURS    how long an idempotency key is remembered (default 168 = a week)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('history')
+
+DEFAULT_ARCHIVE_DIR = 'history_archive'
+SEGMENT_SUFFIX = '.jsonl.gz'
+PRUNE_INTERVAL = 24 * 3600  # retention is checked at most once a day per user
+DEFAULT_KEYS_FILE = 'idempotency_keys.json'
+DEFAULT_KEY_TTL_HOURS = 168
+MAX_KEYS_PER_USER = 5000
+
+
+def segment_month(entry):
+    """YYYY-MM partition for an entry (entries without a timestamp go to the current month)"""
+    timestamp = entry.get('timestamp') or ''
+    if len(timestamp) >= 7 and timestamp[4] == '-':
+        return timestamp[:7]
+    return datetime.now().strftime('%Y-%m')
+
+
+class HistoryArchive:
+    """Compressed, month-partitioned archive of history entries"""
+
+    def __init__(self, root=None, retention_days=None):
+        """
+        Args:
+            root: Archive directory (default: HISTORY_ARCHIVE_DIR env)
+            retention_days: Callable email -> days to keep (0 or None = forever)
+        """
+        self.root = root or os.getenv('HISTORY_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+        self.retention_days = retention_days or (lambda email: int(os.getenv('HISTORY_RETENTION_DAYS', 0)))
+        self._pruned_at = {}
+        self._lock = threading.Lock()
+
+    def user_dir(self, email):
+        # Hashed so email addresses never appear in paths
+        return os.path.join(self.root, hashlib.sha256(email.encode('utf-8')).hexdigest()[:24])
+
+    def segments(self, email):
+        """Segment paths for a user, newest month first"""
+        directory = self.user_dir(email)
+        if not os.path.isdir(directory):
+            return []
+        names = sorted((n for n in os.listdir(directory) if n.endswith(SEGMENT_SUFFIX)), reverse=True)
+        return [os.path.join(directory, n) for n in names]
+
+    def append(self, email, entries):
+        """
+        Archive entries leaving the hot tier
+
+        Args:
+            email: Normalized user email
+            entries: Entries newest first, as they are ordered in history.json
+
+        Returns:
+            Entries dropped by the retention check that ran afterwards
+        """
+        if not entries:
+            return []
+
+        by_month = {}
+        for entry in reversed(entries):  # oldest first, so segments read in time order
+            by_month.setdefault(segment_month(entry), []).append(entry)
+
+        directory = self.user_dir(email)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            for month, month_entries in by_month.items():
+                data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in month_entries)
+                # A new gzip member per append: no need to rewrite the segment
+                with open(os.path.join(directory, month + SEGMENT_SUFFIX), 'ab') as f:
+                    f.write(gzip.compress(data.encode('utf-8')))
+
+        return self.prune(email)
+
+    def read_segment(self, path):
+        """Entries of one segment, newest first"""
+        entries = []
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entries.append(json.loads(line))
+        except (EOFError, OSError, zlib.error, ValueError) as e:
+            # A torn final member (crash mid-append) loses only that append
+            log_event(logger, 'history.segment_damaged', level=logging.WARNING, path=path, error=str(e))
+        entries.sort(key=lambda e: e.get('timestamp') or '', reverse=True)
+        return entries
+
+    def segments_between(self, email, date_from=None, date_to=None):
+        """
+        Segment paths for a user, newest month first, limited to a date range
+
+        Args:
+            email: Normalized user email
+            date_from: Optional ISO date; segments of earlier months are skipped
+            date_to: Optional ISO date; segments of later months are skipped
+        """
+        return [path for path in self.segments(email)
+                if not (date_from and os.path.basename(path)[:7] < date_from[:7])
+                and not (date_to and os.path.basename(path)[:7] > date_to[:7])]
+
+    def iter_entries(self, email, date_from=None, date_to=None):
+        """Archived entries, newest first, decompressing one segment at a time"""
+        for path in self.segments_between(email, date_from, date_to):
+            yield from self.read_segment(path)
+
+    def page(self, email, offset, limit):
+        """
+        One page of archived entries
+
+        Returns:
+            (entries, has_more)
+        """
+        entries = []
+        for index, entry in enumerate(self.iter_entries(email)):
+            if index < offset:
+                continue
+            if len(entries) == limit:
+                return entries, True
+            entries.append(entry)
+        return entries, False
+
+    def prune(self, email, force=False):
+        """
+        Delete whole segments that are past the user's retention period
+
+        Returns:
+            Entries that were removed
+        """
+        now = time.time()
+        if not force and now - self._pruned_at.get(email, 0) < PRUNE_INTERVAL:
+            return []
+        self._pruned_at[email] = now
+
+        days = self.retention_days(email)
+        if not days:
+            return []
+
+        # A segment goes once its whole month is older than the cutoff
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m')
+        removed = []
+        with self._lock:
+            for path in self.segments(email):
+                if os.path.basename(path)[:7] < cutoff:
+                    removed.extend(self.read_segment(path))
+                    os.remove(path)
+
+        if removed:
+            log_event(logger, 'history.pruned', entries=len(removed), retention_days=days)
+        return removed
+
+    def clear(self, email):
+        with self._lock:
+            shutil.rmtree(self.user_dir(email), ignore_errors=True)
+        self._pruned_at.pop(email, None)
+
+    def stats(self):
+        segments = 0
+        size = 0
+        if os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    if name.endswith(SEGMENT_SUFFIX):
+                        segments += 1
+                        size += os.path.getsize(os.path.join(directory, name))
+        return {'segments': segments, 'bytes': size}
+
+
+class IdempotencyKeys:
+    """
+    Idempotency keys of added history entries, per user, with a TTL
+
+    Kept apart from the entries themselves so a retried key is recognised
+    after its entry has left the hot tier, and the key never shows up in
+    the history returned to clients. Not thread-safe: callers hold the
+    history lock around seen/add/save.
+    """
+
+    def __init__(self, path=DEFAULT_KEYS_FILE, ttl=None, max_per_user=MAX_KEYS_PER_USER):
+        """
+        Args:
+            path: JSON file the keys are persisted in
+            ttl: Seconds a key is remembered (default: IDEMPOTENCY_TTL_HOURS env)
+            max_per_user: Oldest keys are forgotten past this many per user
+        """
+        if ttl is None:
+            try:
+                ttl = float(os.getenv('IDEMPOTENCY_TTL_HOURS', DEFAULT_KEY_TTL_HOURS)) * 3600
+            except ValueError:
+                logger.warning("Invalid IDEMPOTENCY_TTL_HOURS, using %d", DEFAULT_KEY_TTL_HOURS)
+                ttl = DEFAULT_KEY_TTL_HOURS * 3600
+        self.path = path
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self.keys = self._load()  # email -> {key: time added}
+        self.dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log_event(logger, 'history.keys_unreadable', level=logging.WARNING, path=self.path, error=str(e))
+            return {}
+
+    def seen(self, email, key):
+        """True if the key was added within the TTL"""
+        added = self.keys.get(email, {}).get(key)
+        return added is not None and time.time() - added < self.ttl
+
+    def add(self, email, key):
+        now = time.time()
+        user_keys = self.keys.setdefault(email, {})
+        user_keys[key] = now
+        if len(user_keys) > self.max_per_user or next(iter(user_keys.values())) < now - self.ttl:
+            # Keys are inserted in time order, so expired and surplus ones are at the front
+            live = [(k, t) for k, t in user_keys.items() if now - t < self.ttl][-self.max_per_user:]
+            self.keys[email] = dict(live)
+        self.dirty = True
+
+    def clear(self, email):
+        if self.keys.pop(email, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """Write the keys if they changed (temp file + rename, like history.json)"""
+        if not self.dirty:
+            return
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.keys, f)
+        os.replace(temp_file, self.path)
+        self.dirty = False
@@ -0,0 +1,812 @@
+"""
+Inference worker pool
+Keeps CPU-heavy inference out of the HTTP tier. Flask threads only submit
+jobs and wait on futures; each job kind is served by a lane:
+
+- transcribe: dedicated worker processes, each with its own Whisper model and
+  a pinned number of torch threads. A crashed worker fails only its current
+  job and is restarted automatically.
+- analyze / analyze_custom / analyze_batch / summarize: a thread lane in the
+  server process. Vision work is mostly waiting on the Gemini API, so threads
+  are enough and the upstream pool's breakers and stats stay in one place.
+
+Jobs carry a priority class: "urgent" (hazard checks, emergency requests),
+"command" (spoken commands) and "routine" (descriptions, text, dictation).
+Each lane serves the most urgent class first. Waiting jobs age: every
+PRIORITY_AGING seconds in the queue counts as one class more urgent, so
+routine work still gets through under a steady stream of urgent jobs.
+
+The Whisper model can be swapped while serving (swap_whisper_model): new
+workers load and warm up next to the old ones, then each slot switches
+between jobs, so the old workers drain and exit without a cold start.
+
+Jobs may carry a deadline (a time.monotonic() value, e.g. from the client's
+X-Deadline-Ms header). A job still queued when its deadline passes is
+dropped with DeadlineExceededError; vision jobs get the deadline passed on
+so their upstream calls are cut off there.
+
+Environment:
+    INFERENCE_WORKERS   transcription worker processes; "auto" = one per
+                        TORCH_THREADS cores, 0 = run Whisper in-process (default 1)
+    TORCH_THREADS       torch threads per worker (default: cores / workers)
+    VISION_THREADS      concurrent vision jobs (default 8)
+    WHISPER_MODEL       Whisper model size (default "base")
+    PRIORITY_AGING      seconds of waiting that promote a job one priority
+                        class (default 2; 0 = strict priority)
+"""
+
+import abc
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as WaitTimeoutError
+
+import profiling
+from structured_logging import get_logger, log_event
+
+logger = get_logger('inference')
+
+WORKER_START_TIMEOUT = 300  # seconds to load models in a fresh worker
+RESTART_BACKOFF = 1.0       # first delay between restarts of a failing worker
+MAX_RESTART_BACKOFF = 30.0  # the delay doubles up to this
+POLL_INTERVAL = 0.5         # seconds between liveness checks while a job runs
+DEADLINE_GRACE = 0.25       # seconds past a deadline to wait for a job being cut off
+
+TRANSCRIBE_KINDS = ('transcribe',)
+VISION_KINDS = ('analyze', 'analyze_custom', 'analyze_batch', 'analyze_changes', 'summarize')
+
+# Most urgent first
+PRIORITY_CLASSES = ('urgent', 'command', 'routine')
+PRIORITY_ALIASES = {
+    'urgent': 'urgent',
+    'emergency': 'urgent',
+    'sos': 'urgent',
+    'hazard': 'urgent',
+    'command': 'command',
+    'routine': 'routine',
+    'general': 'routine',
+    'text': 'routine',
+}
+DEFAULT_PRIORITY_AGING = 2.0
+WAKE = object()  # PriorityJobQueue.get() result when its interrupted() check fired
+QUEUE_TIME_WINDOW = 500  # recent queue times kept per class for percentiles
+
+
+class InferenceError(RuntimeError):
+    """A job failed inside the inference runtime"""
+
+
+class WorkerCrashedError(InferenceError):
+    """The worker process died while running the job"""
+
+
+class DeadlineExceededError(InferenceError, TimeoutError):
+    """The job's deadline passed before it produced a result"""
+
+
+def priority_class(name, default=None):
+    """
+    Normalize a priority name ("emergency", "hazard", "command", "general", ...)
+
+    Returns:
+        One of PRIORITY_CLASSES, or default for unknown or empty names
+    """
+    return PRIORITY_ALIASES.get((name or '').strip().lower(), default)
+
+
+def default_priority(kind, payload):
+    """Lowest priority class of a job: hazard checks are always urgent"""
+    if kind == 'analyze' and payload.get('mode') == 'hazard':
+        return 'urgent'
+    return 'routine'
+
+
+# ==================== RUNTIME (models in one process) ====================
+
+class InferenceRuntime:
+    """Models loaded in one process and the handlers that run jobs on them"""
+
+    def __init__(self, kinds, whisper_model='base', vision=None, torch_threads=None):
+        self.whisper = None
+        self.vision = vision
+
+        if any(kind in TRANSCRIBE_KINDS for kind in kinds):
+            if torch_threads:
+                os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+            import whisper
+            if torch_threads:
+                import torch
+                torch.set_num_threads(torch_threads)
+            self.whisper = whisper.load_model(whisper_model)
+
+        if any(kind in VISION_KINDS for kind in kinds) and self.vision is None:
+            from vision.vision_engine import VisualAssistant
+            self.vision = VisualAssistant()
+
+    def run(self, kind, payload, deadline=None):
+        """
+        Run one job; payloads and results are plain picklable values
+
+        deadline (time.monotonic()) cuts off the upstream calls of vision
+        jobs; a Whisper decode in progress runs to the end of its chunk.
+        """
+        if kind == 'transcribe':
+            result = self.whisper.transcribe(payload['audio'], language='en', fp16=False)
+            return {'text': result['text']}
+        if kind == 'analyze':
+            return self.vision.analyze_image(payload['image'], mode=payload.get('mode', 'general'),
+                                             deadline=deadline)
+        if kind == 'analyze_custom':
+            return self.vision.analyze_with_custom_prompt(payload['image'], payload['prompt'],
+                                                          deadline=deadline)
+        if kind == 'analyze_batch':
+            return self.vision.analyze_images(payload['images'], mode=payload.get('mode', 'general'),
+                                              summary=payload.get('summary', False), deadline=deadline)
+        if kind == 'analyze_changes':
+            return self.vision.describe_changes(payload['image'], payload['context'], deadline=deadline)
+        if kind == 'summarize':
+            return self.vision.summarize(payload['descriptions'], deadline=deadline)
+        raise InferenceError(f"Unknown job kind: {kind}")
+
+
+def _worker_main(conn, kinds, whisper_model, torch_threads):
+    """Entry point of a worker process: load models, then serve jobs from the pipe"""
+    try:
+        runtime = InferenceRuntime(kinds, whisper_model, torch_threads=torch_threads)
+    except Exception as e:
+        conn.send(('failed', repr(e)))
+        return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        kind, payload = message
+        try:
+            conn.send(('ok', runtime.run(kind, payload)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+# ==================== JOBS AND LANES ====================
+
+class Job:
+    """A unit of work waiting in a lane"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, payload, priority='routine', deadline=None):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.deadline = deadline  # time.monotonic() after which the result is useless
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.capture = profiling.current_capture()  # set while the submitting request is profiled
+
+
+class PriorityJobQueue:
+    """
+    Job queue ordered by priority class with aging
+
+    Jobs are FIFO within a class. get() returns the head job with the lowest
+    class rank minus (seconds waited / aging), so a routine job that has
+    waited 2 * aging seconds competes with a fresh urgent one.
+    """
+
+    def __init__(self, aging=DEFAULT_PRIORITY_AGING):
+        self.aging = aging
+        self.promoted = {name: 0 for name in PRIORITY_CLASSES}  # served ahead of a more urgent class
+        self._queues = {name: deque() for name in PRIORITY_CLASSES}
+        self._stops = 0
+        self._cond = threading.Condition()
+
+    def put(self, job):
+        """Queue a job; None asks one consumer to stop"""
+        with self._cond:
+            if job is None:
+                self._stops += 1
+            else:
+                self._queues[job.priority].append(job)
+            self._cond.notify()
+
+    def get(self, interrupted=None):
+        """
+        Block until a job (or a stop request, returned as None) is available
+
+        Args:
+            interrupted: Optional callable checked while waiting (and on
+                         wake()); get() returns WAKE when it returns True
+        """
+        with self._cond:
+            while True:
+                if self._stops:
+                    self._stops -= 1
+                    return None
+                job = self._pop()
+                if job is not None:
+                    return job
+                if interrupted is not None and interrupted():
+                    return WAKE
+                self._cond.wait()
+
+    def wake(self):
+        """Make waiting consumers re-check their interrupted() condition"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def _pop(self):
+        now = time.monotonic()
+        best, best_key, most_urgent = None, None, None
+        for rank, name in enumerate(PRIORITY_CLASSES):
+            waiting = self._queues[name]
+            if not waiting:
+                continue
+            if most_urgent is None:
+                most_urgent = rank
+            effective = rank
+            if self.aging > 0:
+                effective -= (now - waiting[0].submitted_at) / self.aging
+            if best_key is None or (effective, rank) < best_key:
+                best, best_key = name, (effective, rank)
+        if best is None:
+            return None
+        if best_key[1] > most_urgent:
+            self.promoted[best] += 1
+        return self._queues[best].popleft()
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(waiting) for waiting in self._queues.values())
+
+    def depths(self):
+        """Queued jobs per class (including cancelled ones not yet skipped)"""
+        with self._cond:
+            return {name: len(waiting) for name, waiting in self._queues.items()}
+
+
+class Lane(abc.ABC):
+    """A job queue served by a fixed set of slots (threads or worker processes)"""
+
+    def __init__(self, name, slots, aging=DEFAULT_PRIORITY_AGING):
+        self.name = name
+        self.queue = PriorityJobQueue(aging)
+        self.slot_count = slots
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = False
+        self._queue_times = {name: deque(maxlen=QUEUE_TIME_WINDOW) for name in PRIORITY_CLASSES}
+        self._dispatched = {name: 0 for name in PRIORITY_CLASSES}
+
+    def start(self):
+        for index in range(self.slot_count):
+            thread = threading.Thread(target=self._serve, args=(index,),
+                                      name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, job):
+        self.queue.put(job)
+
+    def available(self):
+        """Whether the lane can currently serve jobs"""
+        return True
+
+    def _next_job(self, interrupted=None):
+        """Block until a job that has not been cancelled or expired is available (or WAKE)"""
+        while True:
+            job = self.queue.get(interrupted)
+            if job is None or job is WAKE:
+                return job
+            if job.deadline is not None and time.monotonic() >= job.deadline:
+                if job.future.set_running_or_notify_cancel():
+                    with self._lock:
+                        self.expired += 1
+                    job.future.set_exception(DeadlineExceededError("Deadline passed while queued"))
+                    log_event(logger, 'inference.job_expired', lane=self.name, kind=job.kind,
+                              priority=job.priority,
+                              queued_ms=round((time.monotonic() - job.submitted_at) * 1000, 1))
+                continue
+            if job.future.set_running_or_notify_cancel():
+                job.started_at = time.monotonic()
+                with self._lock:
+                    self._dispatched[job.priority] += 1
+                    self._queue_times[job.priority].append(job.started_at - job.submitted_at)
+                return job
+
+    @abc.abstractmethod
+    def _serve(self, index):
+        """Run slot `index`: take jobs off the queue until the lane stops"""
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            self.busy -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+        log_event(logger, 'inference.job', lane=self.name, kind=job.kind, priority=job.priority,
+                  queued_ms=round((job.started_at - job.submitted_at) * 1000, 1),
+                  run_ms=round((time.monotonic() - job.started_at) * 1000, 1),
+                  ok=error is None)
+
+    def stop(self):
+        self._stopping = True
+        for _ in self._threads:
+            self.queue.put(None)
+
+    def priority_stats(self):
+        """Queue depth and queue-time percentiles (ms) per priority class"""
+        depths = self.queue.depths()
+        result = {}
+        with self._lock:
+            for name in PRIORITY_CLASSES:
+                times = sorted(self._queue_times[name])
+                entry = {
+                    'queued': depths[name],
+                    'dispatched': self._dispatched[name],
+                    'promoted': self.queue.promoted[name],
+                    'p50_ms': None,
+                    'p95_ms': None,
+                    'max_ms': None,
+                }
+                if times:
+                    entry['p50_ms'] = round(times[len(times) // 2] * 1000, 1)
+                    entry['p95_ms'] = round(times[min(int(len(times) * 0.95), len(times) - 1)] * 1000, 1)
+                    entry['max_ms'] = round(times[-1] * 1000, 1)
+                result[name] = entry
+        return result
+
+    def stats(self):
+        return {
+            'slots': self.slot_count,
+            'busy': self.busy,
+            'queued': self.queue.qsize(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'expired': self.expired,
+            'priority': self.priority_stats(),
+        }
+
+
+class ThreadLane(Lane):
+    """Runs jobs on threads of the server process"""
+
+    def __init__(self, name, runtime, threads, aging=DEFAULT_PRIORITY_AGING):
+        super().__init__(name, threads, aging)
+        self.runtime = runtime
+
+    def swap_runtime(self, runtime):
+        """Serve new jobs from another runtime; running jobs finish on the old one"""
+        self.runtime = runtime
+
+    def _serve(self, index):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            with self._lock:
+                self.busy += 1
+            try:
+                result = profiling.run_job(job, self.name, self.runtime.run,
+                                           job.kind, job.payload, job.deadline)
+            except Exception as e:
+                self._finish(job, error=e)
+            else:
+                self._finish(job, result)
+
+
+class _Worker:
+    """Server-side handle of one worker process"""
+
+    def __init__(self, ctx, name, kinds, whisper_model, torch_threads):
+        self.name = name
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, kinds, whisper_model, torch_threads),
+            name=name,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise WorkerCrashedError(f"{self.name} did not start within {timeout}s")
+        status, detail = self.conn.recv()
+        if status != 'ready':
+            raise WorkerCrashedError(f"{self.name} failed to load models: {detail}")
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ProcessLane(Lane):
+    """Runs jobs in dedicated worker processes, restarting any that die"""
+
+    def __init__(self, name, kinds, workers, whisper_model='base', torch_threads=1,
+                 aging=DEFAULT_PRIORITY_AGING):
+        super().__init__(name, workers, aging)
+        self.kinds = tuple(kinds)
+        self.whisper_model = whisper_model
+        self.torch_threads = torch_threads
+        self.restarts = 0
+        self.start_failures = 0
+        self.workers = [None] * workers
+        self.current = [None] * workers  # job running on each worker
+        self.replacements = [None] * workers  # warmed workers waiting to take over a slot
+        self.swaps = 0
+        self._swap_lock = threading.Lock()
+        # Spawn so workers never inherit the server's threads or locks
+        self._ctx = multiprocessing.get_context('spawn')
+
+    @property
+    def ready_workers(self):
+        return sum(1 for w in self.workers if w is not None and w.process.is_alive())
+
+    def available(self):
+        """False once workers have failed to start and none is running"""
+        return self.start_failures == 0 or self.ready_workers > 0
+
+    def _spawn(self, index):
+        name = f"{self.name}-worker-{index}"
+        backoff = RESTART_BACKOFF
+        while not self._stopping:
+            worker = _Worker(self._ctx, name, self.kinds, self.whisper_model, self.torch_threads)
+            try:
+                worker.wait_ready(WORKER_START_TIMEOUT)
+                log_event(logger, 'inference.worker_ready', worker=name, pid=worker.process.pid)
+                with self._lock:
+                    self.start_failures = 0
+                return worker
+            except (WorkerCrashedError, EOFError, OSError) as e:
+                with self._lock:
+                    self.start_failures += 1
+                logger.error("Worker %s failed to start (retry in %.0fs): %s", name, backoff, e)
+                worker.kill()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+        return None
+
+    def _serve(self, index):
+        worker = self._spawn(index)
+        self.workers[index] = worker
+
+        while worker is not None:
+            job = self._next_job(lambda: self.replacements[index] is not None)
+            # Switch to a swapped-in worker between jobs
+            worker = self._take_replacement(index, worker)
+            if job is WAKE:
+                continue
+            if job is None:
+                break
+            with self._lock:
+                self.busy += 1
+                self.current[index] = job
+            profiling.note_out_of_process(job, self.name)
+
+            try:
+                worker.conn.send((job.kind, job.payload))
+                # Wait for the reply while watching for a crash
+                while not worker.conn.poll(POLL_INTERVAL):
+                    if not worker.process.is_alive():
+                        raise EOFError
+                status, value = worker.conn.recv()
+            except (EOFError, OSError, BrokenPipeError):
+                with self._lock:
+                    self.current[index] = None
+                worker.process.join(timeout=1)
+                exit_code = worker.process.exitcode
+                logger.error("Worker %s died (exit code %s) running job %s; restarting",
+                             worker.name, exit_code, job.id)
+                self._finish(job, error=WorkerCrashedError(
+                    f"Inference worker crashed (exit code {exit_code})"))
+                worker.kill()
+                with self._lock:
+                    self.restarts += 1
+                worker = self._spawn(index)
+                self.workers[index] = worker
+                continue
+
+            with self._lock:
+                self.current[index] = None
+            if status == 'ok':
+                self._finish(job, value)
+            else:
+                self._finish(job, error=InferenceError(value))
+
+        if worker is not None:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+    def _take_replacement(self, index, worker):
+        """The slot's warmed replacement worker, retiring the old one, or the current worker"""
+        with self._lock:
+            fresh, self.replacements[index] = self.replacements[index], None
+            if fresh is None:
+                return worker
+            self.workers[index] = fresh
+        try:
+            worker.conn.send(None)
+        except OSError:
+            pass
+        worker.kill()
+        log_event(logger, 'inference.worker_swapped', worker=fresh.name, pid=fresh.process.pid,
+                  model=self.whisper_model)
+        return fresh
+
+    def swap_model(self, whisper_model, timeout=WORKER_START_TIMEOUT):
+        """
+        Replace every worker with one running another Whisper model, without a cold start
+
+        The new workers load and warm up while the old ones keep serving;
+        then each slot switches to its new worker between jobs and the old
+        worker exits. Blocks until all slots have switched, or for at most
+        `timeout` seconds more: a slot that is stuck (e.g. restarting a dead
+        worker) gives up its replacement, which is killed.
+
+        Raises:
+            WorkerCrashedError: a new worker failed to load (the old ones keep
+                serving), or slots did not switch in time (the message says how
+                many did; whisper_model stays the old one if none did)
+        """
+        with self._swap_lock:
+            fresh = []
+            try:
+                for index in range(self.slot_count):
+                    fresh.append(_Worker(self._ctx, f"{self.name}-worker-{index}", self.kinds,
+                                         whisper_model, self.torch_threads))
+                warmup = {'audio': _silence(1.0)}
+                for worker in fresh:
+                    worker.wait_ready(timeout)
+                    worker.conn.send(('transcribe', warmup))
+                    if not worker.conn.poll(timeout):
+                        raise WorkerCrashedError(f"{worker.name} did not finish warming up")
+                    status, detail = worker.conn.recv()
+                    if status != 'ok':
+                        raise WorkerCrashedError(f"{worker.name} failed to warm up: {detail}")
+            except (WorkerCrashedError, EOFError, OSError):
+                for worker in fresh:
+                    worker.kill()
+                raise
+
+            with self._lock:
+                previous = self.whisper_model
+                self.whisper_model = whisper_model  # restarts after a crash load it too
+                self.replacements = fresh
+            self.queue.wake()
+            handover_deadline = time.monotonic() + timeout
+            while any(self.replacements) and not self._stopping and time.monotonic() < handover_deadline:
+                time.sleep(POLL_INTERVAL / 5)
+
+            with self._lock:
+                unclaimed = [w for w in self.replacements if w is not None]
+                self.replacements = [None] * self.slot_count
+                if len(unclaimed) == self.slot_count:
+                    self.whisper_model = previous
+            for worker in unclaimed:
+                worker.kill()
+            if self._stopping:
+                return
+            if unclaimed:
+                switched = self.slot_count - len(unclaimed)
+                raise WorkerCrashedError(
+                    f"Only {switched} of {self.slot_count} workers switched to {whisper_model} "
+                    f"within {timeout}s; the other slots keep their old workers")
+            self.swaps += 1
+
+    def stats(self):
+        stats = super().stats()
+        stats['restarts'] = self.restarts
+        stats['pids'] = [w.process.pid if w and w.process.is_alive() else None
+                         for w in self.workers]
+        stats['torch_threads'] = self.torch_threads
+        stats['whisper_model'] = self.whisper_model
+        stats['swaps'] = self.swaps
+        return stats
+
+
+# ==================== POOL ====================
+
+def _silence(seconds):
+    import numpy as np
+    return np.zeros(int(seconds * 16000), dtype=np.float32)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class InferencePool:
+    """Dispatches inference jobs to the lane serving their kind"""
+
+    def __init__(self, transcribe_workers=1, torch_threads=None, whisper_model='base',
+                 vision=None, vision_threads=8, speech=True,
+                 priority_aging=DEFAULT_PRIORITY_AGING):
+        cores = os.cpu_count() or 1
+        self.speech = speech  # False: no transcription lane (and no Whisper) at all
+        self.transcribe_workers = transcribe_workers
+        self.torch_threads = torch_threads or max(1, cores // max(transcribe_workers, 1))
+        self.whisper_model = whisper_model
+        self.vision = vision
+        self.vision_threads = vision_threads
+        self.priority_aging = priority_aging
+        self.lanes = {}
+        self._started = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, vision=None, speech=True):
+        cores = os.cpu_count() or 1
+        torch_threads = _env_int('TORCH_THREADS', 0) or None
+        workers = os.getenv('INFERENCE_WORKERS', '1').strip().lower()
+        if workers == 'auto':
+            workers = max(1, cores // (torch_threads or 2))
+        else:
+            workers = max(0, int(workers or 0))
+        return cls(
+            transcribe_workers=workers,
+            torch_threads=torch_threads,
+            whisper_model=os.getenv('WHISPER_MODEL', 'base'),
+            vision=vision,
+            vision_threads=_env_int('VISION_THREADS', 8),
+            speech=speech,
+            priority_aging=max(0.0, _env_float('PRIORITY_AGING', DEFAULT_PRIORITY_AGING)),
+        )
+
+    def start(self):
+        """Start lanes (idempotent); workers load their models in the background"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+
+            lanes = []
+            if self.speech and self.transcribe_workers > 0:
+                lanes.append((ProcessLane('transcribe', TRANSCRIBE_KINDS, self.transcribe_workers,
+                                          self.whisper_model, self.torch_threads,
+                                          self.priority_aging), TRANSCRIBE_KINDS))
+            elif self.speech:
+                runtime = InferenceRuntime(TRANSCRIBE_KINDS, self.whisper_model)
+                lanes.append((ThreadLane('transcribe', runtime, 1, self.priority_aging),
+                              TRANSCRIBE_KINDS))
+            if self.vision is not None:
+                lanes.append((ThreadLane('vision', InferenceRuntime(VISION_KINDS, vision=self.vision),
+                                         self.vision_threads, self.priority_aging), VISION_KINDS))
+
+            for lane, kinds in lanes:
+                lane.start()
+                for kind in kinds:
+                    self.lanes[kind] = lane
+        return self
+
+    def submit(self, kind, payload, priority=None, deadline=None):
+        """Queue a job and return a concurrent.futures.Future for its result"""
+        return self.submit_job(kind, payload, priority, deadline).future
+
+    def submit_job(self, kind, payload, priority=None, deadline=None):
+        """
+        Queue a job and return the Job (its future carries the result)
+
+        Args:
+            kind: Job kind
+            payload: Job payload
+            priority: Priority class or alias (default routine); hazard
+                      checks are always urgent
+            deadline: time.monotonic() after which the job is dropped if
+                      still queued (vision jobs are also cut off there)
+        """
+        self.start()
+        lane = self.lanes.get(kind)
+        if lane is None:
+            raise InferenceError(f"Unknown job kind: {kind}")
+        if not lane.available():
+            raise InferenceError(f"No {lane.name} workers available (failing to start)")
+        requested = priority_class(priority)
+        priority = default_priority(kind, payload)
+        if requested and PRIORITY_CLASSES.index(requested) < PRIORITY_CLASSES.index(priority):
+            priority = requested
+        job = Job(kind, payload, priority, deadline)
+        lane.put(job)
+        return job
+
+    def swap_whisper_model(self, whisper_model):
+        """
+        Switch transcription to another Whisper model without a cold start
+
+        The new model is loaded and warmed up next to the old one, then takes
+        over; jobs already running finish on the old model, which is then
+        freed. Blocks until the switch is complete.
+        """
+        self.start()
+        lane = self.lanes.get('transcribe')
+        if lane is None:
+            raise InferenceError("This pool has no transcription lane")
+        previous = self.whisper_model
+        start = time.monotonic()
+        if isinstance(lane, ProcessLane):
+            try:
+                lane.swap_model(whisper_model)
+            finally:
+                # A handover that timed out can leave some slots on the new model
+                self.whisper_model = lane.whisper_model
+        else:
+            runtime = InferenceRuntime(TRANSCRIBE_KINDS, whisper_model)
+            runtime.run('transcribe', {'audio': _silence(1.0)})
+            lane.swap_runtime(runtime)
+        log_event(logger, 'inference.whisper_swapped', previous=previous, model=whisper_model,
+                  duration_ms=round((time.monotonic() - start) * 1000, 1))
+        self.whisper_model = whisper_model
+
+    def cancel(self, job):
+        """
+        Cancel a job: queued jobs are dropped, running ones finish
+
+        A running job is not interrupted: killing a Whisper worker would cost
+        a cold model reload, and one chunk runs for seconds at most. The
+        caller discards its result.
+
+        Returns:
+            True if the job will not run
+        """
+        return job.future.cancel()
+
+    def run(self, kind, payload, timeout=None, priority=None, deadline=None):
+        """
+        Submit a job and wait for its result
+
+        With a deadline, waits at most until then (plus DEADLINE_GRACE for a
+        vision job finishing its cut-off call) and raises DeadlineExceededError
+        """
+        future = self.submit(kind, payload, priority, deadline)
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0) + DEADLINE_GRACE
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        try:
+            return future.result(timeout)
+        except WaitTimeoutError:
+            future.cancel()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceededError("Deadline exceeded") from None
+            raise
+
+    def stop(self):
+        for lane in set(self.lanes.values()):
+            lane.stop()
+
+    def stats(self):
+        return {lane.name: lane.stats() for lane in set(self.lanes.values())}
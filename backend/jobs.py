@@ -0,0 +1,253 @@
+"""
+Asynchronous inference jobs
+Submitting returns a job id immediately; clients then long-poll or stream
+(SSE) the result, or cancel the job. Finished jobs are kept for a short TTL
+so a reconnecting client gets the result without re-running inference.
+
+A job submitted with an owner is only visible to, and cancellable by, that
+owner; to anyone else it does not exist. Cancelling drops the parts still
+queued; a part already running finishes and its result is discarded.
+
+Environment:
+    JOB_RESULT_TTL   seconds finished jobs are kept (default 300)
+"""
+
+import hmac
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('jobs')
+
+DEFAULT_TTL = 300
+MAX_JOBS = 10000  # hard cap on tracked jobs; the oldest finished ones go first
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobRecord:
+    """Client-visible state of one job"""
+
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.jobs = []  # inference_pool.Jobs while queued / running
+        self.done = threading.Event()
+
+    def snapshot(self):
+        status = self.status
+        if status == QUEUED and any(job.future.running() or job.future.done() for job in self.jobs):
+            status = RUNNING
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': status,
+            'created_at': self.created_at,
+        }
+        if self.finished_at:
+            data['finished_at'] = self.finished_at
+        if self.status == DONE:
+            data['result'] = self.result
+        elif self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """Tracks jobs submitted to an InferencePool"""
+
+    def __init__(self, pool, ttl=None):
+        self.pool = pool
+        self.ttl = ttl if ttl is not None else float(os.getenv('JOB_RESULT_TTL', DEFAULT_TTL))
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, payload, shape=None, owner=None, priority=None, deadline=None):
+        """
+        Queue an inference job
+
+        Args:
+            kind: Job kind understood by the inference pool
+            payload: Job payload
+            shape: Optional callable turning the raw result into the client result
+            owner: Optional client identity stored with the job
+            priority: Priority class for the inference pool (default by kind)
+            deadline: time.monotonic() after which parts still queued are dropped
+
+        Returns:
+            The JobRecord (already queued)
+        """
+        return self.submit_many(kind, [payload], lambda results: results[0], shape, owner, priority,
+                                deadline)
+
+    def submit_many(self, kind, payloads, combine, shape=None, owner=None, priority=None,
+                    deadline=None):
+        """
+        Queue one client job made of several inference jobs (e.g. audio chunks)
+
+        Args:
+            kind: Job kind understood by the inference pool
+            payloads: One payload per inference job
+            combine: Callable merging the list of results (in payload order)
+            shape: Optional callable turning the combined result into the client result
+            owner: Optional client identity stored with the job
+            priority: Priority class for the inference pool (default by kind)
+            deadline: time.monotonic() after which parts still queued are dropped
+
+        Returns:
+            The JobRecord (already queued)
+        """
+        record = JobRecord(kind, owner)
+        jobs = []
+        try:
+            for payload in payloads:
+                jobs.append(self.pool.submit_job(kind, payload, priority, deadline))
+        except Exception:
+            self._cancel_jobs(jobs)
+            raise
+        record.jobs = jobs
+        self._track(record)
+
+        remaining = [len(record.jobs)]
+        lock = threading.Lock()
+
+        def on_done(future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if future.cancelled() or future.exception() is not None:
+                # One failed part fails the whole job
+                self._on_done(record, future, None)
+                self._cancel_jobs(jobs)
+            elif last:
+                self._on_done(record, future, lambda _: self._combine(jobs, combine, shape))
+
+        for job in jobs:
+            job.future.add_done_callback(on_done)
+        return record
+
+    @staticmethod
+    def _combine(jobs, combine, shape):
+        result = combine([job.future.result() for job in jobs])
+        return shape(result) if shape else result
+
+    def completed(self, kind, result, owner=None):
+        """Record a job that finished without inference (e.g. a rejected frame)"""
+        record = JobRecord(kind, owner)
+        self._track(record)
+        self._finish(record, DONE, result=result)
+        return record
+
+    def _track(self, record):
+        with self._lock:
+            self._purge()
+            self.records[record.id] = record
+
+    def _on_done(self, record, future, shape):
+        if future.cancelled() or record.status == CANCELLED:
+            self._finish(record, CANCELLED, error='Job cancelled')
+            return
+        error = future.exception()
+        if isinstance(error, CancelledError):
+            self._finish(record, CANCELLED, error='Job cancelled')
+        elif error is not None:
+            self._finish(record, FAILED, error=str(error))
+        else:
+            try:
+                result = future.result()
+                self._finish(record, DONE, result=shape(result) if shape else result)
+            except Exception as e:
+                self._finish(record, FAILED, error=str(e))
+
+    def _finish(self, record, status, result=None, error=None):
+        with self._lock:
+            if record.status in FINISHED:
+                return
+            record.status = status
+            record.result = result
+            record.error = error
+            record.finished_at = time.time()
+            record.jobs = []
+        record.done.set()
+        log_event(logger, 'job.finished', job_id=record.id, kind=record.kind, status=status,
+                  duration_ms=round((record.finished_at - record.created_at) * 1000, 1))
+
+    def _purge(self):
+        """Drop finished jobs past their TTL (caller holds the lock)"""
+        now = time.time()
+        expired = [job_id for job_id, r in self.records.items()
+                   if r.finished_at and now - r.finished_at > self.ttl]
+        for job_id in expired:
+            del self.records[job_id]
+
+        if len(self.records) >= MAX_JOBS:
+            finished = sorted((r for r in self.records.values() if r.finished_at),
+                              key=lambda r: r.finished_at)
+            for r in finished[:len(self.records) - MAX_JOBS + 1]:
+                del self.records[r.id]
+
+    def get(self, job_id, owner=None):
+        """
+        The job's record, or None if the id is unknown or the job belongs
+        to another owner
+        """
+        with self._lock:
+            self._purge()
+            record = self.records.get(job_id)
+        if record is not None and record.owner is not None:
+            if owner is None or not hmac.compare_digest(str(owner), str(record.owner)):
+                return None
+        return record
+
+    def wait(self, job_id, timeout, owner=None):
+        """Long-poll: block up to timeout seconds for the job to finish"""
+        record = self.get(job_id, owner)
+        if record is not None and timeout > 0:
+            record.done.wait(timeout)
+        return record
+
+    def cancel(self, job_id, owner=None):
+        """
+        Cancel a queued or running job
+
+        Parts still queued are dropped. A part already running is left to
+        finish (stopping a Whisper worker would force a cold model reload)
+        and its result is discarded.
+
+        Returns:
+            The JobRecord, or None if the id is unknown or not the owner's
+        """
+        record = self.get(job_id, owner)
+        if record is None or record.status in FINISHED:
+            return record
+
+        self._cancel_jobs(record.jobs)
+        self._finish(record, CANCELLED, error='Job cancelled')
+        return record
+
+    def _cancel_jobs(self, jobs):
+        for job in jobs:
+            if not job.future.done():
+                self.pool.cancel(job)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for record in self.records.values():
+                counts[record.status] = counts.get(record.status, 0) + 1
+            return counts
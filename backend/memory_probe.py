@@ -0,0 +1,293 @@
+"""
+Memory instrumentation for the inference path
+Records how much each sampled request moved the server's RSS (and, while
+tracemalloc is tracing, the Python heap), and takes and diffs tracemalloc
+snapshots to find where memory that keeps growing was allocated.
+
+Deltas are process-wide: with several requests in flight they overlap, so
+read them as per-endpoint trends, not exact per-request costs. Whisper runs
+in worker processes (see inference_pool.py); their RSS is reported by
+memory_usage() but not attributed to requests.
+
+Environment:
+    MEMORY_PROBE          1 to record per-request deltas (default off)
+    MEMORY_SAMPLE_RATE    record 1 in N requests (default 1 = every request)
+    MEMORY_TRACE_FRAMES   >0 starts tracemalloc at startup with that many
+                          frames per allocation (slows allocations; default 0:
+                          tracing starts with the first snapshot)
+"""
+
+import itertools
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from flask import g, request
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('memory')
+
+
+def _env_int(name, default):
+    """Integer setting; a malformed value falls back to the default instead of failing the import"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid %s=%r, using %d", name, value, default)
+        return default
+
+
+ENABLED = os.getenv('MEMORY_PROBE', '').lower() in ('1', 'true', 'yes')
+SAMPLE_RATE = _env_int('MEMORY_SAMPLE_RATE', 1)
+TRACE_FRAMES = _env_int('MEMORY_TRACE_FRAMES', 0)
+SNAPSHOTS_KEPT = 5
+DIFF_GROUPS = ('lineno', 'filename', 'traceback')
+IGNORED_FILES = ('<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', '<unknown>',
+                 tracemalloc.__file__)
+
+_snapshots = {}  # id -> (snapshot, info)
+_snapshot_ids = itertools.count(1)
+_snapshot_lock = threading.Lock()
+
+
+# ==================== PROCESS MEMORY ====================
+
+def process_rss(pid=None):
+    """
+    Resident set size of a process in bytes (default: this one)
+
+    Returns:
+        Bytes, or None where it cannot be read (no /proc and no psutil)
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:  # psutil missing, or the process is gone
+        return None
+
+
+def _kb(value):
+    return None if value is None else round(value / 1024, 1)
+
+
+def memory_usage(worker_pids=()):
+    """RSS of the server and its worker processes, and the traced Python heap, in KB"""
+    workers = {str(pid): _kb(process_rss(pid)) for pid in worker_pids if pid}
+    usage = {
+        'rss_kb': _kb(process_rss()),
+        'workers_rss_kb': workers,
+        'total_rss_kb': None,
+        'tracing': tracemalloc.is_tracing(),
+        'traced_kb': None,
+        'traced_peak_kb': None,
+    }
+    if usage['rss_kb'] is not None:
+        usage['total_rss_kb'] = round(usage['rss_kb'] + sum(v for v in workers.values() if v), 1)
+    if usage['tracing']:
+        current, peak = tracemalloc.get_traced_memory()
+        usage['traced_kb'], usage['traced_peak_kb'] = _kb(current), _kb(peak)
+    return usage
+
+
+# ==================== SNAPSHOTS ====================
+
+def take_snapshot():
+    """
+    Take and keep a tracemalloc snapshot (the oldest is dropped past SNAPSHOTS_KEPT)
+
+    Starts tracing if it was off; that first snapshot is then nearly empty
+    and serves as the baseline for later diffs.
+
+    Returns:
+        Info dict of the snapshot (id, created_at, traced_kb, ...)
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(max(TRACE_FRAMES, 1))
+        log_event(logger, 'memory.tracing_started', frames=tracemalloc.get_traceback_limit())
+    snapshot = _filtered(tracemalloc.take_snapshot())
+    info = {
+        'created_at': datetime.now().isoformat(),
+        'traced_kb': _kb(sum(stat.size for stat in snapshot.statistics('filename'))),
+        'rss_kb': _kb(process_rss()),
+        'frames': tracemalloc.get_traceback_limit(),
+        'tracing_started': started,
+    }
+    with _snapshot_lock:
+        info['id'] = next(_snapshot_ids)
+        _snapshots[info['id']] = (snapshot, info)
+        for old in sorted(_snapshots)[:-SNAPSHOTS_KEPT]:
+            del _snapshots[old]
+    log_event(logger, 'memory.snapshot', **info)
+    return info
+
+
+def _filtered(snapshot):
+    return snapshot.filter_traces([tracemalloc.Filter(False, name) for name in IGNORED_FILES])
+
+
+def list_snapshots():
+    with _snapshot_lock:
+        return [info for _, info in sorted(_snapshots.values(), key=lambda item: item[1]['id'])]
+
+
+def diff_snapshots(from_id, to_id=None, limit=20, group='lineno'):
+    """
+    Allocation growth between two snapshots
+
+    Args:
+        from_id: Id of the older snapshot
+        to_id: Id of the newer snapshot (default: a fresh one, not kept)
+        limit: Entries returned, largest growth first
+        group: 'lineno', 'filename' or 'traceback'
+
+    Returns:
+        Dict with the total growth and the top entries
+
+    Raises:
+        KeyError: unknown snapshot id
+        ValueError: invalid group
+    """
+    if group not in DIFF_GROUPS:
+        raise ValueError(f"group must be one of {', '.join(DIFF_GROUPS)}")
+    with _snapshot_lock:
+        old = _snapshots[from_id][0]
+        new = _snapshots[to_id][0] if to_id is not None else None
+    if new is None:
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc is not tracing; take a snapshot first")
+        new = _filtered(tracemalloc.take_snapshot())
+
+    stats = new.compare_to(old, group)
+    entries = []
+    for stat in stats[:limit]:
+        frames = stat.traceback.format() if group == 'traceback' else None
+        entries.append({
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+                        if group != 'filename' else stat.traceback[0].filename,
+            'size_kb': _kb(stat.size),
+            'size_diff_kb': _kb(stat.size_diff),
+            'count': stat.count,
+            'count_diff': stat.count_diff,
+            'traceback': frames,
+        })
+    return {
+        'from': from_id,
+        'to': to_id,
+        'group': group,
+        'size_diff_kb': _kb(sum(stat.size_diff for stat in stats)),
+        'count_diff': sum(stat.count_diff for stat in stats),
+        'top': entries,
+    }
+
+
+# ==================== PER-REQUEST PROBE ====================
+
+class MemoryProbe:
+    """Records RSS / traced-heap deltas of sampled requests per endpoint"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.sampled = 0
+        self.in_flight = 0
+        self.endpoints = {}
+        self.recent = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Before a request: snapshot RSS and traced memory if it is sampled"""
+        if request.method == 'OPTIONS' or self.sample_rate <= 0:
+            return
+        if self.sample_rate > 1 and random.randrange(self.sample_rate):
+            return
+        with self._lock:
+            self.in_flight += 1
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        g.memory_probe = (process_rss(), traced, time.perf_counter())
+
+    def finish(self, response):
+        """After a request: record its deltas"""
+        probe = g.pop('memory_probe', None)
+        if probe is None:
+            return response
+        rss_before, traced_before, start = probe
+        rss = process_rss()
+        traced = None
+        if traced_before is not None and tracemalloc.is_tracing():
+            traced = tracemalloc.get_traced_memory()[0]
+        sample = {
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'rss_kb': _kb(rss),
+            'rss_delta_kb': _kb(rss - rss_before) if rss is not None and rss_before is not None else None,
+            'traced_delta_kb': _kb(traced - traced_before) if traced is not None else None,
+            'concurrent': self.in_flight,
+        }
+        with self._lock:
+            self.in_flight -= 1
+            self.sampled += 1
+            self.recent.appendleft(sample)
+            totals = self.endpoints.setdefault(request.path, {
+                'requests': 0, 'rss_delta_kb': 0.0, 'max_rss_delta_kb': 0.0,
+                'traced_requests': 0, 'traced_delta_kb': 0.0})
+            totals['requests'] += 1
+            if sample['rss_delta_kb'] is not None:
+                totals['rss_delta_kb'] += sample['rss_delta_kb']
+                totals['max_rss_delta_kb'] = max(totals['max_rss_delta_kb'], sample['rss_delta_kb'])
+            if sample['traced_delta_kb'] is not None:
+                totals['traced_requests'] += 1
+                totals['traced_delta_kb'] += sample['traced_delta_kb']
+        log_event(logger, 'memory.request', **sample)
+        return response
+
+    def stats(self):
+        """Per-endpoint totals and averages, and the most recent samples"""
+        with self._lock:
+            endpoints = {}
+            for path, totals in self.endpoints.items():
+                entry = {key: round(value, 1) if isinstance(value, float) else value
+                         for key, value in totals.items()}
+                entry['avg_rss_delta_kb'] = round(totals['rss_delta_kb'] / totals['requests'], 1)
+                entry['avg_traced_delta_kb'] = None
+                if totals['traced_requests']:
+                    entry['avg_traced_delta_kb'] = round(totals['traced_delta_kb'] / totals['traced_requests'], 1)
+                endpoints[path] = entry
+            return {
+                'sample_rate': self.sample_rate,
+                'sampled': self.sampled,
+                'endpoints': endpoints,
+                'recent': list(self.recent)[:20],
+            }
+
+
+def init_app(app):
+    """
+    Start tracing (MEMORY_TRACE_FRAMES) and per-request recording (MEMORY_PROBE)
+
+    Returns:
+        The MemoryProbe, or None when per-request recording is off
+    """
+    if TRACE_FRAMES > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+    if not ENABLED:
+        return None
+    probe = MemoryProbe()
+    app.before_request(probe.begin)
+    app.after_request(probe.finish)
+    log_event(logger, 'memory.probe_started', sample_rate=probe.sample_rate,
+              tracing=tracemalloc.is_tracing())
+    return probe
@@ -0,0 +1,119 @@
+"""
+Hot model swaps
+Switches the Whisper model and/or the Gemini models of a running server in
+the background: the new models load and warm up next to the old ones, traffic
+moves over at once, requests in flight finish on the old models, which are
+then freed. Until the switch, and if loading fails, the old models keep
+serving - there is no cold-start gap.
+
+Gemini models switch before Whisper. If the Whisper step then fails, the
+swap ends in state "partial": the new Gemini models serve, Whisper keeps
+its old model (or, if only some workers switched in time, reports the mix
+in the error).
+
+Triggered through POST /api/admin/models or, on POSIX, by SIGHUP after
+editing WHISPER_MODEL / GEMINI_MODELS / VISION_CASCADE in .env.
+"""
+
+import threading
+import time
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('models')
+
+
+class SwapInProgressError(Exception):
+    """Another model swap is still running"""
+
+
+class ModelSwapper:
+    """Runs one model swap at a time on a background thread"""
+
+    def __init__(self, inference=None, vision=None):
+        self.inference = inference
+        self.vision = vision
+        self.last = None  # status of the running or last swap
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Models serving traffic now"""
+        return {
+            'whisper_model': (self.inference.whisper_model
+                              if self.inference and self.inference.speech else None),
+            'gemini_models': self.vision.pool.models if self.vision else None,
+            'cascade': self.vision.cascade if self.vision else None,
+        }
+
+    def busy(self):
+        return self.last is not None and self.last['state'] == 'running'
+
+    def start(self, whisper_model=None, gemini_models=None, cascade=None):
+        """
+        Start swapping in the background
+
+        Args:
+            whisper_model: New Whisper model name (None to keep the current one)
+            gemini_models: New Gemini model list (None to keep the current ones)
+            cascade: New VISION_CASCADE spec (needs the vision role)
+
+        Returns:
+            The swap status dict (state 'running')
+
+        Raises:
+            SwapInProgressError: a swap is already running
+            ValueError: nothing to swap, or a service this node does not run
+        """
+        if whisper_model and not (self.inference and self.inference.speech):
+            raise ValueError("This server does not run speech transcription")
+        if (gemini_models or cascade is not None) and self.vision is None:
+            raise ValueError("This server does not run vision analysis")
+        if not whisper_model and not gemini_models and cascade is None:
+            raise ValueError("Nothing to swap: give whisper_model, gemini_models or cascade")
+
+        with self._lock:
+            if self.busy():
+                raise SwapInProgressError("A model swap is already running")
+            self.last = {
+                'state': 'running',
+                'requested': {'whisper_model': whisper_model, 'gemini_models': gemini_models,
+                              'cascade': cascade},
+                'previous': self.current(),
+                'started_at': time.time(),
+                'finished_at': None,
+                'error': None,
+                'switched': [],  # services whose new models took over
+            }
+            status = dict(self.last)
+        threading.Thread(target=self._run, args=(whisper_model, gemini_models, cascade),
+                         name='model-swap', daemon=True).start()
+        return status
+
+    def _run(self, whisper_model, gemini_models, cascade):
+        start = time.monotonic()
+        switched = self.last['switched']
+        try:
+            if gemini_models or cascade is not None:
+                self.vision.swap_models(gemini_models or self.vision.pool.models, cascade)
+                switched.append('gemini')
+            if whisper_model and whisper_model != self.inference.whisper_model:
+                self.inference.swap_whisper_model(whisper_model)
+                switched.append('whisper')
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if switched:
+                # Earlier steps already took over; only the failed one kept its old model
+                logger.error("Model swap partly failed: %s switched, the rest failed: %s",
+                             ', '.join(switched), e)
+                self.last.update(state='partial', error=error, finished_at=time.time())
+            else:
+                logger.error("Model swap failed, previous models still serving: %s", e)
+                self.last.update(state='failed', error=error, finished_at=time.time())
+        else:
+            self.last.update(state='done', finished_at=time.time())
+        log_event(logger, 'models.swap', state=self.last['state'], error=self.last['error'],
+                  switched=switched, duration_ms=round((time.monotonic() - start) * 1000, 1),
+                  **self.current())
+
+    def status(self):
+        return {'current': self.current(), 'last_swap': self.last}
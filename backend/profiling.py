@@ -0,0 +1,354 @@
+"""
+On-demand request profiling
+Opt-in per-request profiles for slow endpoints. A request is profiled when it
+carries the X-Profile header or is picked by 1-in-N random sampling.
+
+- cprofile: deterministic cProfile of the request thread (.prof, open with
+  snakeviz or pstats) plus a text summary (.txt)
+- sample:   stack sampling of the request thread, written as folded stacks
+  (.folded, for flamegraph.pl / speedscope)
+
+Inference jobs the request submits are followed onto their lane thread
+(see run_job in inference_pool.py): cprofile profiles each job on that thread
+and adds it to the capture, sample mode samples that thread while it runs the
+job. Python 3.12+ allows one cProfile at a time per process, so a job (or a
+second request) that finds the profiler taken is sampled instead, into a
+.folded file next to the .prof. Stacks and summary sections are tagged with the job id, and other
+requests' jobs on the same lanes stay out of the profile. Jobs that run in
+Whisper worker processes cannot be profiled from here; the capture lists
+them as not profiled.
+
+With PROFILING_ENABLED unset, @profiled returns the view unchanged, so the
+hooks cost nothing.
+
+Environment:
+    PROFILING_ENABLED    1 to enable the hooks (default off)
+    PROFILE_SAMPLE_RATE  profile 1 in N requests at random (default 0 = header only)
+    PROFILE_MODE         mode for randomly sampled requests: cprofile / sample (default cprofile)
+    PROFILE_DIR          output directory (default profiles)
+    PROFILE_KEEP         captures kept on disk (default 200)
+"""
+
+import cProfile
+import contextvars
+import functools
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from structured_logging import get_logger, log_event, request_id_var
+
+logger = get_logger('profiling')
+
+PROFILE_HEADER = 'X-Profile'
+MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+SUMMARY_LINES = 40
+OUT_OF_PROCESS_NOTE = 'ran in a worker process; not visible to the profiler'
+SAMPLED_NOTE = 'another profiler was active; sampled instead'
+
+
+def _env_int(name, default):
+    """Integer setting; a malformed value falls back to the default instead of failing the import"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid %s=%r, using %d", name, value, default)
+        return default
+
+
+ENABLED = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+SAMPLE_RATE = _env_int('PROFILE_SAMPLE_RATE', 0)
+DEFAULT_MODE = os.getenv('PROFILE_MODE', 'cprofile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+KEEP = _env_int('PROFILE_KEEP', 200)
+
+_recent = deque(maxlen=100)
+_lock = threading.Lock()
+_capture = contextvars.ContextVar('profile_capture', default=None)
+
+
+class StackSampler:
+    """Samples the stacks of selected threads on a background thread"""
+
+    def __init__(self, thread_ids, interval=SAMPLE_INTERVAL):
+        self.threads = {thread_id: 'request' for thread_id in thread_ids}  # id -> stack tag
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def watch(self, thread_id, tag):
+        self.threads[thread_id] = tag
+
+    def unwatch(self, thread_id):
+        self.threads.pop(thread_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, tag in list(self.threads.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(tag)
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Capture:
+    """Profiling state of one request, shared with the inference jobs it submits"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.sampler = None     # sample mode, or jobs cProfile could not take in cprofile mode
+        self.jobs = []          # what happened to each job, for the capture record
+        self.job_profiles = []  # (job label, cProfile.Profile) in cprofile mode
+        self.closed = False     # the request finished; late jobs are not profiled
+        self._lock = threading.Lock()
+
+    def job_sampler(self):
+        """The capture's stack sampler, started on first use (None once the request finished)"""
+        with self._lock:
+            if self.closed:
+                return None
+            if self.sampler is None:
+                self.sampler = StackSampler([])
+                self.sampler.start()
+            return self.sampler
+
+    def record(self, job, lane, profiled, note=None):
+        with self._lock:
+            self.jobs.append({'job_id': job.id, 'kind': job.kind, 'lane': lane,
+                              'profiled': profiled, 'note': note})
+
+
+def current_capture():
+    """Capture of the request being profiled in this context, or None"""
+    return _capture.get()
+
+
+def run_job(job, lane, func, *args):
+    """
+    Run an inference job on the current (lane) thread, profiling it if the
+    request that submitted it is being profiled
+
+    Args:
+        job: inference_pool.Job (its capture was taken when it was submitted)
+        lane: Lane name, for the capture record
+        func: Callable doing the work
+    """
+    capture = getattr(job, 'capture', None)
+    if capture is None:
+        return func(*args)
+    tag = f"job-{job.id} {job.kind}"
+    if capture.mode == 'cprofile':
+        profiler = _start_profiler()
+        if profiler is not None:
+            capture.record(job, lane, profiled=True)
+            try:
+                return func(*args)
+            finally:
+                profiler.disable()
+                with capture._lock:
+                    capture.job_profiles.append((tag, profiler))
+        capture.record(job, lane, profiled=True, note=SAMPLED_NOTE)
+    else:
+        capture.record(job, lane, profiled=True)
+    sampler = capture.job_sampler()
+    if sampler is None:
+        return func(*args)
+    thread_id = threading.get_ident()
+    sampler.watch(thread_id, tag)
+    try:
+        return func(*args)
+    finally:
+        sampler.unwatch(thread_id)
+
+
+def _start_profiler():
+    """An enabled cProfile.Profile, or None while another profiler is active (Python 3.12+)"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def note_out_of_process(job, lane):
+    """Record that a profiled request's job ran where the profiler cannot see it"""
+    capture = getattr(job, 'capture', None)
+    if capture is not None:
+        capture.record(job, lane, profiled=False, note=OUT_OF_PROCESS_NOTE)
+
+
+def _requested_mode(request):
+    """Profiling mode for this request, or None"""
+    header = request.headers.get(PROFILE_HEADER)
+    if header:
+        return header.lower() if header.lower() in MODES else DEFAULT_MODE
+    if SAMPLE_RATE and random.randrange(SAMPLE_RATE) == 0:
+        return DEFAULT_MODE
+    return None
+
+
+def _save(endpoint, mode, duration, write, capture):
+    """Write a capture and remember it; a failure is logged, never raised into the response"""
+    # Request IDs can come from the client: keep them filename-safe
+    request_id = re.sub(r'[^A-Za-z0-9_-]', '', request_id_var.get() or '') or 'none'
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{endpoint}_{request_id}"
+        files = write(os.path.join(PROFILE_DIR, base))
+    except Exception:
+        logger.exception("Could not save the profile of %s (request %s)", endpoint, request_id)
+        return
+
+    capture = {
+        'endpoint': endpoint,
+        'request_id': request_id,
+        'mode': mode,
+        'duration_ms': round(duration * 1000, 1),
+        'created_at': datetime.now().isoformat(),
+        'files': [os.path.basename(f) for f in files],
+        'jobs': list(capture.jobs)
+    }
+    with _lock:
+        _recent.appendleft(capture)
+        _trim()
+    log_event(logger, 'profile.captured', **capture)
+
+
+def _trim():
+    """Keep at most KEEP captures on disk (caller holds the lock)"""
+    try:
+        names = sorted(os.listdir(PROFILE_DIR))
+    except OSError:
+        return
+    bases = sorted({name.rsplit('.', 1)[0] for name in names})
+    for base in bases[:max(len(bases) - KEEP, 0)]:
+        for name in names:
+            if name.rsplit('.', 1)[0] == base:
+                os.remove(os.path.join(PROFILE_DIR, name))
+
+
+def _run_cprofile(endpoint, view, args, kwargs):
+    profiler = _start_profiler()
+    if profiler is None:
+        logger.info("cProfile is busy with another request; sampling %s instead", endpoint)
+        return _run_sampler(endpoint, view, args, kwargs)
+    capture = Capture('cprofile')
+    token = _capture.set(capture)
+    start = time.perf_counter()
+    try:
+        return view(*args, **kwargs)
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - start
+        _capture.reset(token)
+        with capture._lock:
+            capture.closed = True
+            job_profiles = list(capture.job_profiles)
+            sampler = capture.sampler
+        if sampler is not None:
+            sampler.stop()
+
+        def write(base):
+            # The .prof holds the request and its jobs; the summary shows each on its own
+            combined = pstats.Stats(profiler)
+            for _, job_profiler in job_profiles:
+                combined.add(job_profiler)
+            combined.dump_stats(base + '.prof')
+            files = [base + '.prof', base + '.txt']
+            summary = io.StringIO()
+            summary.write("== request thread ==\n")
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+            for tag, job_profiler in job_profiles:
+                summary.write(f"== {tag} (lane thread) ==\n")
+                pstats.Stats(job_profiler, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+            for job in capture.jobs:
+                if job['note']:
+                    summary.write(f"== job-{job['job_id']} {job['kind']}: {job['note']} ==\n")
+            if sampler is not None:
+                with open(base + '.folded', 'w') as f:
+                    f.write(sampler.folded())
+                files.append(base + '.folded')
+            with open(base + '.txt', 'w') as f:
+                f.write(summary.getvalue())
+            return files
+
+        _save(endpoint, 'cprofile', duration, write, capture)
+
+
+def _run_sampler(endpoint, view, args, kwargs):
+    capture = Capture('sample')
+    capture.sampler = StackSampler([threading.get_ident()])
+    token = _capture.set(capture)
+    start = time.perf_counter()
+    capture.sampler.start()
+    try:
+        return view(*args, **kwargs)
+    finally:
+        with capture._lock:
+            capture.closed = True
+        capture.sampler.stop()
+        duration = time.perf_counter() - start
+        _capture.reset(token)
+
+        def write(base):
+            with open(base + '.folded', 'w') as f:
+                f.write(capture.sampler.folded())
+            return [base + '.folded']
+
+        _save(endpoint, 'sample', duration, write, capture)
+
+
+def profiled(view):
+    """Decorate a Flask view so it can be profiled on demand"""
+    if not ENABLED:
+        return view
+
+    from flask import request
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = _requested_mode(request)
+        if mode is None:
+            return view(*args, **kwargs)
+        run = _run_sampler if mode == 'sample' else _run_cprofile
+        return run(view.__name__, view, args, kwargs)
+
+    return wrapper
+
+
+def recent_profiles(limit=50):
+    """Most recent captures, newest first"""
+    with _lock:
+        return list(_recent)[:limit]
@@ -0,0 +1,283 @@
+"""
+Hand2Voice - Traffic Replay
+Replays a corpus recorded with TRAFFIC_CAPTURE=1 (see traffic_capture.py)
+against a running server, keeping the recorded arrival times - and so the
+recorded concurrency - at 1x or scaled by --speed, and compares latencies
+with the recording.
+
+For deterministic model answers, point the server at the stand-in replaying
+the same corpus:
+    python vision/standin_server.py --replay traffic/20261019-120000 --recorded-latency
+    GEMINI_BASE_URL=http://localhost:8765 GEMINI_API_KEY=test python finalserver.py
+
+Usage:
+    python replay_traffic.py traffic/20261019-120000
+    python replay_traffic.py traffic/20261019-120000 --speed 4 --target http://localhost:5004
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+MAX_JOB_WAIT = 30  # long-poll seconds per job status request (server maximum)
+CLIENT_ID_HEADER = 'X-Client-ID'
+
+
+def load_corpus(corpus, limit=None):
+    """Recorded requests, in arrival order"""
+    entries = []
+    with open(os.path.join(corpus, 'requests.jsonl'), encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # torn last line of an interrupted capture
+    entries.sort(key=lambda entry: entry['offset_s'])
+    return entries[:limit] if limit else entries
+
+
+def encode_multipart(fields, files):
+    """
+    multipart/form-data body
+
+    Args:
+        fields: Dict of form fields
+        files: List of (field, filename, content_type, bytes)
+
+    Returns:
+        (body, content_type)
+    """
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        lines.append(str(value).encode('utf-8') + b'\r\n')
+    for field, filename, content_type, data in files:
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                     f'filename="{filename}"\r\nContent-Type: {content_type or "application/octet-stream"}'
+                     f'\r\n\r\n'.encode())
+        lines.append(data + b'\r\n')
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+
+def build_request(target, corpus, entry):
+    """urllib Request for a recorded entry"""
+    blob_dir = os.path.join(corpus, 'blobs')
+
+    def blob(name):
+        with open(os.path.join(blob_dir, name), 'rb') as f:
+            return f.read()
+
+    headers = dict(entry.get('headers', {}))
+    if entry.get('files') or entry.get('form'):
+        # Files recorded without a blob (images that could not be sanitized) are left out
+        files = [(f['field'], f['filename'], f.get('content_type'), blob(f['blob']))
+                 for f in entry.get('files', []) if f.get('blob')]
+        body, headers['Content-Type'] = encode_multipart(entry.get('form', {}), files)
+    else:
+        body = blob(entry['body_blob']) if entry.get('body_blob') else b''
+        headers['Content-Type'] = entry.get('content_type') or 'application/octet-stream'
+    return urllib.request.Request(target + entry['path'], data=body, headers=headers, method='POST')
+
+
+def send(req, timeout):
+    """(status, parsed JSON body or None)"""
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            status, raw = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    try:
+        return status, json.loads(raw)
+    except ValueError:
+        return status, None
+
+
+def wait_for_job(target, job_id, timeout, owner=None):
+    """
+    Long-poll a job until it finishes; returns its final status
+
+    Args:
+        owner: Identity the job was submitted with (its recorded session_id);
+               the server hides owned jobs from anyone else
+    """
+    headers = {CLIENT_ID_HEADER: owner} if owner else {}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        wait = max(1, min(MAX_JOB_WAIT, int(deadline - time.monotonic())))
+        req = urllib.request.Request(f"{target}/api/jobs/{job_id}?wait={wait}", headers=headers)
+        status, data = send(req, wait + 10)
+        if status != 200 or not data:
+            return 'missing'
+        if data.get('status') in ('done', 'failed', 'cancelled'):
+            return data['status']
+    return 'timeout'
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Replay:
+    """Sends the corpus on a schedule and collects per-request results"""
+
+    def __init__(self, corpus, target, speed=1.0, max_concurrency=0, timeout=120):
+        self.corpus = corpus
+        self.target = target.rstrip('/')
+        self.speed = speed
+        self.timeout = timeout
+        self.results = []
+        self.in_flight = 0
+        self.peak = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+
+    def _run_one(self, entry):
+        req = build_request(self.target, self.corpus, entry)
+        if self._slots:
+            self._slots.acquire()
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        start = time.perf_counter()
+        job_ms = job_status = None
+        try:
+            status, data = send(req, self.timeout)
+            duration_ms = (time.perf_counter() - start) * 1000
+            if status == 202 and data and data.get('job_id'):
+                job_status = wait_for_job(self.target, data['job_id'], self.timeout,
+                                          entry.get('form', {}).get('session_id'))
+                job_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:  # connection refused, timeouts
+            status, duration_ms = f"error: {e.__class__.__name__}", (time.perf_counter() - start) * 1000
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if self._slots:
+                self._slots.release()
+        with self._lock:
+            self.results.append({
+                'path': entry['path'],
+                'recorded_status': entry.get('status'),
+                'status': status,
+                'recorded_ms': entry.get('duration_ms'),
+                'duration_ms': round(duration_ms, 1),
+                'job_status': job_status,
+                'job_ms': None if job_ms is None else round(job_ms, 1),
+            })
+
+    def run(self, entries):
+        """Send every entry at its recorded offset / speed and wait for all of them"""
+        threads = []
+        first = entries[0]['offset_s'] if entries else 0
+        start = time.monotonic()
+        for entry in entries:
+            due = start + (entry['offset_s'] - first) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            thread = threading.Thread(target=self._run_one, args=(entry,), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+
+def summarize(results, entries, wall_time):
+    """Per-path latency comparison and status mismatches"""
+    paths = {}
+    for result in results:
+        paths.setdefault(result['path'], []).append(result)
+    summary = {'requests': len(results), 'wall_time_s': round(wall_time, 2),
+               'recorded_peak_concurrency': max((e.get('in_flight', 1) for e in entries), default=0),
+               'paths': {}}
+    for path, rows in sorted(paths.items()):
+        recorded = [r['recorded_ms'] for r in rows if r['recorded_ms'] is not None]
+        replayed = [r['duration_ms'] for r in rows]
+        jobs = [r['job_ms'] for r in rows if r['job_ms'] is not None]
+        summary['paths'][path] = {
+            'count': len(rows),
+            'status_mismatches': sum(1 for r in rows if r['status'] != r['recorded_status']),
+            'recorded_p50_ms': percentile(recorded, 0.5),
+            'recorded_p95_ms': percentile(recorded, 0.95),
+            'replay_p50_ms': percentile(replayed, 0.5),
+            'replay_p95_ms': percentile(replayed, 0.95),
+            'job_p50_ms': percentile(jobs, 0.5),
+            'job_p95_ms': percentile(jobs, 0.95),
+            'failed_jobs': sum(1 for r in rows if r['job_status'] not in (None, 'done')),
+        }
+    return summary
+
+
+def _ms(value):
+    return '-' if value is None else f"{value:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', help='Corpus directory written by traffic capture')
+    parser.add_argument('--target', default='http://localhost:5004', help='Server to replay against')
+    parser.add_argument('--speed', type=float, default=1.0, help='Time scale (2 = twice as fast)')
+    parser.add_argument('--max-concurrency', type=int, default=0,
+                        help='Cap on requests in flight (default 0 = as recorded)')
+    parser.add_argument('--limit', type=int, default=0, help='Replay only the first N requests')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout in seconds')
+    parser.add_argument('--json', metavar='FILE', help='Also write the summary and every result as JSON')
+    args = parser.parse_args()
+
+    entries = load_corpus(args.corpus, args.limit)
+    if not entries:
+        print(f"❌ No recorded requests in {args.corpus}")
+        return 1
+    span = entries[-1]['offset_s'] - entries[0]['offset_s']
+
+    print("=" * 60)
+    print("🔁 HAND2VOICE - TRAFFIC REPLAY")
+    print("=" * 60)
+    print(f"\n📼 Corpus: {len(entries)} request(s) over {span:.0f}s, replayed at {args.speed:g}x "
+          f"against {args.target}")
+
+    replay = Replay(args.corpus, args.target, args.speed, args.max_concurrency, args.timeout)
+    wall_time = replay.run(entries)
+    summary = summarize(replay.results, entries, wall_time)
+    summary['replay_peak_concurrency'] = replay.peak
+
+    print(f"\n⏱️  Finished in {wall_time:.1f}s; peak concurrency {replay.peak} "
+          f"(recorded {summary['recorded_peak_concurrency']})")
+    print(f"\n{'path':<24}{'count':>6}{'rec p50':>9}{'rec p95':>9}{'p50':>8}{'p95':>8}{'job p95':>9}")
+    for path, stats in summary['paths'].items():
+        print(f"{path:<24}{stats['count']:>6}{_ms(stats['recorded_p50_ms']):>9}{_ms(stats['recorded_p95_ms']):>9}"
+              f"{_ms(stats['replay_p50_ms']):>8}{_ms(stats['replay_p95_ms']):>8}{_ms(stats['job_p95_ms']):>9}")
+
+    mismatches = sum(stats['status_mismatches'] for stats in summary['paths'].values())
+    failed = sum(stats['failed_jobs'] for stats in summary['paths'].values())
+    print("\n" + "=" * 60)
+    if mismatches or failed:
+        print(f"⚠️  {mismatches} status mismatch(es), {failed} failed job(s)")
+    else:
+        print("✅ Every response status matched the recording")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'results': replay.results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+    return 1 if mismatches or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Hand2Voice - Memory Soak Test
+Runs thousands of analyze / transcribe requests through the server in-process
+(Flask test client) against the Gemini stand-in, and fails if the memory of
+the server and its Whisper workers grows beyond a bound after warm-up, or is
+still climbing over the second half of the run. The allocator keeps some
+memory after load peaks, so RSS rises for a while and then levels off; a leak
+keeps growing.
+
+With tracing on (default) the Python heap is also checked: it should not grow
+at all once warmed up, and the allocations that grew the most are listed at
+the end (see memory_probe.py). This is the sensitive check - freed upload and
+image buffers leave the allocator enough room to absorb a small leak for a
+few thousand requests before RSS shows it.
+
+The Gemini stand-in runs in its own process, so its request log does not
+count as growth. Whisper itself runs for real (WHISPER_MODEL, default tiny
+here) on short synthesized clips; --no-speech soaks the vision path only.
+
+Usage:
+    python soak_test.py
+    python soak_test.py --requests 5000 --concurrency 8 --max-slope-mb 8
+    python soak_test.py --no-speech --json soak.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_SIZES = ((320, 240), (1280, 960), (2400, 1800))  # small JPEG, resized, large
+CLIP_SECONDS = (1.0, 2.0, 3.0)
+SESSIONS = 50  # distinct session ids for 'changes' mode requests
+
+
+def make_images(seed=0):
+    """Encoded test images: JPEGs small enough to pass through and large ones to resize"""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for width, height in IMAGE_SIZES:
+        # Noise keeps the frames sharp enough to pass the quality check
+        pixels = (rng.random((height, width, 3)) * 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def make_clips(seed=0):
+    """16-bit PCM clips of noise 'speech'"""
+    rng = np.random.default_rng(seed)
+    return [((rng.standard_normal(int(16000 * seconds)) * 0.1) * 32767).astype('<i2').tobytes()
+            for seconds in CLIP_SECONDS]
+
+
+def start_stand_in(latency):
+    """
+    Start the Gemini stand-in in a separate process
+
+    Returns:
+        (process, base_url)
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-u', os.path.join(BACKEND_DIR, 'vision', 'standin_server.py'),
+         '--port', '0', '--latency', str(latency)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in process.stdout:
+        if 'running at' in line:
+            return process, line.split()[-1]
+    process.kill()
+    raise RuntimeError("The Gemini stand-in did not start")
+
+
+def rss_mb(server, memory_probe):
+    """Total RSS of the server and its workers in MB (after a collection)"""
+    gc.collect()
+    usage = memory_probe.memory_usage(server.worker_pids())
+    if usage['total_rss_kb'] is None:
+        return None
+    return usage['total_rss_kb'] / 1024
+
+
+def slope_per_1000(points):
+    """Least-squares growth in MB per 1000 requests over (requests, MB) points"""
+    if len(points) < 2:
+        return 0.0
+    x = np.array([p[0] for p in points], dtype=float)
+    y = np.array([p[1] for p in points], dtype=float)
+    return float(np.polyfit(x, y, 1)[0] * 1000)
+
+
+class Soak:
+    """Sends a fixed request mix from several client threads"""
+
+    def __init__(self, client, images, clips, transcribe_share, concurrency):
+        self.client = client
+        self.images = images
+        self.clips = clips
+        self.transcribe_share = transcribe_share
+        self.concurrency = concurrency
+        self.sent = 0
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def _one(self, n):
+        # Spread transcriptions evenly: request n is one when the running share ticks over
+        if self.clips and int((n + 1) * self.transcribe_share) > int(n * self.transcribe_share):
+            response = self.client.post('/api/transcribe', data=self.clips[n % len(self.clips)],
+                                        content_type='audio/L16; rate=16000')
+            path = '/api/transcribe'
+        else:
+            mode = ('general', 'text', 'hazard', 'changes')[n % 4]
+            form = {'image': (io.BytesIO(self.images[n % len(self.images)]), 'frame.jpg'), 'mode': mode}
+            if mode == 'changes':
+                form['session_id'] = f"soak-{n % SESSIONS}"
+            response = self.client.post('/api/analyze', data=form)
+            path = '/api/analyze'
+        if response.status_code != 200:
+            with self._lock:
+                key = f"{path} {response.status_code}"
+                self.failures[key] = self.failures.get(key, 0) + 1
+        response.close()
+
+    def run(self, count):
+        """Send count requests; returns when all have answered"""
+        start = self.sent
+        self.sent += count
+        numbers = iter(range(start, start + count))
+
+        def client_thread():
+            for n in numbers:  # the shared iterator hands out request numbers
+                self._one(n)
+
+        threads = [threading.Thread(target=client_thread) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def soak_server(args, base_url):
+    """Soak the server against the stand-in at base_url; returns the exit code"""
+    admin_token = uuid.uuid4().hex
+    os.environ.update(
+        GEMINI_API_KEYS='soak-key',
+        GEMINI_BASE_URL=base_url,
+        SERVER_ROLES='vision' if args.no_speech else 'vision,speech',
+        WHISPER_MODEL=args.model,
+        MEMORY_PROBE='1',
+        ADMIN_TOKEN=admin_token,
+    )
+    os.environ.pop('TRAFFIC_CAPTURE', None)
+    import finalserver as server
+    import memory_probe
+
+    client = server.app.test_client()
+    admin = {'X-Admin-Token': admin_token}
+    clips = [] if args.no_speech else make_clips()
+    soak = Soak(client, make_images(), clips, 0 if args.no_speech else args.transcribe_share,
+                args.concurrency)
+
+    print(f"\n🔥 Warm-up: {args.warmup} request(s), {args.concurrency} client thread(s)"
+          f"{'' if args.no_speech else f', Whisper {args.model}'}")
+    server.inference.start()
+    soak.run(args.warmup)
+
+    snapshot = None
+    if not args.no_trace:
+        snapshot = client.post('/api/memory/snapshots', headers=admin).get_json()['snapshot']['id']
+        soak.run(max(args.warmup // 4, args.concurrency))  # settle the allocations tracing adds
+        snapshot = client.post('/api/memory/snapshots', headers=admin).get_json()['snapshot']['id']
+    baseline = rss_mb(server, memory_probe)
+    if baseline is None:
+        print("❌ Cannot read process memory on this platform (needs /proc or psutil)")
+        return 1
+    print(f"📏 Baseline: {baseline:.1f} MB (server + workers)")
+
+    points = [(0, baseline)]
+    batch = max(args.requests // max(args.samples, 1), 1)
+    start = time.perf_counter()
+    done = 0
+    while done < args.requests:
+        count = min(batch, args.requests - done)
+        soak.run(count)
+        done += count
+        points.append((done, rss_mb(server, memory_probe)))
+        print(f"   {done:>6} requests  {points[-1][1]:8.1f} MB  ({points[-1][1] - baseline:+.1f})")
+    elapsed = time.perf_counter() - start
+
+    growth = points[-1][1] - baseline
+    slope = slope_per_1000(points[len(points) // 2:])
+    results = {
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'elapsed_s': round(elapsed, 1),
+        'requests_per_s': round(args.requests / elapsed, 1),
+        'baseline_mb': round(baseline, 1),
+        'final_mb': round(points[-1][1], 1),
+        'growth_mb': round(growth, 1),
+        'late_growth_mb_per_1000': round(slope, 2),
+        'max_growth_mb': args.max_growth_mb,
+        'max_slope_mb': args.max_slope_mb,
+        'max_heap_growth_mb': args.max_heap_growth_mb,
+        'failures': soak.failures,
+        'points': [(n, round(mb, 1)) for n, mb in points],
+        'endpoints': client.get('/api/memory', headers=admin).get_json()['requests']['endpoints'],
+        'top_allocations': None,
+    }
+    if snapshot is not None:
+        diff = client.get(f'/api/memory/diff?from={snapshot}&limit=10', headers=admin).get_json()
+        results['traced_growth_kb'] = diff['size_diff_kb']
+        results['top_allocations'] = diff['top']
+
+    print(f"\n⏱️  {args.requests} requests in {elapsed:.1f}s ({results['requests_per_s']} req/s)")
+    print(f"\n{'endpoint':<20}{'requests':>10}{'avg RSS Δ KB':>14}{'avg heap Δ KB':>15}")
+    for path, stats in results['endpoints'].items():
+        heap = '-' if stats['avg_traced_delta_kb'] is None else f"{stats['avg_traced_delta_kb']:.1f}"
+        print(f"{path:<20}{stats['requests']:>10}{stats['avg_rss_delta_kb']:>14.1f}{heap:>15}")
+    if results['top_allocations']:
+        print(f"\n🔎 Python heap growth since warm-up: {results['traced_growth_kb']:+.1f} KB; largest:")
+        for entry in results['top_allocations'][:5]:
+            print(f"   {entry['size_diff_kb']:+9.1f} KB  {entry['count_diff']:+7d}  {entry['location']}")
+
+    print("\n" + "=" * 60)
+    heap_growth = results.get('traced_growth_kb', 0) / 1024
+    ok = (growth <= args.max_growth_mb and slope <= args.max_slope_mb
+          and heap_growth <= args.max_heap_growth_mb and not soak.failures)
+    if soak.failures:
+        print(f"❌ Failed requests: {soak.failures}")
+    if growth > args.max_growth_mb:
+        print(f"❌ Memory grew {growth:.1f} MB after warm-up (bound {args.max_growth_mb:g} MB)")
+    if slope > args.max_slope_mb:
+        print(f"❌ Memory still grows {slope:+.2f} MB per 1000 requests over the second half "
+              f"(bound {args.max_slope_mb:g} MB) - looks like a leak")
+    if heap_growth > args.max_heap_growth_mb:
+        print(f"❌ Python heap grew {heap_growth:.1f} MB after warm-up "
+              f"(bound {args.max_heap_growth_mb:g} MB) - see the allocations above")
+    if ok:
+        print(f"✅ Memory grew {growth:+.1f} MB after warm-up, {slope:+.2f} MB per 1000 requests "
+              f"over the second half (bounds {args.max_growth_mb:g} / {args.max_slope_mb:g} MB)")
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+    server.inference.stop()
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests after warm-up')
+    parser.add_argument('--warmup', type=int, default=200, help='Requests before the baseline is taken')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads')
+    parser.add_argument('--transcribe-share', type=float, default=0.25,
+                        help='Fraction of requests that are transcriptions')
+    parser.add_argument('--max-growth-mb', type=float, default=192,
+                        help='Fail when memory grows more than this after warm-up')
+    parser.add_argument('--max-slope-mb', type=float, default=16,
+                        help='Fail when memory still grows more than this per 1000 requests '
+                             'over the second half')
+    parser.add_argument('--max-heap-growth-mb', type=float, default=16,
+                        help='Fail when the traced Python heap grows more than this after warm-up')
+    parser.add_argument('--samples', type=int, default=10, help='Memory readings during the run')
+    parser.add_argument('--model', default='tiny', help='Whisper model')
+    parser.add_argument('--latency', type=float, default=0.01, help='Stand-in reply delay in seconds')
+    parser.add_argument('--no-speech', action='store_true', help='Only soak the vision path')
+    parser.add_argument('--no-trace', action='store_true',
+                        help='Skip tracemalloc (faster, but only RSS is checked)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧪 HAND2VOICE - MEMORY SOAK TEST")
+    print("=" * 60)
+
+    stand_in, base_url = start_stand_in(args.latency)
+    try:
+        return soak_server(args, base_url)
+    finally:
+        stand_in.terminate()
+        stand_in.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Structured JSON logging for the EchoSight backend
+Records are handed to a queue and written by a background listener thread, so
+request threads never block on a slow stdout pipe. Every request gets a
+correlation ID (X-Request-ID) that is attached to its log lines and echoed in
+the response headers.
+
+Environment:
+    LOG_LEVEL      DEBUG / INFO / WARNING / ERROR (default INFO)
+    LOG_SAMPLING   per-event sample rates, e.g. "http.request=0.1,analyze.done=0.5"
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+LOGGER_NAME = 'echosight'
+MAX_FIELD_LENGTH = 200  # long strings (descriptions, transcripts) are truncated
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+_listener = None
+
+
+def get_logger(name=None):
+    """Logger under the echosight namespace"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def _truncate(value):
+    if isinstance(value, str) and len(value) > MAX_FIELD_LENGTH:
+        return value[:MAX_FIELD_LENGTH] + f"...(+{len(value) - MAX_FIELD_LENGTH} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, msg, request_id, fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'msg': _truncate(record.getMessage()),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in (getattr(record, 'fields', None) or {}).items():
+            entry[key] = _truncate(value)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps tracebacks out of the (truncated) message"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the current request ID (runs on the request thread)"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a fraction of high-volume events; warnings and errors always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, 'event', None))
+        return rate is None or random.random() < rate
+
+
+def parse_sampling(spec):
+    """Parse "event=rate,event=rate" into a dict"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            event, rate = item.split('=', 1)
+            try:
+                rates[event.strip()] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+def setup_logging(level=None, sampling=None, stream=None):
+    """
+    Install the queue-based JSON handler on the echosight logger
+
+    Args:
+        level: Log level name (default: LOG_LEVEL env or INFO)
+        sampling: Dict of event -> sample rate (default: LOG_SAMPLING env)
+        stream: Output stream for the listener (default: stdout)
+    """
+    global _listener
+
+    logger = get_logger()
+    logger.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    logger.propagate = False
+
+    if _listener is not None:
+        return logger
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    # Filters run on the calling thread, before the record is queued
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(sampling if sampling is not None
+                                     else parse_sampling(os.getenv('LOG_SAMPLING'))))
+    logger.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return logger
+
+
+def log_event(logger, event, message=None, level=logging.INFO, **fields):
+    """Log a structured event; fields become top-level JSON keys"""
+    if logger.isEnabledFor(level):
+        logger.log(level, message or event, extra={'event': event, 'fields': fields})
+
+
+def init_app(app):
+    """Assign correlation IDs to Flask requests and log one line per request"""
+    from flask import g, request
+
+    logger = get_logger('http')
+
+    @app.before_request
+    def _start_request():
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_id = request_id[:64]
+        g.request_start = time.perf_counter()
+        request_id_var.set(g.request_id)
+
+    @app.after_request
+    def _finish_request(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+            log_event(logger, 'http.request',
+                      method=request.method,
+                      path=request.path,
+                      status=response.status_code,
+                      duration_ms=round((time.perf_counter() - g.request_start) * 1000, 1))
+        return response
+
+    return app
@@ -0,0 +1,181 @@
+"""
+Hand2Voice - Ask Endpoint Test Script
+Checks /api/ask end to end against the Gemini stand-in: spoken commands are
+routed to the right mode or a custom question, hopeless frames get a hint
+without a remote call, bad uploads are rejected, and a stuck transcription
+answers 504 instead of holding the request forever.
+
+Runs without Whisper installed: the server loads a scripted "whisper"
+module written to a temp directory, which "hears" whatever the probe wrote
+to transcript.txt.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Transcribes to the contents of transcript.txt in the working directory
+SCRIPTED_WHISPER = """
+import time
+
+class _Model:
+    def transcribe(self, audio, **kwargs):
+        with open('transcript.txt') as f:
+            text = f.read()
+        if text == 'HANG':
+            time.sleep(5)
+        return {'text': ' %s ' % text, 'segments': []}
+
+def load_model(name):
+    return _Model()
+"""
+
+# Runs in a fresh interpreter in a temp directory, which receives the server's data files
+ASK_PROBE = """
+import io, json, os
+import numpy as np
+from PIL import Image
+from vision.standin_server import StandInUpstream
+
+stand_in = StandInUpstream().start()
+os.environ.update(GEMINI_API_KEYS='ask-key', GEMINI_BASE_URL=stand_in.base_url)
+import finalserver
+client = finalserver.app.test_client()
+
+def jpeg(pixels):
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+# Noise is sharp and bright enough to pass the quality check; black is not
+SHARP = jpeg((np.random.default_rng(0).random((480, 640, 3)) * 255).astype(np.uint8))
+DARK = jpeg(np.zeros((480, 640, 3), dtype=np.uint8))
+SPEECH = np.zeros(16000, dtype=np.int16).tobytes()
+
+def ask(command, image=SHARP, audio=True, mode='general'):
+    with open('transcript.txt', 'w') as f:
+        f.write(command)
+    form = {'mode': mode}
+    if audio:
+        form['audio'] = (io.BytesIO(SPEECH), 'command.pcm', 'audio/L16; rate=16000')
+    if image is not None:
+        form['image'] = (io.BytesIO(image), 'frame.jpg')
+    sent = len(stand_in.requests)
+    response = client.post('/api/ask', data=form)
+    body = response.get_json()
+    body['status'] = response.status_code
+    # Context cache creation is bookkeeping, not an answer
+    body['upstream_calls'] = sum(':generateContent' in r['path'] for r in stand_in.requests[sent:])
+    return body
+
+results = {
+    'text': ask('read this sign for me'),
+    'hazard': ask('is it safe to cross'),
+    'custom': ask('what color is the mug'),
+    'default': ask('what do you see', mode='text'),
+    'dark': ask('read this sign for me', image=DARK),
+    'no_audio': ask('read this sign', audio=False),
+    'no_image': ask('read this sign', image=None),
+    'bad_image': ask('read this sign', image=b'not a jpeg'),
+}
+finalserver.ASK_TIMEOUT = 1
+results['stuck'] = ask('HANG')
+print(json.dumps(results))
+os._exit(0)  # the stuck transcription is still sleeping on the lane
+"""
+
+
+def probe():
+    """Run the ask probe against a vision+speech node in a subprocess"""
+    with tempfile.TemporaryDirectory() as workdir:
+        fakes = os.path.join(workdir, 'fakes')
+        os.mkdir(fakes)
+        with open(os.path.join(fakes, 'whisper.py'), 'w') as f:
+            f.write(SCRIPTED_WHISPER)
+        env = dict(os.environ, SERVER_ROLES='vision,speech', INFERENCE_WORKERS='0',
+                   LOG_LEVEL='WARNING', PYTHONPATH=os.pathsep.join([fakes, BACKEND_DIR]))
+        out = subprocess.run([sys.executable, '-c', ASK_PROBE], cwd=workdir, env=env,
+                             capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-500:]
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+RESULTS = {}
+
+
+def results():
+    if not RESULTS:
+        RESULTS.update(probe())
+    return RESULTS
+
+
+def test_command_routing():
+    """Spoken commands pick the reading, hazard, custom or default mode"""
+    r = results()
+    for case, mode in (('text', 'text'), ('hazard', 'hazard'), ('custom', 'custom'), ('default', 'text')):
+        assert r[case]['status'] == 200 and r[case]['success'], (case, r[case])
+        assert r[case]['mode'] == mode, (case, r[case]['mode'])
+        assert r[case]['upstream_calls'] == 1, (case, r[case]['upstream_calls'])
+    assert r['text']['command'] == 'read this sign for me'
+    assert r['text']['description'] == 'The sign says: Exit.'
+    assert r['hazard']['description'].startswith('HAZARD_LEVEL'), r['hazard']['description']
+    assert r['custom']['description'] and r['default']['command'] == 'what do you see'
+
+
+def test_hint_skips_upstream():
+    """A dark frame is answered with a hint and no remote call"""
+    dark = results()['dark']
+    assert dark['status'] == 200 and dark['skipped'], dark
+    assert dark['upstream_calls'] == 0
+    assert dark['description'] and dark['command'] == 'read this sign for me'
+
+
+def test_error_paths():
+    """Missing audio, missing image and undecodable images are rejected"""
+    r = results()
+    for case, error in (('no_audio', 'No audio file provided'), ('no_image', 'No image provided'),
+                        ('bad_image', 'Invalid image data')):
+        assert r[case]['status'] == 400 and r[case]['error'] == error, (case, r[case])
+        assert r[case]['upstream_calls'] == 0
+
+
+def test_stuck_transcription_times_out():
+    """Without a client deadline a stuck transcription answers 504"""
+    stuck = results()['stuck']
+    assert stuck['status'] == 504 and not stuck['success'], stuck
+    assert stuck['upstream_calls'] == 0
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - ASK ENDPOINT TEST")
+    print("=" * 60)
+
+    tests = [test_command_routing, test_hint_skips_upstream, test_error_paths,
+             test_stuck_transcription_times_out]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
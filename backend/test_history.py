@@ -0,0 +1,302 @@
+"""
+Hand2Voice - History Test Script
+Checks idempotent history writes: retried keys are ignored while they are
+remembered, also after their entry has been archived, and never leak into
+the history returned to clients. Also checks history search: BM25 ranking,
+per-user isolation, clear(), that searching the archive ranks exactly like
+indexing everything, and that archive segments are indexed once, not per
+search.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from history_index import HistoryIndex
+from history_store import HistoryArchive, IdempotencyKeys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter in a temp directory, which receives the server's data files
+RETRY_PROBE = """
+import json
+import finalserver
+finalserver.HISTORY_LIMIT = 3
+client = finalserver.app.test_client()
+
+def add(key, text):
+    return client.post('/api/history/add', json={
+        'email': 'ada@example.com', 'idempotency_key': key,
+        'entry': {'type': 'vision', 'mode': 'text', 'result': text}}).get_json()
+
+def batch():
+    return client.post('/api/history/add-batch', json={'batch_id': 'sync-1', 'entries': [
+        {'email': 'ada@example.com', 'entry': {'type': 'speech', 'text': 'queued %d' % i}}
+        for i in range(3)]}).get_json()
+
+first = add('k1', 'exit sign')
+retry = add('k1', 'exit sign')
+for i in range(4):
+    add('filler-%d' % i, 'filler %d' % i)  # pushes k1 into the archive
+evicted = add('k1', 'exit sign')
+batch_first = batch()
+batch_retry = batch()
+history = client.post('/api/history/get', json={'email': 'ada@example.com', 'limit': 50}).get_json()
+print(json.dumps({
+    'first': first['message'],
+    'retry': retry['message'],
+    'evicted': evicted['message'],
+    'batch_first': [r['status'] for r in batch_first['results']],
+    'batch_retry': [r['status'] for r in batch_retry['results']],
+    'entries': len(history['history']),
+    'exit_sign': sum(e.get('result') == 'exit sign' for e in history['history']),
+    'leaked_keys': sum('idempotency_key' in e for e in history['history']),
+}))
+"""
+
+
+# A batch whose save fails, then its retry; and timestamps that are not ISO strings
+FAILED_SAVE_PROBE = """
+import json
+import finalserver
+client = finalserver.app.test_client()
+save_history = finalserver.save_history
+
+def failing_save(history_data):
+    raise OSError('No space left on device')
+
+def batch(entries):
+    response = client.post('/api/history/add-batch', json={'batch_id': 'sync-2', 'entries': entries})
+    return response.status_code, response.get_json()
+
+def search(**filters):
+    response = client.post('/api/history/search', json=dict(email='ada@example.com', **filters))
+    return response.status_code, response.get_json()
+
+entries = [{'email': 'ada@example.com', 'entry': {'type': 'speech', 'text': 'offline note %d' % i}}
+           for i in range(2)]
+finalserver.save_history = failing_save
+failed, _ = batch(entries)
+indexed_after_failure = search(query='offline note')[1]['total']
+finalserver.save_history = save_history
+retried, retry = batch(entries)
+bad = [batch([{'email': 'ada@example.com', 'entry': {'text': 'x', 'timestamp': value}}])[0]
+       for value in (12345, 'yesterday', ['2026-01-01'])]
+status, found = search(query='offline note', date_from='2026-01-01')
+print(json.dumps({
+    'failed': failed,
+    'indexed_after_failure': indexed_after_failure,
+    'retried': retried,
+    'retry_added': retry['added'],
+    'bad_timestamps': bad,
+    'search_status': status,
+    'search_total': found['total'],
+}))
+"""
+
+
+def probe(code, cwd):
+    """Run a script against a history node in a subprocess"""
+    env = dict(os.environ, SERVER_ROLES='auth,history', LOG_LEVEL='WARNING', PYTHONPATH=BACKEND_DIR)
+    out = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr[-500:]
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_idempotent_retries():
+    """Retried keys are ignored within the window, after eviction and in batches"""
+    with tempfile.TemporaryDirectory() as workdir:
+        result = probe(RETRY_PROBE, workdir)
+        keys = IdempotencyKeys(os.path.join(workdir, 'idempotency_keys.json'))
+    assert result['first'] == 'History entry added'
+    assert result['retry'] == 'Duplicate entry ignored'
+    assert result['evicted'] == 'Duplicate entry ignored', "archived entry was added again"
+    assert result['batch_first'] == ['added'] * 3
+    assert result['batch_retry'] == ['duplicate'] * 3
+    assert result['entries'] == 1 + 4 + 3 and result['exit_sign'] == 1
+    assert result['leaked_keys'] == 0, "idempotency key returned with the entries"
+    # Keys survive a restart
+    assert keys.seen('ada@example.com', 'k1') and keys.seen('ada@example.com', 'sync-1:2')
+
+
+def test_failed_save_forgets_keys():
+    """A batch whose save failed is added on retry and never shows up in search"""
+    with tempfile.TemporaryDirectory() as workdir:
+        result = probe(FAILED_SAVE_PROBE, workdir)
+    assert result['failed'] == 500
+    assert result['indexed_after_failure'] == 0, "unsaved entries were indexed"
+    assert result['retried'] == 200 and result['retry_added'] == 2, "retry was taken for a duplicate"
+    assert result['bad_timestamps'] == [400, 400, 400]
+    assert result['search_status'] == 200 and result['search_total'] == 2
+
+
+def test_key_expiry():
+    """Keys are forgotten after the TTL and past the per-user cap"""
+    with tempfile.TemporaryDirectory() as workdir:
+        keys = IdempotencyKeys(os.path.join(workdir, 'keys.json'), ttl=60, max_per_user=3)
+        keys.add('a', 'old')
+        keys.keys['a']['old'] -= 120  # added two minutes ago
+        assert not keys.seen('a', 'old')
+        for key in ('k1', 'k2', 'k3', 'k4'):
+            keys.add('a', key)
+        assert list(keys.keys['a']) == ['k2', 'k3', 'k4']
+        assert keys.seen('a', 'k4') and not keys.seen('a', 'k1')
+        assert not keys.seen('b', 'k4'), "keys leaked across users"
+
+
+def entry(day, result, mode='general'):
+    return {'timestamp': f'2026-02-{day:02d}T09:00:00', 'type': 'vision', 'mode': mode, 'result': result}
+
+
+ADA_ENTRIES = [
+    entry(1, 'A mug and a laptop on the desk'),
+    entry(2, 'Exit sign above the door', 'text'),
+    entry(3, 'Exit sign by the stairs, another exit sign further down', 'text'),
+    entry(4, 'Labels on the bottles', 'text'),  # shorter, but only a prefix match for "label"
+    entry(5, 'The label says: keep refrigerated', 'text'),
+    entry(6, 'Wet floor near the stairs', 'hazard'),
+]
+
+
+def search_index():
+    index = HistoryIndex()
+    index.build({'ada@example.com': ADA_ENTRIES,
+                 'bob@example.com': [entry(7, 'Exit sign over the fire door', 'text')]})
+    return index
+
+
+def results_of(found):
+    results, total = found
+    return [(r['entry']['result'], r['score']) for r in results], total
+
+
+def test_search_ranking():
+    """Search ranks by BM25: repeated terms first, exact words over prefixes"""
+    index = search_index()
+    results, total = index.search('ada@example.com', 'exit sign')
+    assert total == 2 and [r['entry']['timestamp'][:10] for r in results] == ['2026-02-03', '2026-02-02']
+    assert results[0]['score'] > results[1]['score'] > 0
+    assert 'Exit sign' in results[0]['snippet']
+
+    results, total = index.search('ada@example.com', 'label')
+    assert total == 2
+    assert results[0]['entry']['result'].startswith('The label'), "prefix match outranked the exact word"
+
+    results, total = index.search('ada@example.com', 'stairs', mode='hazard')
+    assert total == 1 and results[0]['entry']['mode'] == 'hazard'
+    assert index.search('ada@example.com', 'giraffe') == ([], 0)
+
+
+def test_search_isolation():
+    """One user's search never returns another user's entries"""
+    index = search_index()
+    ada, _ = index.search('ada@example.com', 'fire door')
+    bob, total = index.search('bob@example.com', 'exit sign')
+    assert all('fire' not in r['entry']['result'] for r in ada), ada
+    assert total == 1 and bob[0]['entry']['result'] == 'Exit sign over the fire door'
+    assert index.search('eve@example.com', 'exit') == ([], 0)
+
+
+def test_search_clear():
+    """clear() forgets one user and leaves the others searchable"""
+    index = search_index()
+    index.clear('ada@example.com')
+    assert index.search('ada@example.com', 'exit sign') == ([], 0)
+    assert index.search('ada@example.com') == ([], 0)
+    assert index.search('bob@example.com', 'exit sign')[1] == 1
+    assert index.stats()['users'] == 1
+    index.add('ada@example.com', entry(8, 'Exit sign on the left'))
+    assert index.search('ada@example.com', 'exit')[1] == 1
+
+
+def archived_index(archive, entries, reads=None):
+    """HistoryIndex whose archive segments are read from `archive`, counting reads"""
+    def read_segment(path):
+        if reads is not None:
+            reads.append(os.path.basename(path))
+        return archive.read_segment(path)
+    index = HistoryIndex(read_segment=read_segment)
+    index.build({'ada@example.com': entries})
+    return index
+
+
+def test_archive_scan_ranking():
+    """Hot index plus archive segments ranks and counts like one full index"""
+    full = HistoryIndex()
+    full.build({'ada@example.com': ADA_ENTRIES})
+    with tempfile.TemporaryDirectory() as root:
+        archive = HistoryArchive(root)
+        archive.append('ada@example.com', list(reversed(ADA_ENTRIES[:3])))  # newest first
+        hot = archived_index(archive, ADA_ENTRIES[3:])
+
+        for query, filters in (('exit sign', {}), ('label stairs', {}), ('sign', {'mode': 'text'}),
+                               ('', {}), ('', {'mode': 'text'})):
+            expected = results_of(full.search('ada@example.com', query, limit=4, **filters))
+            found = results_of(hot.search('ada@example.com', query, limit=4,
+                                          archived=archive.segments('ada@example.com'), **filters))
+            assert found == expected, (query, filters, found, expected)
+
+
+def test_archive_segments_cached():
+    """Searches reuse archive segment indexes until a segment changes"""
+    january = [{**e, 'timestamp': e['timestamp'].replace('-02-', '-01-')} for e in ADA_ENTRIES[:3]]
+    with tempfile.TemporaryDirectory() as root:
+        archive = HistoryArchive(root)
+        archive.append('ada@example.com', list(reversed(january + ADA_ENTRIES[:2])))
+        reads = []
+        index = archived_index(archive, ADA_ENTRIES[3:], reads)
+
+        def search(query):
+            segments = archive.segments('ada@example.com')
+            return results_of(index.search('ada@example.com', query, archived=segments))
+
+        first = search('exit sign')
+        assert sorted(reads) == ['2026-01.jsonl.gz', '2026-02.jsonl.gz'], reads
+        assert search('exit sign') == first and search('stairs')[1] == 2 and len(reads) == 2, reads
+
+        # An append rebuilds only the segment it changed
+        archive.append('ada@example.com', [ADA_ENTRIES[2]])
+        assert reads[2:] == [] and search('exit sign')[1] == first[1] + 1
+        assert reads[2:] == ['2026-02.jsonl.gz'], reads
+
+        # A pruned segment is no longer searched; clear() drops the cached ones
+        os.remove(archive.segments('ada@example.com')[0])
+        assert search('exit sign')[1] == 2 and len(reads) == 3
+        index.clear('ada@example.com', archived=[os.path.join(archive.user_dir('ada@example.com'), name)
+                                                 for name in set(reads)])
+        assert index.stats()['archive'] == {'segments': 0, 'entries': 0, 'builds': 3}
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - HISTORY TEST")
+    print("=" * 60)
+
+    tests = [test_idempotent_retries, test_failed_save_forgets_keys, test_key_expiry, test_search_ranking,
+             test_search_isolation, test_search_clear, test_archive_scan_ranking,
+             test_archive_segments_cached]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
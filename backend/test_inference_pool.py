@@ -0,0 +1,325 @@
+"""
+Hand2Voice - Inference Pool Test Script
+Checks hot Whisper model swaps on the process lane: a clean swap, a model
+that fails to load, and a slot too busy to switch before the timeout; and
+that a swap whose Whisper step fails after Gemini switched reports it.
+Also checks async jobs: only their owner sees or cancels them, and a cancel
+never restarts a worker; priority aging in the job queue; and the partial
+transcript a chunked transcription returns at its deadline.
+
+Runs without Whisper or torch installed: the worker processes import a
+scripted "whisper" module written to a temp directory (load time and
+transcription time are controlled by the model name and audio length).
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+import chunked_transcribe
+import inference_pool
+from inference_pool import (InferencePool, ProcessLane, PriorityJobQueue, Job,
+                            WorkerCrashedError, DeadlineExceededError)
+from jobs import JobManager, CANCELLED, DONE
+from model_swap import ModelSwapper
+
+SAMPLE_RATE = 16000
+
+# Transcribes in real time (1 s of audio takes 1 s) and reports who answered
+SCRIPTED_WHISPER = """
+import os, time
+
+class _Model:
+    def __init__(self, name):
+        self.name = name
+
+    def transcribe(self, audio, **kwargs):
+        time.sleep(len(audio) / 16000)
+        return {'text': '%s %d' % (self.name, os.getpid())}
+
+def load_model(name):
+    if name == 'broken':
+        raise RuntimeError('no such model')
+    return _Model(name)
+"""
+
+
+@contextlib.contextmanager
+def process_lane(workers=1):
+    """A started transcription lane whose workers load the scripted Whisper"""
+    with tempfile.TemporaryDirectory() as fakes:
+        with open(os.path.join(fakes, 'whisper.py'), 'w') as f:
+            f.write(SCRIPTED_WHISPER)
+        # Spawned workers inherit sys.path
+        sys.path.insert(0, fakes)
+        lane = ProcessLane('transcribe', ('transcribe',), workers, whisper_model='base', torch_threads=0)
+        try:
+            lane.start()
+            yield lane
+        finally:
+            lane.stop()
+            for thread in lane._threads:
+                thread.join(timeout=10)
+            sys.path.remove(fakes)
+
+
+def job_manager(lane):
+    """JobManager over a pool whose transcription lane is the given one"""
+    pool = InferencePool(speech=False)
+    pool.start()
+    pool.lanes['transcribe'] = lane
+    return JobManager(pool)
+
+
+def silence(seconds):
+    return {'audio': np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)}
+
+
+def transcribe(lane, seconds=0.1, wait=True):
+    """Submit a transcription of `seconds` of silence; returns (model, pid) or the Job"""
+    job = Job('transcribe', silence(seconds))
+    lane.put(job)
+    if not wait:
+        return job
+    model, pid = job.future.result(timeout=30)['text'].split()
+    return model, int(pid)
+
+
+def test_swap():
+    """Swapped-in workers serve the new model from the next job on"""
+    with process_lane() as lane:
+        before = transcribe(lane)
+        lane.swap_model('small', timeout=10)
+        model, pid = transcribe(lane)
+        assert before[0] == 'base'
+        assert model == 'small' and pid != before[1], (model, pid, before)
+        assert lane.whisper_model == 'small' and lane.swaps == 1
+
+
+def test_swap_load_failure():
+    """A model that fails to load leaves the old workers serving"""
+    with process_lane() as lane:
+        before = transcribe(lane)
+        try:
+            lane.swap_model('broken', timeout=10)
+        except WorkerCrashedError:
+            pass
+        else:
+            raise AssertionError("swap to a broken model succeeded")
+        assert transcribe(lane) == before
+        assert lane.whisper_model == 'base' and lane.swaps == 0
+
+
+def test_swap_handover_timeout():
+    """A slot that cannot switch in time fails the swap instead of hanging it"""
+    with process_lane() as lane:
+        before = transcribe(lane)
+        busy = transcribe(lane, seconds=6, wait=False)  # keeps the only slot busy
+        time.sleep(0.5)
+        start = time.monotonic()
+        try:
+            lane.swap_model('small', timeout=2)
+        except WorkerCrashedError as e:
+            assert 'Only 0 of 1' in str(e), e
+        else:
+            raise AssertionError("swap succeeded although the slot never switched")
+        assert time.monotonic() - start < 5, "swap waited past its timeout"
+        assert not any(lane.replacements), "unclaimed replacement left behind"
+        assert lane.whisper_model == 'base'
+        assert busy.future.result(timeout=30)['text'].split()[0] == 'base'
+        assert transcribe(lane) == before
+        # The lane is not stuck: a later swap goes through
+        lane.swap_model('small', timeout=10)
+        assert transcribe(lane)[0] == 'small'
+
+
+def test_swap_logged():
+    """The pool's swap log names the model it switched from"""
+    events = []
+    log_event = inference_pool.log_event
+    inference_pool.log_event = lambda logger, event, **fields: events.append((event, fields))
+    try:
+        with process_lane() as lane:
+            pool = job_manager(lane).pool
+            pool.whisper_model = 'base'
+            pool.swap_whisper_model('small')
+    finally:
+        inference_pool.log_event = log_event
+    swapped = [fields for event, fields in events if event == 'inference.whisper_swapped']
+    assert swapped and swapped[0]['previous'] == 'base' and swapped[0]['model'] == 'small', swapped
+    assert pool.whisper_model == 'small'
+
+
+def test_partial_swap_reported():
+    """A Whisper failure after the Gemini switch ends the swap as partial"""
+    class Pool:
+        models = ['gemini-old']
+
+    class Vision:
+        pool = Pool()
+        cascade = None
+
+        def swap_models(self, models, cascade=None):
+            self.pool.models = models
+
+    class Inference:
+        speech = True
+        whisper_model = 'base'
+
+        def swap_whisper_model(self, whisper_model):
+            raise WorkerCrashedError("transcribe-worker-0 failed to load models")
+
+    swapper = ModelSwapper(Inference(), Vision())
+    swapper.start(whisper_model='small', gemini_models=['gemini-new'])
+    deadline = time.monotonic() + 5
+    while swapper.busy() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    status = swapper.status()
+    assert status['last_swap']['state'] == 'partial', status
+    assert status['last_swap']['switched'] == ['gemini']
+    assert status['current']['gemini_models'] == ['gemini-new']
+    assert status['current']['whisper_model'] == 'base'
+
+
+def test_job_owner():
+    """A job with an owner is invisible to everyone else"""
+    with process_lane() as lane:
+        jobs = job_manager(lane)
+        record = jobs.submit('transcribe', silence(0.5), owner='client-a')
+
+        assert jobs.get(record.id) is None
+        assert jobs.get(record.id, 'client-b') is None
+        assert jobs.cancel(record.id, 'client-b') is None
+        assert jobs.wait(record.id, 10, 'client-b') is None
+
+        finished = jobs.wait(record.id, 10, 'client-a')
+        assert finished is record and finished.status == DONE, finished.snapshot()
+        unowned = jobs.submit('transcribe', silence(0.1))
+        assert jobs.wait(unowned.id, 10) is unowned
+
+
+def test_cancel_keeps_worker():
+    """Cancelling drops queued parts and lets the running one finish on the same worker"""
+    with process_lane() as lane:
+        before = transcribe(lane)
+        jobs = job_manager(lane)
+        record = jobs.submit_many('transcribe', [silence(1.5), silence(1.5)],
+                                  combine=lambda results: results, owner='client-a')
+        time.sleep(0.5)  # first part running, second queued
+        running, queued = record.jobs
+
+        assert jobs.cancel(record.id, 'client-a').status == CANCELLED
+        assert queued.future.cancelled()
+        assert running.future.result(timeout=10)['text'].split()[0] == 'base'
+        assert record.result is None, "result of a cancelled job was kept"
+        assert lane.restarts == 0 and transcribe(lane) == before, "cancel restarted the worker"
+
+
+def test_priority_aging():
+    """Urgent jobs go first until a waiting routine job has aged past them"""
+    queue = PriorityJobQueue(aging=1.0)
+    first, second = Job('analyze', 1), Job('analyze', 2)
+    urgent, command = Job('analyze', 3, 'urgent'), Job('analyze', 4, 'command')
+    for job in (first, second, command, urgent):
+        queue.put(job)
+    assert [queue.get() for _ in range(4)] == [urgent, command, first, second]
+    assert queue.promoted == {'urgent': 0, 'command': 0, 'routine': 0}
+
+    # A routine job waiting 3 s ranks 2 - 3 = -1, ahead of a fresh urgent one (0)
+    stale, urgent = Job('analyze', 5), Job('analyze', 6, 'urgent')
+    stale.submitted_at -= 3
+    queue.put(urgent)
+    queue.put(stale)
+    assert queue.get() is stale and queue.get() is urgent
+    assert queue.promoted['routine'] == 1
+
+    # Without aging the class alone decides
+    queue = PriorityJobQueue(aging=0)
+    stale, urgent = Job('analyze', 7), Job('analyze', 8, 'urgent')
+    stale.submitted_at -= 3600
+    queue.put(stale)
+    queue.put(urgent)
+    assert queue.get() is urgent
+
+
+class ScriptedPool:
+    """Pool stand-in whose transcribe jobs finish at once unless their chunk is stuck"""
+
+    def __init__(self, stuck):
+        self.stuck = stuck
+        self.futures = []
+
+    def submit(self, kind, payload, priority=None, deadline=None):
+        future = Future()
+        index = len(self.futures)
+        if index not in self.stuck:
+            future.set_result({'text': f'chunk {index}.'})
+        self.futures.append(future)
+        return future
+
+
+def test_partial_transcript_at_deadline():
+    """Past the deadline the chunks finished in order come back as a partial transcript"""
+    audio = np.zeros(60 * SAMPLE_RATE, dtype=np.float32)  # three chunks
+    pool = ScriptedPool(stuck={1})
+    result = chunked_transcribe.transcribe(pool, audio, deadline=time.monotonic() + 0.2)
+    assert result == {'text': 'chunk 0.', 'chunks': 1, 'partial': True, 'total_chunks': 3}, result
+    assert pool.futures[1].cancelled(), "chunk left queued after the deadline"
+
+    pool = ScriptedPool(stuck={0})
+    try:
+        chunked_transcribe.transcribe(pool, audio, deadline=time.monotonic() + 0.2)
+    except DeadlineExceededError:
+        pass
+    else:
+        raise AssertionError("no error although no chunk finished")
+
+    # Without a deadline the timeout bounds the whole transcript
+    pool = ScriptedPool(stuck={2})
+    start = time.monotonic()
+    try:
+        chunked_transcribe.transcribe(pool, audio, timeout=0.3)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("transcript returned although a chunk never finished")
+    assert time.monotonic() - start < 2 and pool.futures[2].cancelled()
+
+    finished = chunked_transcribe.transcribe(ScriptedPool(stuck=()), audio, deadline=time.monotonic() + 5)
+    assert finished == {'text': 'chunk 0. chunk 1. chunk 2.', 'chunks': 3}, finished
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - INFERENCE POOL TEST")
+    print("=" * 60)
+
+    tests = [test_swap, test_swap_load_failure, test_swap_handover_timeout, test_swap_logged, test_partial_swap_reported,
+             test_job_owner, test_cancel_keeps_worker, test_priority_aging, test_partial_transcript_at_deadline]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,97 @@
+"""
+Hand2Voice - Profiling Test Script
+Checks that profiling never breaks the request it profiles: a cprofile
+request whose job runs on a lane thread, several cprofile requests at once
+(Python 3.12+ allows one cProfile per process), and a profile that cannot
+be written to disk all still return the view's result.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import profiling
+
+EXPECTED = sum(range(200000))
+
+
+class Job:
+    """The parts of inference_pool.Job that run_job reads"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.kind = 'analyze'
+        self.capture = profiling.current_capture()
+
+
+def view():
+    """A view that waits for one job run on another (lane) thread"""
+    job, result = Job(1), {}
+    lane = threading.Thread(target=lambda: result.setdefault(
+        'value', profiling.run_job(job, 'vision', sum, range(200000))))
+    lane.start()
+    lane.join()
+    return result['value']
+
+
+def test_job_on_lane_thread():
+    """A cprofile request keeps its result and records its lane job"""
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profiling.PROFILE_DIR = profile_dir
+        assert profiling._run_cprofile('analyze', view, (), {}) == EXPECTED
+        capture = profiling.recent_profiles(1)[0]
+        assert capture['jobs'][0]['job_id'] == 1 and capture['jobs'][0]['profiled'], capture
+        assert all(os.path.exists(os.path.join(profile_dir, name)) for name in capture['files'])
+
+
+def test_concurrent_cprofile_requests():
+    """cProfile requests running at the same time all return their results"""
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profiling.PROFILE_DIR = profile_dir
+        results = []
+        requests = [threading.Thread(target=lambda: results.append(
+            profiling._run_cprofile('analyze', view, (), {}))) for _ in range(3)]
+        for thread in requests:
+            thread.start()
+        for thread in requests:
+            thread.join()
+        assert results == [EXPECTED] * 3, results
+
+
+def test_unwritable_profile_dir():
+    """A profile that cannot be saved is logged, not turned into an error"""
+    with tempfile.NamedTemporaryFile() as not_a_dir:
+        profiling.PROFILE_DIR = not_a_dir.name
+        assert profiling._run_cprofile('analyze', view, (), {}) == EXPECTED
+        assert profiling._run_sampler('analyze', view, (), {}) == EXPECTED
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - PROFILING TEST")
+    print("=" * 60)
+
+    tests = [test_job_on_lane_thread, test_concurrent_cprofile_requests, test_unwritable_profile_dir]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
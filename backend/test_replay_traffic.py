@@ -0,0 +1,97 @@
+"""
+Hand2Voice - Traffic Replay Test Script
+Replays a small recorded corpus against a live vision node (answering from
+the Gemini stand-in) and checks that async jobs are followed to the end,
+including jobs owned by the session that submitted them.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter in a temp directory, which receives the corpus and the server's data files
+REPLAY_PROBE = """
+import hashlib, io, json, os, threading
+import numpy as np
+from PIL import Image
+from werkzeug.serving import make_server
+from vision.standin_server import StandInUpstream
+
+stand_in = StandInUpstream().start()
+os.environ.update(GEMINI_API_KEYS='replay-key', GEMINI_BASE_URL=stand_in.base_url)
+import finalserver
+from replay_traffic import Replay, load_corpus
+
+server = make_server('127.0.0.1', 0, finalserver.app, threaded=True)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+target = 'http://127.0.0.1:%d' % server.server_port
+
+out = io.BytesIO()
+pixels = (np.random.default_rng(0).random((480, 640, 3)) * 255).astype(np.uint8)
+Image.fromarray(pixels).save(out, format='JPEG', quality=90)
+image = out.getvalue()
+blob = hashlib.sha256(image).hexdigest()
+os.makedirs('corpus/blobs')
+with open('corpus/blobs/' + blob, 'wb') as f:
+    f.write(image)
+
+def entry(offset, form):
+    return {'offset_s': offset, 'method': 'POST', 'path': '/api/jobs/analyze', 'status': 202,
+            'content_type': 'multipart/form-data', 'form': form, 'headers': {},
+            'files': [{'field': 'image', 'filename': 'image.jpg', 'content_type': 'image/jpeg',
+                       'blob': blob, 'bytes': len(image)}]}
+
+with open('corpus/requests.jsonl', 'w') as f:
+    f.write(json.dumps(entry(0.0, {'mode': 'general', 'session_id': '5f2b9c0d41e7a3b8'})) + '\\n')
+    f.write(json.dumps(entry(0.1, {'mode': 'text'})) + '\\n')
+
+replay = Replay('corpus', target, speed=10, timeout=60)
+replay.run(load_corpus('corpus'))
+server.shutdown()
+print(json.dumps(sorted([r['status'], r['job_status']] for r in replay.results)))
+"""
+
+
+def test_owned_job_replay():
+    """Recorded jobs, owned or not, are polled to completion"""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, SERVER_ROLES='vision', LOG_LEVEL='WARNING', PYTHONPATH=BACKEND_DIR)
+        out = subprocess.run([sys.executable, '-c', REPLAY_PROBE], cwd=workdir, env=env,
+                             capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-500:]
+    results = json.loads(out.stdout.strip().splitlines()[-1])
+    assert results == [[202, 'done'], [202, 'done']], results
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - TRAFFIC REPLAY TEST")
+    print("=" * 60)
+
+    tests = [test_owned_job_replay]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,128 @@
+"""
+Hand2Voice - Server Roles Test Script
+Checks that an auth-only node boots fast without the ML stack and that routes
+for disabled roles answer with a clean 503.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_BUDGET = 2.0  # seconds to import finalserver with SERVER_ROLES=auth
+HEAVY_MODULES = ('torch', 'whisper', 'cv2', 'numpy', 'PIL', 'av', 'google.generativeai')
+
+# Runs in a fresh interpreter so sys.modules reflects only the server import
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import finalserver
+elapsed = time.perf_counter() - start
+client = finalserver.app.test_client()
+print(json.dumps({
+    'elapsed': elapsed,
+    'heavy': [m for m in %r if m in sys.modules],
+    'analyze': client.post('/api/analyze').status_code,
+    'transcribe': client.post('/api/transcribe').status_code,
+    'history': client.post('/api/history/get', json={}).status_code,
+    'login': client.post('/api/auth/login', json={}).status_code,
+    'services': client.get('/api/health').get_json()['services'],
+}))
+""" % (HEAVY_MODULES,)
+
+# Signs the same user up twice; the server's data files go to the working directory
+SIGNUP_PROBE = """
+import json, os
+import finalserver
+client = finalserver.app.test_client()
+user = {'name': 'Ada', 'email': 'Ada@Example.com', 'password': 'secret'}
+first = client.post('/api/auth/signup', json=user)
+again = client.post('/api/auth/signup', json=user)
+login = client.post('/api/auth/login', json={'email': 'ada@example.com', 'password': 'secret'})
+print(json.dumps({
+    'signup': [first.status_code, first.get_json()],
+    'again': [again.status_code, again.get_json()],
+    'login': login.status_code,
+    'history_file': os.path.exists('history.json'),
+}))
+"""
+
+
+def probe(roles, code=PROBE, cwd=BACKEND_DIR):
+    """Import the server with the given roles in a subprocess"""
+    env = dict(os.environ, SERVER_ROLES=roles, LOG_LEVEL='WARNING', PYTHONPATH=BACKEND_DIR)
+    out = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr[-500:]
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_auth_only_startup():
+    """Auth-only node imports no ML modules and starts within the budget"""
+    result = probe('auth')
+    assert not result['heavy'], f"imported {result['heavy']}"
+    assert result['elapsed'] < IMPORT_BUDGET, f"import took {result['elapsed']:.2f}s"
+
+
+def test_disabled_routes():
+    """Routes of disabled roles return 503; enabled ones still work"""
+    result = probe('auth')
+    assert result['analyze'] == 503
+    assert result['transcribe'] == 503
+    assert result['history'] == 503
+    assert result['login'] == 400  # enabled: fails validation, not availability
+    assert result['services']['auth'] == 'running'
+    assert result['services']['vision'] == 'disabled'
+
+
+def test_history_node():
+    """A history node serves history without loading the ML stack"""
+    result = probe('auth,history')
+    assert not result['heavy'], f"imported {result['heavy']}"
+    assert result['history'] == 400  # enabled: email missing
+    assert result['analyze'] == 503
+
+
+def test_auth_only_signup():
+    """An auth-only node signs users up without touching history"""
+    with tempfile.TemporaryDirectory() as workdir:
+        result = probe('auth', SIGNUP_PROBE, cwd=workdir)
+    status, body = result['signup']
+    assert status == 200 and body['success'], body
+    assert body['user']['email'] == 'ada@example.com'
+    assert result['again'][0] == 400 and result['again'][1]['error'] == 'Email already exists'
+    assert result['login'] == 200
+    assert not result['history_file'], "auth-only node wrote history.json"
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - SERVER ROLES TEST")
+    print("=" * 60)
+
+    tests = [test_auth_only_startup, test_disabled_routes, test_history_node, test_auth_only_signup]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
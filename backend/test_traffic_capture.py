@@ -0,0 +1,153 @@
+"""
+Hand2Voice - Traffic Capture Test Script
+Checks that captured uploads are sanitized by what they contain, not by
+the name of their form field: JPEG/PNG metadata is stripped in any field,
+and images whose metadata cannot be stripped are not stored. Also checks
+that capture failures and bad settings never fail the server.
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from flask import Flask, jsonify, request
+from PIL import Image
+
+from traffic_capture import TrafficCapture
+
+GPS_MARKER = b'GPSInfo-test-location'
+
+
+def jpeg_with_exif():
+    """A small JPEG carrying an EXIF segment with a recognisable marker"""
+    exif = Image.Exif()
+    exif[0x010E] = GPS_MARKER.decode()  # ImageDescription
+    out = io.BytesIO()
+    Image.new('RGB', (16, 16), 'red').save(out, 'JPEG', exif=exif)
+    assert GPS_MARKER in out.getvalue()
+    return out.getvalue()
+
+
+def webp_with_exif():
+    exif = Image.Exif()
+    exif[0x010E] = GPS_MARKER.decode()
+    out = io.BytesIO()
+    Image.new('RGB', (16, 16), 'blue').save(out, 'WEBP', exif=exif)
+    return out.getvalue()
+
+
+def capture_upload(field, data, filename, content_type):
+    """Post one file through a capturing app; returns (request entry, blob bytes or None)"""
+    with tempfile.TemporaryDirectory() as root:
+        capture = TrafficCapture(root=root, rate=1.0, limit=10)
+        app = Flask(__name__)
+        app.before_request(capture.begin)
+        app.after_request(capture.finish)
+
+        @app.route('/api/analyze', methods=['POST'])
+        def analyze():
+            # The view still sees the original upload
+            return jsonify({'bytes': len(request.files[field].read())})
+
+        response = app.test_client().post('/api/analyze', data={
+            field: (io.BytesIO(data), filename, content_type), 'mode': 'general'})
+        assert response.get_json()['bytes'] == len(data)
+
+        with open(os.path.join(capture.dir, 'requests.jsonl')) as f:
+            entry = json.loads(f.readline())
+        blob = entry['files'][0]['blob']
+        if blob is None:
+            return entry, None
+        with open(os.path.join(capture.blob_dir, blob), 'rb') as f:
+            return entry, f.read()
+
+
+def test_metadata_stripped_in_any_field():
+    """EXIF is stripped from a JPEG whatever its field name or declared type"""
+    for field, content_type in (('image', 'image/jpeg'), ('photo', 'image/jpeg'),
+                                ('upload', 'application/octet-stream')):
+        entry, stored = capture_upload(field, jpeg_with_exif(), 'IMG_0001.jpg', content_type)
+        assert stored is not None, f"{field}: not stored"
+        assert stored[:2] == b'\xff\xd8' and GPS_MARKER not in stored, f"{field}: EXIF kept"
+        assert entry['files'][0]['filename'] == f"{field}.jpg"
+
+
+def test_unstrippable_image_not_stored():
+    """Images in formats that cannot be stripped are recorded without their bytes"""
+    data = webp_with_exif()
+    entry, stored = capture_upload('frame', data, 'frame.webp', 'image/webp')
+    assert stored is None
+    assert entry['files'][0]['bytes'] == len(data)
+
+
+def test_unparsable_jpeg_not_stored():
+    """A JPEG whose segments cannot be parsed is recorded without its bytes"""
+    data = jpeg_with_exif()
+    scan = data.index(b'\xff\xda')
+    damaged = data[:scan] + b'\x00' + data[scan + 1:]  # no start-of-scan marker any more
+    for field in ('image', 'upload'):
+        entry, stored = capture_upload(field, damaged, 'IMG_0002.jpg', 'image/jpeg')
+        assert stored is None, f"{field}: damaged JPEG stored with its EXIF"
+        assert entry['files'][0]['bytes'] == len(damaged)
+
+
+def test_unwritable_corpus():
+    """A corpus that cannot be written to loses the record, not the response"""
+    with tempfile.TemporaryDirectory() as root:
+        capture = TrafficCapture(root=root, rate=1.0, limit=10)
+        os.mkdir(capture._requests_path)  # appending to it fails like a read-only disk
+        app = Flask(__name__)
+        app.before_request(capture.begin)
+        app.after_request(capture.finish)
+
+        @app.route('/api/analyze', methods=['POST'])
+        def analyze():
+            return jsonify({'success': True})
+
+        response = app.test_client().post('/api/analyze', data={
+            'image': (io.BytesIO(jpeg_with_exif()), 'frame.jpg'), 'mode': 'general'})
+        assert response.status_code == 200 and capture.in_flight == 0
+
+
+def test_bad_settings():
+    """Malformed capture settings fall back to their defaults instead of failing the import"""
+    env = dict(os.environ, TRAFFIC_CAPTURE_RATE='half', TRAFFIC_CAPTURE_MAX='lots', LOG_LEVEL='ERROR')
+    code = 'import traffic_capture as t; print(t.CAPTURE_RATE, t.CAPTURE_MAX)'
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         env=env, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr[-500:]
+    assert out.stdout.split() == ['1.0', '5000'], out.stdout
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("🖐️  HAND2VOICE - TRAFFIC CAPTURE TEST")
+    print("=" * 60)
+
+    tests = [test_metadata_stripped_in_any_field, test_unstrippable_image_not_stored, test_unparsable_jpeg_not_stored,
+             test_unwritable_corpus, test_bad_settings]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
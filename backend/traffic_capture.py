@@ -0,0 +1,230 @@
+"""
+Opt-in traffic capture for performance regression testing
+Records the inference requests the server receives (images, audio, modes,
+arrival times and concurrency) to a local corpus, together with the upstream
+model replies, so replay_traffic.py can drive the same mix against a server
+and the stand-in (vision/standin_server.py --replay) can answer offline.
+
+Requests are sanitized before they are written: only the form fields listed
+in KEPT_FIELDS are kept (session ids hashed), image metadata such as EXIF/GPS
+is stripped from every upload detected as JPEG or PNG by its bytes, whatever
+its field name, file names are reduced to their extension, and no headers
+other than Content-Type and X-Priority are stored. Images in other formats
+(whose metadata cannot be stripped without re-encoding) and JPEGs too
+damaged to parse are not stored.
+Audio is kept as sent - only capture traffic whose users agreed to it.
+
+Corpus layout (one directory per server run):
+    traffic/<YYYYmmdd-HHMMSS>/requests.jsonl   one request per line
+    traffic/<YYYYmmdd-HHMMSS>/upstream.jsonl   recorded upstream replies
+    traffic/<YYYYmmdd-HHMMSS>/blobs/<sha256>   uploaded files, deduplicated
+
+Environment:
+    TRAFFIC_CAPTURE         1 to record (default off)
+    TRAFFIC_CAPTURE_DIR     corpus root (default traffic)
+    TRAFFIC_CAPTURE_RATE    fraction of requests recorded (default 1.0)
+    TRAFFIC_CAPTURE_MAX     requests recorded per run (default 5000)
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('capture')
+
+
+def _env_int(name, default):
+    """Integer setting; a malformed value falls back to the default instead of failing the import"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid %s=%r, using %d", name, value, default)
+        return default
+
+
+def _env_float(name, default):
+    """Float setting; a malformed value falls back to the default instead of failing the import"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Invalid %s=%r, using %s", name, value, default)
+        return default
+
+
+ENABLED = os.getenv('TRAFFIC_CAPTURE', '').lower() in ('1', 'true', 'yes')
+CAPTURE_DIR = os.getenv('TRAFFIC_CAPTURE_DIR', 'traffic')
+CAPTURE_RATE = _env_float('TRAFFIC_CAPTURE_RATE', 1.0)
+CAPTURE_MAX = _env_int('TRAFFIC_CAPTURE_MAX', 5000)
+
+CAPTURED_PATHS = (
+    '/api/analyze',
+    '/api/analyze/batch',
+    '/api/transcribe',
+    '/api/ask',
+    '/api/jobs/analyze',
+    '/api/jobs/transcribe',
+)
+KEPT_FIELDS = ('mode', 'strategy', 'summary', 'priority', 'format')
+HASHED_FIELDS = ('session_id',)
+KEPT_HEADERS = ('X-Priority',)
+FORM_TYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+
+class TrafficCapture:
+    """Writes sanitized requests and upstream replies to one corpus directory"""
+
+    def __init__(self, root=CAPTURE_DIR, rate=CAPTURE_RATE, limit=CAPTURE_MAX):
+        from vision.recorded_upstream import ResponseRecorder
+
+        self.dir = os.path.join(root, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        self.blob_dir = os.path.join(self.dir, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.rate = rate
+        self.limit = limit
+        self.recorded = 0
+        self.in_flight = 0
+        self.started_at = time.monotonic()
+        self.recorder = ResponseRecorder(os.path.join(self.dir, 'upstream.jsonl'))
+        self._requests_path = os.path.join(self.dir, 'requests.jsonl')
+        self._lock = threading.Lock()
+
+    def _blob(self, data):
+        """
+        Store upload bytes once by content hash, JPEG/PNG metadata stripped
+
+        Returns:
+            (blob name, size); the name is None for a JPEG too damaged to strip
+        """
+        from vision.recorded_upstream import strip_image_metadata
+        stripped = strip_image_metadata(data, strict=True)  # sniffs the bytes; anything else is unchanged
+        if stripped is None:
+            return None, len(data)
+        name = hashlib.sha256(stripped).hexdigest()
+        path = os.path.join(self.blob_dir, name)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(stripped)
+        return name, len(stripped)
+
+    def begin(self):
+        """Before a request: decide whether to record it and snapshot its payload"""
+        if request.method != 'POST' or request.path not in CAPTURED_PATHS:
+            return
+        with self._lock:
+            if self.recorded >= self.limit or random.random() >= self.rate:
+                return
+            self.recorded += 1
+            self.in_flight += 1
+            concurrency = self.in_flight
+
+        entry = {
+            'offset_s': round(time.monotonic() - self.started_at, 3),
+            'method': request.method,
+            'path': request.path,
+            'content_type': request.mimetype,
+            'in_flight': concurrency,
+            'form': {},
+            'files': [],
+            'headers': {name: request.headers[name] for name in KEPT_HEADERS if name in request.headers},
+        }
+        from vision.recorded_upstream import image_format
+
+        try:
+            for name in KEPT_FIELDS:
+                if name in request.form:
+                    entry['form'][name] = request.form[name]
+            for name in HASHED_FIELDS:
+                if name in request.form:
+                    entry['form'][name] = _hash(request.form[name])
+            for field, upload in request.files.items(multi=True):
+                data = upload.read()
+                upload.stream.seek(0)  # the view reads it again
+                extension = os.path.splitext(upload.filename or '')[1][:8]
+                kind = image_format(data) or ('image' if upload.mimetype.startswith('image/') else None)
+                if kind not in (None, 'jpeg', 'png'):
+                    # An image whose metadata cannot be stripped: record that it was sent, not its bytes
+                    blob, size = None, len(data)
+                else:
+                    blob, size = self._blob(data)
+                entry['files'].append({
+                    'field': field,
+                    'filename': f"{field}{extension}",
+                    'content_type': upload.mimetype,
+                    'blob': blob,
+                    'bytes': size,
+                })
+            if request.mimetype not in FORM_TYPES and request.content_length:
+                # Raw body (e.g. 16 kHz PCM); cached so the view can still read it
+                entry['body_blob'], entry['body_bytes'] = self._blob(request.get_data(cache=True))
+        except Exception as e:
+            logger.warning("Could not capture %s: %s", request.path, e)
+            self._end()
+            return
+        g.capture = (entry, time.perf_counter())
+
+    def _end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def finish(self, response):
+        """After a request: write its entry with the response status and duration"""
+        captured = g.pop('capture', None)
+        if captured is None:
+            return response
+        entry, start = captured
+        self._end()
+        entry['status'] = response.status_code
+        entry['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        line = json.dumps(entry) + '\n'
+        try:
+            with self._lock:
+                with open(self._requests_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            # A full or read-only disk loses the record, not the response
+            logger.warning("Could not capture %s: %s", entry['path'], e)
+        return response
+
+    def stats(self):
+        return {
+            'dir': self.dir,
+            'requests': self.recorded,
+            'upstream_replies': self.recorder.count,
+        }
+
+
+def init_app(app):
+    """
+    Start capturing if TRAFFIC_CAPTURE is set
+
+    Returns:
+        The TrafficCapture, or None when capture is off
+    """
+    if not ENABLED:
+        return None
+    from vision.upstream_pool import add_response_hook
+
+    capture = TrafficCapture()
+    add_response_hook(capture.recorder)
+    app.before_request(capture.begin)
+    app.after_request(capture.finish)
+    log_event(logger, 'capture.started', dir=capture.dir, rate=capture.rate, limit=capture.limit)
+    return capture
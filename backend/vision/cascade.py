@@ -0,0 +1,160 @@
+"""
+Visual Buddy - Model Cascade
+Cheap-first routing for vision requests: each mode tries a lighter/faster
+model first and escalates to the next model only when the answer is empty or
+malformed, or when hazard mode reports a high hazard level.
+
+Rules come from VISION_CASCADE, one chain per mode:
+
+    VISION_CASCADE="general=gemini-2.5-flash-lite>gemini-2.5-flash;hazard=gemini-2.5-flash-lite>gemini-2.5-flash;text=gemini-2.5-flash"
+
+Modes without a rule use the GEMINI_MODELS order (cheapest first). The
+"custom" key covers analyze_with_custom_prompt.
+"""
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger('echosight.vision')
+
+HAZARD_ESCALATE_LEVEL = 3  # hazard answers at or above this level get a second opinion
+MIN_DESCRIPTION_WORDS = 3
+
+HAZARD_LEVEL_RE = re.compile(r'HAZARD_LEVEL:\s*\[?([0-4])\]?', re.IGNORECASE)
+
+
+def parse_cascade(spec, models):
+    """
+    Parse VISION_CASCADE into mode -> model chain
+
+    Args:
+        spec: "mode=model>model;mode=model" (empty for defaults only)
+        models: Models available in the upstream pool, cheapest first
+
+    Returns:
+        Dict of mode -> list of models ('*' holds the default chain)
+    """
+    rules = {'*': list(models)}
+    for item in (spec or '').split(';'):
+        if '=' not in item:
+            continue
+        mode, chain = item.split('=', 1)
+        chain = [m.strip() for m in chain.split('>') if m.strip()]
+        missing = [m for m in chain if m not in models]
+        if missing:
+            logger.warning("VISION_CASCADE: %s not in GEMINI_MODELS, skipped for '%s'",
+                           ', '.join(missing), mode.strip())
+        chain = [m for m in chain if m in models]
+        if chain:
+            rules[mode.strip()] = chain
+    return rules
+
+
+def hazard_level(text):
+    """Hazard level from a hazard-mode answer, or None if it has none"""
+    match = HAZARD_LEVEL_RE.search(text or '')
+    return int(match.group(1)) if match else None
+
+
+def escalation_reason(mode, text):
+    """
+    Why an answer should go to the next model in the chain
+
+    Returns:
+        'empty', 'malformed', 'hazard_level' or None to accept the answer
+    """
+    text = (text or '').strip()
+    if not text:
+        return 'empty'
+    if mode == 'hazard':
+        level = hazard_level(text)
+        if level is None:
+            return 'malformed'
+        if level >= HAZARD_ESCALATE_LEVEL:
+            return 'hazard_level'
+    elif mode == 'general' and len(text.split()) < MIN_DESCRIPTION_WORDS:
+        return 'malformed'
+    return None
+
+
+class CascadeStats:
+    """Escalation counts and per-model latency, per mode"""
+
+    def __init__(self):
+        self.modes = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode, stages, answered_by):
+        """
+        Args:
+            mode: Analysis mode
+            stages: [(model, elapsed_seconds, escalation_reason or None)] in order;
+                    a last stage that is 'unavailable' or 'failed' is an
+                    escalation that failed, so an earlier answer was returned
+            answered_by: Model whose answer was returned
+        """
+        with self._lock:
+            stats = self.modes.setdefault(mode, {
+                'requests': 0,
+                'escalations': 0,
+                'reasons': {},
+                'answered_by': {},
+                'models': {},
+                'cheap_ms_answered': 0.0,
+                'cheap_ms_wasted': 0.0,
+                'cheap_answered': 0,
+                'failed_escalations': 0
+            })
+            stats['requests'] += 1
+            stats['answered_by'][answered_by] = stats['answered_by'].get(answered_by, 0) + 1
+
+            for index, (model, elapsed, reason) in enumerate(stages):
+                model_stats = stats['models'].setdefault(model, {'calls': 0, 'total_ms': 0.0})
+                model_stats['calls'] += 1
+                model_stats['total_ms'] += elapsed * 1000
+                if reason and index < len(stages) - 1:
+                    stats['escalations'] += 1
+                    stats['reasons'][reason] = stats['reasons'].get(reason, 0) + 1
+                    if model != answered_by:
+                        stats['cheap_ms_wasted'] += elapsed * 1000
+
+            if stages[-1][0] != answered_by and stages[-1][2] in ('unavailable', 'failed'):
+                stats['failed_escalations'] += 1
+
+            if len(stages) == 1 and stages[0][0] == answered_by:
+                stats['cheap_answered'] += 1
+                stats['cheap_ms_answered'] += stages[0][1] * 1000
+
+    def snapshot(self, chains):
+        """
+        Stats per mode, including the escalation rate and an estimate of the
+        latency saved against sending everything to the last model in the chain
+        """
+        with self._lock:
+            result = {}
+            for mode, stats in self.modes.items():
+                chain = chains.get(mode) or chains['*']
+                models = {model: {'calls': s['calls'], 'avg_ms': round(s['total_ms'] / s['calls'], 1)}
+                          for model, s in stats['models'].items()}
+                entry = {
+                    'chain': chain,
+                    'requests': stats['requests'],
+                    'escalations': stats['escalations'],
+                    'escalation_rate': round(stats['escalations'] / stats['requests'], 3),
+                    'reasons': dict(stats['reasons']),
+                    'failed_escalations': stats['failed_escalations'],
+                    'answered_by': dict(stats['answered_by']),
+                    'models': models,
+                    'latency_saved_ms': None
+                }
+                strongest = models.get(chain[-1])
+                if len(chain) > 1 and strongest:
+                    # Cheap answers would have cost the strong model's average;
+                    # escalations paid for the cheap attempt on top
+                    saved = (stats['cheap_answered'] * strongest['avg_ms']
+                             - stats['cheap_ms_answered'] - stats['cheap_ms_wasted'])
+                    entry['latency_saved_ms'] = round(saved, 1)
+                result[mode] = entry
+            return result
@@ -0,0 +1,161 @@
+"""
+Frame quality scoring for Visual Buddy
+Scores frames locally (sharpness, exposure, motion) so hopeless frames get an
+instant spoken hint instead of a slow, paid Gemini call.
+"""
+
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Frames are scored on a small grayscale copy so scoring stays cheap per frame
+SCORING_WIDTH = 320
+
+# Thresholds (tuned on 640x480 webcam frames, scored at SCORING_WIDTH)
+MIN_SHARPNESS = 25.0      # variance of the Laplacian
+MIN_BRIGHTNESS = 35.0     # mean gray level (0-255)
+MAX_BRIGHTNESS = 230.0
+MAX_CLIPPED = 0.6         # fraction of pixels crushed to black or blown to white
+MAX_MOTION = 35.0         # mean absolute difference against the previous frame
+
+HINTS = {
+    "dark": "It's too dark to see. Try turning on a light.",
+    "bright": "The image is too bright. Try pointing the camera away from the light.",
+    "motion": "The camera is moving too much. Please hold still.",
+    "blur": "The image is blurry. Please hold the camera steady.",
+}
+
+
+def _to_gray(frame):
+    """Downscale a BGR (or gray) frame to SCORING_WIDTH and convert to grayscale"""
+    height, width = frame.shape[:2]
+    if width > SCORING_WIDTH:
+        scale = SCORING_WIDTH / width
+        frame = cv2.resize(frame, (SCORING_WIDTH, int(height * scale)),
+                           interpolation=cv2.INTER_AREA)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+
+def score_frame(frame, previous_gray=None):
+    """
+    Score a single frame
+
+    Args:
+        frame: BGR image as a NumPy array
+        previous_gray: Scoring copy of the previous frame, used for motion
+
+    Returns:
+        Dict with sharpness, brightness, clipped, motion (None without a
+        previous frame), an overall score and the internal "gray" copy
+    """
+    gray = _to_gray(frame)
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean())
+    clipped = float(np.count_nonzero((gray < 10) | (gray > 245))) / gray.size
+
+    motion = None
+    if previous_gray is not None and previous_gray.shape == gray.shape:
+        motion = float(cv2.absdiff(gray, previous_gray).mean())
+
+    # Sharp frames win; motion and bad exposure pull the score down
+    score = sharpness
+    if motion is not None:
+        score /= 1.0 + motion / 10.0
+    score *= 1.0 - min(clipped, 1.0)
+
+    return {
+        "sharpness": round(sharpness, 1),
+        "brightness": round(brightness, 1),
+        "clipped": round(clipped, 3),
+        "motion": None if motion is None else round(motion, 1),
+        "score": round(score, 1),
+        "gray": gray,
+    }
+
+
+def assess_frame(scores):
+    """
+    Decide whether a scored frame is worth sending for analysis
+
+    Returns:
+        None if the frame is usable, otherwise a short spoken hint
+    """
+    if scores["brightness"] < MIN_BRIGHTNESS:
+        return HINTS["dark"]
+    if scores["brightness"] > MAX_BRIGHTNESS or scores["clipped"] > MAX_CLIPPED:
+        return HINTS["bright"]
+    if scores["motion"] is not None and scores["motion"] > MAX_MOTION:
+        return HINTS["motion"]
+    if scores["sharpness"] < MIN_SHARPNESS:
+        return HINTS["blur"]
+    return None
+
+
+def public_scores(scores):
+    """Scores without the internal grayscale copy (safe to JSON-encode)"""
+    return {k: v for k, v in scores.items() if k != "gray"}
+
+
+def select_best(frames):
+    """
+    Pick the best frame from a short burst
+
+    Args:
+        frames: List of BGR frames in capture order
+
+    Returns:
+        (index, scores) of the best frame; usable frames always beat
+        frames that assess_frame() would reject
+    """
+    best_index, best_scores, best_key = 0, None, None
+    previous_gray = None
+
+    for index, frame in enumerate(frames):
+        scores = score_frame(frame, previous_gray)
+        previous_gray = scores["gray"]
+        key = (assess_frame(scores) is None, scores["score"])
+        if best_key is None or key > best_key:
+            best_index, best_scores, best_key = index, scores, key
+
+    return best_index, best_scores
+
+
+def decode_image(data):
+    """Decode encoded image bytes (JPEG/PNG/...) into a BGR frame, or None"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+class FrameBuffer:
+    """Ring buffer of recent camera frames that remembers their scores"""
+
+    def __init__(self, size=8):
+        self.frames = deque(maxlen=size)
+        self._previous_gray = None
+
+    def add(self, frame):
+        """Score and store a frame (the frame is kept by reference)"""
+        scores = score_frame(frame, self._previous_gray)
+        self._previous_gray = scores["gray"]
+        self.frames.append((frame, scores))
+        return scores
+
+    def best(self):
+        """
+        Return (frame, scores) for the sharpest usable recent frame,
+        or (None, None) if the buffer is empty
+        """
+        if not self.frames:
+            return None, None
+        return max(self.frames,
+                   key=lambda item: (assess_frame(item[1]) is None, item[1]["score"]))
+
+    def clear(self):
+        self.frames.clear()
+        self._previous_gray = None
@@ -0,0 +1,207 @@
+"""
+Local hazard tracking for Visual Buddy
+After a hazard check reports where the main hazard is, the region is tracked
+on the camera feed with sparse optical flow (Lucas-Kanade on corner points),
+so "scissors on your left" can become "now ahead of you" at frame rate with
+no remote call. When too few points survive, the tracker reports itself lost
+and the caller re-queries the model.
+"""
+
+import re
+
+import cv2
+import numpy as np
+
+TRACK_WIDTH = 320          # frames are tracked on a small grayscale copy
+MAX_POINTS = 80            # corner points seeded inside the hazard box
+MIN_POINTS = 8             # fewer corners than this: the region can't be tracked
+MIN_CONFIDENCE = 0.35      # fraction of the seeded points still tracked
+MAX_FB_ERROR = 1.0         # forward-backward error (px) for a point to count as tracked
+STABLE_FRAMES = 6          # frames a new direction must hold before it is announced
+ZONE_EDGES = (0.38, 0.62)  # box center (fraction of the width) splitting left / ahead / right
+HYSTERESIS = 0.05          # distance past an edge needed to change zone
+
+DIRECTIONS = {
+    'left': 'on your left',
+    'ahead': 'ahead of you',
+    'right': 'on your right',
+}
+
+# Asked for in the hazard request so the main hazard can be tracked
+BOX_INSTRUCTION = (
+    "Check this image for hazards. After the WHAT TO DO section, add a last line "
+    "'BOX: [ymin, xmin, ymax, xmax]' with the bounding box of the main hazard on a "
+    "0-1000 scale, or 'BOX: none' if there is no hazard."
+)
+
+BOX_RE = re.compile(r'^[ \t*]*BOX:[ \t*]*(?:\[?\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\]?|.*)[ \t]*$',
+                    re.IGNORECASE | re.MULTILINE)
+WHAT_RE = re.compile(r'WHAT I SEE:\s*\n?\s*(.+)', re.IGNORECASE)
+
+_LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+def parse_hazard(text):
+    """
+    Split a hazard answer into what to say and what to track
+
+    Returns:
+        (spoken_text, box, label) - box is (x, y, w, h) as fractions of the
+        frame or None; label is the "WHAT I SEE" line
+    """
+    box = None
+    match = BOX_RE.search(text or '')
+    if match and match.group(1):
+        ymin, xmin, ymax, xmax = (min(int(v), 1000) / 1000 for v in match.groups())
+        if xmax > xmin and ymax > ymin:
+            box = (xmin, ymin, xmax - xmin, ymax - ymin)
+    spoken = BOX_RE.sub('', text or '').strip()
+
+    label = 'the hazard'
+    what = WHAT_RE.search(spoken)
+    if what:
+        label = what.group(1).strip().rstrip('.') or label
+    return spoken, box, label
+
+
+def zone(center_x, current=None):
+    """Direction zone of a box center, sticking to the current zone near the edges"""
+    left_edge, right_edge = ZONE_EDGES
+    if current == 'left':
+        left_edge += HYSTERESIS
+    elif current == 'right':
+        right_edge -= HYSTERESIS
+    elif current == 'ahead':
+        left_edge -= HYSTERESIS
+        right_edge += HYSTERESIS
+    if center_x < left_edge:
+        return 'left'
+    if center_x > right_edge:
+        return 'right'
+    return 'ahead'
+
+
+def prepare(frame):
+    """Small grayscale copy of a BGR frame for tracking"""
+    height, width = frame.shape[:2]
+    if width > TRACK_WIDTH:
+        frame = cv2.resize(frame, (TRACK_WIDTH, int(height * TRACK_WIDTH / width)),
+                           interpolation=cv2.INTER_AREA)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+
+class HazardTracker:
+    """Follows one hazard region across frames and reports direction changes"""
+
+    def __init__(self):
+        self.active = False
+        self.label = None
+        self.box = None          # (x, y, w, h) in fractions of the frame
+        self.direction = None
+        self.confidence = 0.0
+        self._gray = None
+        self._points = None
+        self._seeded = 0
+        self._candidate = None
+        self._candidate_frames = 0
+
+    def start(self, gray, box, label):
+        """
+        Lock onto a region
+
+        Args:
+            gray: prepare() copy of the frame the box was reported on
+            box: (x, y, w, h) as fractions of the frame
+            label: What the hazard is, for announcements
+
+        Returns:
+            False if the region has too little texture to track
+        """
+        self.stop()
+        height, width = gray.shape
+        x, y, w, h = box
+        mask = np.zeros_like(gray)
+        mask[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)] = 255
+        points = cv2.goodFeaturesToTrack(gray, MAX_POINTS, 0.01, 4, mask=mask)
+        if points is None or len(points) < MIN_POINTS:
+            return False
+
+        self.active = True
+        self.label = label
+        self.box = box
+        self.direction = zone(x + w / 2)
+        self.confidence = 1.0
+        self._gray = gray
+        self._points = points
+        self._seeded = len(points)
+        return True
+
+    def stop(self):
+        self.active = False
+        self._gray = None
+        self._points = None
+        self._candidate = None
+        self._candidate_frames = 0
+
+    def update(self, gray):
+        """
+        Track the region into the next frame
+
+        Returns:
+            None while nothing needs saying, otherwise a dict with 'event'
+            ('direction', 'out_of_view' or 'lost') and 'message'
+        """
+        if not self.active:
+            return None
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._gray, gray, self._points, None, **_LK_PARAMS)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._gray, points, None, **_LK_PARAMS)
+        error = np.linalg.norm(back - self._points, axis=2).ravel()
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < MAX_FB_ERROR)
+
+        self.confidence = float(np.count_nonzero(good)) / self._seeded
+        if self.confidence < MIN_CONFIDENCE or np.count_nonzero(good) < MIN_POINTS // 2:
+            self.stop()
+            return {'event': 'lost', 'message': f"Lost track of {self.label}"}
+
+        old, new = self._points[good].reshape(-1, 2), points[good].reshape(-1, 2)
+        height, width = gray.shape
+        shift = np.median(new - old, axis=0)
+        spread_old = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+        spread_new = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+        scale = float(np.clip(spread_new / spread_old, 0.9, 1.1)) if spread_old > 1 else 1.0
+
+        x, y, w, h = self.box
+        cx, cy = x + w / 2 + shift[0] / width, y + h / 2 + shift[1] / height
+        w, h = w * scale, h * scale
+        self.box = (float(cx - w / 2), float(cy - h / 2), w, h)
+        self._gray = gray
+        self._points = new.reshape(-1, 1, 2)
+
+        if not (0.0 <= cx <= 1.0 and 0.0 <= cy <= 1.0):
+            label = self.label
+            self.stop()
+            return {'event': 'out_of_view', 'message': f"{label[:1].upper()}{label[1:]} is out of view"}
+
+        direction = zone(cx, self.direction)
+        if direction == self.direction:
+            self._candidate, self._candidate_frames = None, 0
+            return None
+        if direction != self._candidate:
+            self._candidate, self._candidate_frames = direction, 0
+        self._candidate_frames += 1
+        if self._candidate_frames < STABLE_FRAMES:
+            return None
+
+        self.direction = direction
+        self._candidate, self._candidate_frames = None, 0
+        return {'event': 'direction', 'message': f"Now {DIRECTIONS[direction]}"}
+
+    def pixel_box(self, shape):
+        """The tracked box in pixels of a frame of the given shape, for drawing"""
+        height, width = shape[:2]
+        x, y, w, h = self.box
+        return (int(x * width), int(y * height)), (int((x + w) * width), int((y + h) * height))
@@ -2,6 +2,7 @@ import cv2
 import os
 import time
 from vision_engine import VisualAssistant
+from frame_quality import FrameBuffer, assess_frame
 from gtts import gTTS
 from pygame import mixer
 
@@ -11,6 +12,7 @@ class VisualBuddy:
         self.assistant = VisualAssistant()
         mixer.init()
         self.is_processing = False
+        self.frames = FrameBuffer(size=8)  # recent frames, best one gets analyzed
         
     def speak(self, text):
         """Convert text to speech and play it"""
@@ -54,6 +56,9 @@ class VisualBuddy:
                     print("Error: Failed to read from camera")
                     break
                 
+                # Keep an unannotated copy for best-frame selection
+                self.frames.add(frame.copy())
+                
                 # Display status on frame
                 status_text = "Ready" if not self.is_processing else "Processing..."
                 cv2.putText(frame, status_text, (10, 30), 
@@ -97,6 +102,15 @@ class VisualBuddy:
         self.is_processing = True
         
         try:
+            # Prefer the sharpest recent frame over the one under the key press
+            best_frame, scores = self.frames.best()
+            if best_frame is not None:
+                frame = best_frame
+                hint = assess_frame(scores)
+                if hint:
+                    self.speak(hint)
+                    return
+            
             # Save the captured frame
             cv2.imwrite("capture.jpg", frame)
             print(f"📸 Captured! Analyzing ({mode} mode)...")
@@ -1,22 +1,52 @@
 import cv2
 import os
+import queue
+import threading
 import time
+from collections import deque
 from datetime import datetime
 from vision_engine import VisualAssistant
+from frame_quality import FrameBuffer, assess_frame
+from overlay import OverlayCompositor
+from hazard_tracker import HazardTracker, BOX_INSTRUCTION, DIRECTIONS, parse_hazard, prepare
 from gtts import gTTS
 from pygame import mixer
 import json
 
+MAX_CATCHUP_FRAMES = 300  # frames kept while a hazard check runs, to catch the tracker up
+MAX_REQUERIES = 2         # automatic hazard re-checks in a row after losing track
+
 class VisualBuddyAdvanced:
     def __init__(self):
         """Initialize the Visual Buddy Advanced application"""
         self.assistant = VisualAssistant()
         mixer.init()
         self.is_processing = False
+        self.frames = FrameBuffer(size=8)  # recent frames, best one gets analyzed
         self.history = []
         self.save_screenshots = False
         self.tts_speed = "normal"  # "slow" or "normal"
         
+        # Static controls are rendered once; see overlay.py
+        self.overlay = OverlayCompositor([
+            "SPACE: Describe | R: Read Text | H: Hazards",
+            "S: Screenshot On/Off | T: TTS Speed | L: Last 5",
+            "C: Clear History | X: Stop Tracking | Q: Quit"
+        ])
+        
+        # Hazard checks run in the background so the reported hazard can be
+        # tracked locally (see hazard_tracker.py) while the camera keeps going
+        self.tracker = HazardTracker()
+        self.hazard_results = queue.Queue()
+        self.hazard_pending = False
+        self.catchup = deque(maxlen=MAX_CATCHUP_FRAMES)
+        self.requeries = 0
+        
+        # One voice at a time; announcements wait for the current one
+        self._speech_lock = threading.Lock()
+        self._speaker = None
+        self.announcements = deque()  # (text, replaceable)
+        
         # Create directories
         os.makedirs("screenshots", exist_ok=True)
         os.makedirs("history", exist_ok=True)
@@ -24,19 +54,42 @@ class VisualBuddyAdvanced:
     def speak(self, text, slow=None):
         """Convert text to speech and play it"""
         print(f"\n🔊 Assistant: {text}\n")
-        try:
-            use_slow = slow if slow is not None else (self.tts_speed == "slow")
-            tts = gTTS(text=text, lang='en', slow=use_slow)
-            tts.save("speech.mp3")
-            mixer.music.load("speech.mp3")
-            mixer.music.play()
-            
-            # Wait for audio to finish playing
-            while mixer.music.get_busy():
-                time.sleep(0.1)
+        with self._speech_lock:
+            try:
+                use_slow = slow if slow is not None else (self.tts_speed == "slow")
+                tts = gTTS(text=text, lang='en', slow=use_slow)
+                tts.save("speech.mp3")
+                mixer.music.load("speech.mp3")
+                mixer.music.play()
                 
-        except Exception as e:
-            print(f"❌ Speech error: {e}")
+                # Wait for audio to finish playing
+                while mixer.music.get_busy():
+                    time.sleep(0.1)
+                    
+            except Exception as e:
+                print(f"❌ Speech error: {e}")
+    
+    def announce(self, text, replaceable=False):
+        """
+        Speak without blocking the camera loop
+        
+        Args:
+            text: What to say
+            replaceable: A newer replaceable announcement (e.g. a direction
+                         update) drops this one if it has not started yet
+        """
+        if replaceable:
+            self.announcements = deque(item for item in self.announcements if not item[1])
+        self.announcements.append((text, replaceable))
+        self.flush_announcement()
+    
+    def flush_announcement(self):
+        """Start the next announcement once nothing else is being said"""
+        if not self.announcements or (self._speaker and self._speaker.is_alive()):
+            return
+        text, _ = self.announcements.popleft()
+        self._speaker = threading.Thread(target=self.speak, args=(text,), daemon=True)
+        self._speaker.start()
     
     def save_to_history(self, mode, description, image_path=None):
         """Save analysis to history"""
@@ -53,38 +106,23 @@ class VisualBuddyAdvanced:
             json.dump(self.history, f, indent=2)
     
     def draw_ui(self, frame):
-        """Draw UI elements on frame"""
-        height, width = frame.shape[:2]
-        
-        # Create semi-transparent overlay for controls
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, height - 180), (width, height), (0, 0, 0), -1)
-        frame = cv2.addWeighted(frame, 0.7, overlay, 0.3, 0)
-        
+        """Draw UI elements on a display copy of the frame"""
         # Status indicator
         status_color = (0, 165, 255) if not self.is_processing else (0, 255, 255)
         status_text = "READY" if not self.is_processing else "PROCESSING..."
-        cv2.putText(frame, status_text, (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, status_color, 2)
-        
-        # Controls
-        controls = [
-            "SPACE: Describe | R: Read Text | H: Hazards",
-            "S: Screenshot On/Off | T: TTS Speed | L: Last 5",
-            "C: Clear History | Q: Quit"
-        ]
-        
-        y_offset = height - 150
-        for i, control in enumerate(controls):
-            cv2.putText(frame, control, (10, y_offset + i * 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         
         # Additional info
         info = f"Screenshots: {'ON' if self.save_screenshots else 'OFF'} | TTS: {self.tts_speed.upper()} | History: {len(self.history)}"
-        cv2.putText(frame, info, (10, height - 20),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
         
-        return frame
+        display = self.overlay.compose(frame, status_text, status_color, info)
+        
+        # Tracked hazard region
+        if self.tracker.active:
+            top_left, bottom_right = self.tracker.pixel_box(display.shape)
+            cv2.rectangle(display, top_left, bottom_right, (0, 0, 255), 2)
+            cv2.putText(display, self.tracker.label[:40], (top_left[0], max(top_left[1] - 8, 15)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+        return display
     
     def run(self):
         """Main application loop"""
@@ -109,6 +147,10 @@ class VisualBuddyAdvanced:
                     print("❌ Error: Failed to read from camera")
                     break
                 
+                self.frames.add(frame)
+                self.track_hazard(frame)
+                self.flush_announcement()
+                
                 # Draw UI
                 display_frame = self.draw_ui(frame)
                 cv2.imshow('Visual Buddy Advanced', display_frame)
@@ -125,8 +167,14 @@ class VisualBuddyAdvanced:
                 elif key == ord('r'):  # Read text
                     self.capture_and_analyze(frame, mode="text")
                     
-                elif key == ord('h'):  # Hazard detection
-                    self.capture_and_analyze(frame, mode="hazard")
+                elif key == ord('h'):  # Hazard detection (then tracked locally)
+                    self.requeries = 0
+                    self.start_hazard_check(frame)
+                    
+                elif key == ord('x'):  # Stop hazard tracking
+                    if self.tracker.active:
+                        self.tracker.stop()
+                        self.announce("Tracking stopped")
                     
                 elif key == ord('s'):  # Toggle screenshot saving
                     self.save_screenshots = not self.save_screenshots
@@ -157,6 +205,7 @@ class VisualBuddyAdvanced:
             cap.release()
             cv2.destroyAllWindows()
             mixer.quit()
+            print(f"⏱️  UI drawing: {self.overlay.average_ms():.2f} ms/frame on average")
             
             # Clean up temporary files
             if os.path.exists("capture.jpg"):
@@ -169,6 +218,16 @@ class VisualBuddyAdvanced:
         self.is_processing = True
         
         try:
+            # Prefer the sharpest recent frame over the one under the key press
+            best_frame, scores = self.frames.best()
+            if best_frame is not None:
+                frame = best_frame
+                hint = assess_frame(scores)
+                if hint:
+                    print(f"⚠️  Frame rejected locally: {hint}")
+                    self.speak(hint)
+                    return
+            
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             # Save capture
@@ -198,6 +257,114 @@ class VisualBuddyAdvanced:
         finally:
             self.is_processing = False
     
+    def start_hazard_check(self, frame, requery=False):
+        """
+        Run a hazard check in the background; the main hazard it reports is
+        then tracked on the camera feed
+        
+        Args:
+            frame: Frame under the key press (the sharpest recent frame is preferred)
+            requery: Automatic re-check after losing track (short announcement only)
+        """
+        # A re-check looks at the present; older buffered frames may show
+        # what the tracker just lost
+        best_frame, scores = (frame, None) if requery else self.frames.best()
+        if scores is not None:
+            hint = assess_frame(scores)
+            if hint:
+                print(f"⚠️  Frame rejected locally: {hint}")
+                self.announce(hint)
+                return
+        frame = best_frame.copy() if best_frame is not None else frame
+        
+        self.tracker.stop()
+        self.is_processing = True
+        self.hazard_pending = True
+        self.catchup.clear()
+        print(f"📸 Captured! Analyzing (hazard mode{', re-check' if requery else ''})...")
+        threading.Thread(target=self._run_hazard_check, args=(frame, requery), daemon=True).start()
+    
+    def _run_hazard_check(self, frame, requery):
+        """Background part of a hazard check: the remote call"""
+        try:
+            screenshot_path = None
+            if self.save_screenshots:
+                screenshot_path = f"screenshots/hazard_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+                cv2.imwrite(screenshot_path, frame)
+                print(f"💾 Screenshot saved: {screenshot_path}")
+            
+            ok, encoded = cv2.imencode('.jpg', frame)
+            description = self.assistant.analyze_image(encoded.tobytes(), mode="hazard",
+                                                       instruction=BOX_INSTRUCTION)
+            spoken, box, label = parse_hazard(description)
+            self.save_to_history("hazard", spoken, screenshot_path)
+            self.hazard_results.put((prepare(frame), spoken, box, label, requery))
+        except Exception as e:
+            print(f"❌ Analysis error: {e}")
+            self.hazard_results.put(None)
+    
+    def track_hazard(self, frame):
+        """Per-frame tracking step: finish hazard checks and announce direction changes"""
+        if self.hazard_pending:
+            self.catchup.append(prepare(frame))
+            try:
+                result = self.hazard_results.get_nowait()
+            except queue.Empty:
+                return
+            self.hazard_pending = False
+            self.is_processing = False
+            self.finish_hazard_check(result, frame)
+            return
+        
+        if not self.tracker.active:
+            return
+        event = self.tracker.update(prepare(frame))
+        if event:
+            self.handle_tracking_event(event, frame)
+    
+    def finish_hazard_check(self, result, frame):
+        """Speak the hazard answer and lock the tracker onto the reported region"""
+        if result is None:
+            self.catchup.clear()
+            self.announce("Sorry, an error occurred during analysis.")
+            return
+        
+        gray, spoken, box, label, requery = result
+        if not requery:
+            self.announce(spoken)
+        
+        if box is None or not self.tracker.start(gray, box, label):
+            if requery:
+                self.announce("I can no longer see the hazard.")
+            self.catchup.clear()
+            return
+        
+        # Replay the frames seen during the remote call to reach the present
+        event = None
+        for frame_gray in self.catchup:
+            event = self.tracker.update(frame_gray) or event
+            if not self.tracker.active:
+                break
+        self.catchup.clear()
+        print(f"🎯 Tracking: {label} ({self.tracker.direction})")
+        
+        if event and event['event'] != 'direction':
+            self.handle_tracking_event(event, frame)
+        elif requery or event:
+            self.announce(f"{label}, {DIRECTIONS[self.tracker.direction]}", replaceable=True)
+    
+    def handle_tracking_event(self, event, frame):
+        """Announce a direction change, or re-check the hazard after losing track"""
+        print(f"🎯 {event['message']}")
+        if event['event'] == 'lost' and self.requeries < MAX_REQUERIES:
+            # Confidence dropped: ask the model again instead of guessing
+            self.requeries += 1
+            self.start_hazard_check(frame, requery=True)
+            return
+        if event['event'] == 'direction':
+            self.requeries = 0
+        self.announce(event['message'], replaceable=event['event'] == 'direction')
+    
     def read_history(self):
         """Read the last 5 history entries"""
         if not self.history:
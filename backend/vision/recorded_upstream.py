@@ -0,0 +1,195 @@
+"""
+Recorded upstream responses for deterministic replays
+While traffic is captured, every generateContent reply is stored with a
+fingerprint of its request. The stand-in server can then answer the same
+requests from the recording, so a replayed corpus gets the same model
+answers offline.
+
+The fingerprint covers the model and the user content only: prompt cache
+names differ between the real API and the stand-in, and images are hashed
+without their metadata so a sanitized corpus image matches the original.
+"""
+
+import base64
+import hashlib
+import json
+import struct
+import threading
+
+# JPEG segments kept when stripping metadata (APP0 = JFIF header)
+_JPEG_KEEP_APP = {0xE0}
+# PNG chunks that can carry camera, location or editing metadata
+_PNG_DROP_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'eXIf', b'tIME'}
+
+
+def image_format(data):
+    """
+    Image format sniffed from the magic bytes
+
+    Returns:
+        'jpeg', 'png', 'gif', 'webp', 'tiff', 'heif', or None if not an image we know
+    """
+    if data[:2] == b'\xff\xd8':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1', b'msf1', b'avif'):
+        return 'heif'
+    return None
+
+
+def strip_image_metadata(data, strict=False):
+    """
+    Remove metadata (EXIF, GPS, comments, text chunks) from JPEG or PNG bytes
+    without re-encoding the pixels
+
+    Args:
+        data: Upload bytes
+        strict: Return None for a JPEG that cannot be parsed, whose metadata
+                may still be in it (default: return it unchanged)
+
+    Returns:
+        The stripped bytes (other formats unchanged)
+    """
+    kind = image_format(data)
+    if kind == 'jpeg':
+        stripped = _strip_jpeg(data)
+        if stripped is None:
+            return None if strict else data
+        return stripped
+    if kind == 'png':
+        return _strip_png(data)
+    return data
+
+
+def _strip_jpeg(data):
+    """Stripped JPEG bytes, or None if the segments cannot be followed to the image data"""
+    out = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xDA:  # start of scan: the rest is image data
+            out.append(data[pos:])
+            return b''.join(out)
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        segment = data[pos:pos + 2 + length]
+        is_metadata = (0xE1 <= marker <= 0xEF or marker == 0xFE) and marker not in _JPEG_KEEP_APP
+        if not is_metadata:
+            out.append(segment)
+        pos += 2 + length
+    return None
+
+
+def _strip_png(data):
+    out = [data[:8]]
+    pos = 8
+    while pos + 8 <= len(data):
+        length = struct.unpack('>I', data[pos:pos + 4])[0]
+        kind = data[pos + 4:pos + 8]
+        chunk = data[pos:pos + 12 + length]
+        if kind not in _PNG_DROP_CHUNKS:
+            out.append(chunk)
+        pos += 12 + length
+        if kind == b'IEND':
+            break
+    return b''.join(out)
+
+
+def _content_digest(body):
+    """Hashable view of the user content: text as is, images by stripped hash"""
+    parts = []
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            inline = part.get('inline_data') or part.get('inlineData')
+            if inline:
+                image = strip_image_metadata(base64.b64decode(inline.get('data', '')))
+                parts.append(['image', hashlib.sha256(image).hexdigest()])
+            else:
+                parts.append(['text', part.get('text', '')])
+    return parts
+
+
+def request_fingerprint(body, model=None):
+    """Fingerprint of a generateContent request (model-independent when model is None)"""
+    data = json.dumps([model, _content_digest(body)], sort_keys=True).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseRecorder:
+    """Appends (fingerprint, reply) records to a JSONL file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model, body, reply, elapsed=None):
+        record = {
+            'fingerprint': request_fingerprint(body, model),
+            'content': request_fingerprint(body),
+            'model': model,
+            'elapsed_ms': None if elapsed is None else round(elapsed * 1000, 1),
+            'reply': reply,
+        }
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.count += 1
+
+
+class RecordedResponses:
+    """
+    Replies from a ResponseRecorder file, looked up by request fingerprint
+
+    A request seen several times gets its recorded replies in order (then
+    the last one again). When the model differs from the recording (another
+    cascade setup), a reply recorded for the same content is used instead.
+    Replies come with the upstream latency measured while recording.
+    """
+
+    def __init__(self, path):
+        self.by_fingerprint = {}
+        self.by_content = {}
+        self.hits = 0
+        self.misses = 0
+        self._used = {}
+        self._lock = threading.Lock()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted capture
+                entry = (record['reply'], (record.get('elapsed_ms') or 0) / 1000)
+                self.by_fingerprint.setdefault(record['fingerprint'], []).append(entry)
+                self.by_content.setdefault(record['content'], []).append(entry)
+
+    def __len__(self):
+        return sum(len(replies) for replies in self.by_fingerprint.values())
+
+    def lookup(self, model, body):
+        """(reply, recorded latency in seconds) for a request, or None"""
+        keys = [('model', request_fingerprint(body, model), self.by_fingerprint),
+                ('content', request_fingerprint(body), self.by_content)]
+        with self._lock:
+            for kind, key, table in keys:
+                replies = table.get(key)
+                if replies:
+                    index = self._used.get((kind, key), 0)
+                    self._used[(kind, key)] = index + 1
+                    self.hits += 1
+                    return replies[min(index, len(replies) - 1)]
+            self.misses += 1
+            return None
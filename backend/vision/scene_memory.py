@@ -0,0 +1,182 @@
+"""
+Scene memory for incremental "what changed" narration
+Keeps the last described frame and its description per session, and finds
+what changed locally, so a repeated request in the same place only sends the
+changed region (with the earlier description as context) - or nothing at all
+when the scene has not changed.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+CHANGE_WIDTH = 160          # frames are compared on a small grayscale copy
+PIXEL_THRESHOLD = 25        # gray-level difference that counts as a change
+MAX_SHIFT = 0.1             # larger camera moves (fraction of the width) are a new scene
+NO_CHANGE_FRACTION = 0.01   # below this fraction of changed pixels: "no change"
+NEW_SCENE_FRACTION = 0.5    # above this: describe the whole scene again
+FULL_FRAME_FRACTION = 0.6   # send the whole frame when the changed box covers more
+MIN_CROP_SIDE = 0.3         # crops are at least this fraction of the frame per side
+CROP_PADDING = 0.15         # context kept around the changed box, per side
+JPEG_QUALITY = 85
+
+SESSION_TTL = 600           # seconds a session's scene is remembered
+MAX_SESSIONS = 1000
+MAX_CHANGE_NOTES = 3        # recent change narrations kept as context
+
+NO_CHANGE_TEXT = "No change."
+
+
+def change_gray(frame):
+    """Small blurred grayscale copy of a BGR frame used for change detection"""
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, (CHANGE_WIDTH, max(int(height * CHANGE_WIDTH / width), 1)),
+                       interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(small, (5, 5), 0)
+
+
+def detect_change(previous, current):
+    """
+    Compare two change_gray() copies
+
+    Small camera shifts are compensated (phase correlation) and global
+    brightness changes from auto-exposure are ignored.
+
+    Returns:
+        Dict with 'fraction' of changed pixels and the changed 'box'
+        (x, y, w, h) as fractions of the frame (None when nothing changed),
+        or None when the camera moved too far to compare (a new scene)
+    """
+    if previous.shape != current.shape:
+        return None
+    height, width = current.shape
+    (dx, dy), _ = cv2.phaseCorrelate(previous.astype(np.float32), current.astype(np.float32))
+    if abs(dx) > MAX_SHIFT * width or abs(dy) > MAX_SHIFT * width:
+        return None
+
+    aligned = cv2.warpAffine(previous, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height),
+                             borderMode=cv2.BORDER_REPLICATE)
+    diff = current.astype(np.int16) - aligned.astype(np.int16)
+    diff -= int(np.median(diff))  # exposure drift shifts every pixel alike
+    mask = (np.abs(diff) > PIXEL_THRESHOLD).astype(np.uint8)
+
+    # Ignore the border uncovered by the shift, and isolated noisy pixels
+    margin_x, margin_y = int(np.ceil(abs(dx))) + 1, int(np.ceil(abs(dy))) + 1
+    mask[:margin_y] = 0
+    mask[height - margin_y:] = 0
+    mask[:, :margin_x] = 0
+    mask[:, width - margin_x:] = 0
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    fraction = float(np.count_nonzero(mask)) / mask.size
+    box = None
+    points = cv2.findNonZero(mask)
+    if points is not None:
+        x, y, w, h = cv2.boundingRect(points)
+        box = (x / width, y / height, w / width, h / height)
+    return {'fraction': round(fraction, 4), 'box': box}
+
+
+def crop_changed(frame, box):
+    """
+    JPEG bytes of the changed region of a frame, with some context around it
+
+    Args:
+        frame: Full-resolution BGR frame
+        box: Changed box from detect_change() (fractions of the frame)
+
+    Returns:
+        (jpeg_bytes, cropped) - cropped is False when the whole frame is sent
+    """
+    x, y, w, h = box
+    if w * h >= FULL_FRAME_FRACTION:
+        region, cropped = frame, False
+    else:
+        # Pad the box and grow small ones around their center, staying inside the frame
+        crop_w = min(max(w * (1 + 2 * CROP_PADDING), MIN_CROP_SIDE), 1.0)
+        crop_h = min(max(h * (1 + 2 * CROP_PADDING), MIN_CROP_SIDE), 1.0)
+        left = min(max(x + w / 2 - crop_w / 2, 0.0), 1.0 - crop_w)
+        top = min(max(y + h / 2 - crop_h / 2, 0.0), 1.0 - crop_h)
+        height, width = frame.shape[:2]
+        region = frame[int(top * height):int((top + crop_h) * height),
+                       int(left * width):int((left + crop_w) * width)]
+        cropped = True
+    ok, encoded = cv2.imencode('.jpg', region, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode the changed region")
+    return encoded.tobytes(), cropped
+
+
+class SceneMemory:
+    """Last described frame and description per session (LRU with a TTL)"""
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.counts = {'unchanged': 0, 'changed': 0, 'new_scene': 0}
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """The session's scene, or None if unknown or expired"""
+        with self._lock:
+            scene = self.sessions.get(session_id)
+            if scene is None:
+                return None
+            if time.monotonic() - scene['updated_at'] > self.ttl:
+                del self.sessions[session_id]
+                return None
+            self.sessions.move_to_end(session_id)
+            return scene
+
+    def remember(self, session_id, gray, description=None, change=None):
+        """
+        Store the frame a narration was based on
+
+        Args:
+            session_id: Client session
+            gray: change_gray() copy of the frame
+            description: Full scene description (starts a new scene)
+            change: Narrated change (added to the current scene's context)
+        """
+        with self._lock:
+            scene = self.sessions.get(session_id)
+            if description is not None or scene is None:
+                scene = {'description': description or '', 'changes': deque(maxlen=MAX_CHANGE_NOTES)}
+                self.counts['new_scene'] += 1
+            else:
+                self.counts['changed'] += 1
+            if change:
+                scene['changes'].append(change)
+            scene['gray'] = gray
+            scene['updated_at'] = time.monotonic()
+            self.sessions[session_id] = scene
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def unchanged(self):
+        """Count a request answered locally with NO_CHANGE_TEXT"""
+        with self._lock:
+            self.counts['unchanged'] += 1
+
+    @staticmethod
+    def context(scene):
+        """The scene description and recent changes, as prompt context"""
+        text = scene['description']
+        if scene['changes']:
+            text += ' Since then: ' + ' '.join(scene['changes'])
+        return text.strip()
+
+    def clear(self, session_id):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, sessions=len(self.sessions))
@@ -0,0 +1,284 @@
+"""
+Local stand-in for the Gemini REST API
+Serves generateContent / cachedContents / countTokens with canned answers and
+injectable latency and error patterns, so the upstream pool and the servers
+can be exercised offline.
+
+With --replay, generateContent is answered from the upstream responses of a
+captured traffic corpus (see traffic_capture.py), so replays of that corpus
+get the recorded model answers; unknown requests fall back to canned ones.
+
+Usage:
+    python standin_server.py --port 8765 --latency 0.2 --pattern ok,ok,429,500
+    python standin_server.py --port 8765 --replay ../traffic/20261019-120000 --recorded-latency
+    GEMINI_BASE_URL=http://localhost:8765 GEMINI_API_KEY=test python ../finalserver.py
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from .recorded_upstream import RecordedResponses
+except ImportError:  # running as a script from the vision directory
+    from recorded_upstream import RecordedResponses
+
+CANNED = {
+    "hazard": ("HAZARD_LEVEL: 1\n\nWHAT I SEE:\nA few small items on the floor.\n\n"
+               "WHERE IT IS:\nDirectly ahead\n\nWHY IT'S RISKY:\nYou could trip.\n\n"
+               "WHAT TO DO:\nWatch your step"),
+    "text": "The sign says: Exit.",
+    "general": "A desk with a laptop and a mug in front of you.",
+}
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class Behavior:
+    """
+    Latency / error injection for one stand-in
+
+    Args:
+        latency: Base delay in seconds for every request
+        jitter: Extra uniformly random delay in seconds
+        error_rate: Probability of answering with error_status
+        error_status: Status used for random errors
+        pattern: Cycled list of "ok" or HTTP status codes, applied before error_rate
+        model_latency: Optional dict model -> base latency override
+        min_cache_tokens: cachedContents requests below this size are rejected
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=500,
+                 pattern=None, model_latency=None, min_cache_tokens=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.model_latency = model_latency or {}
+        self.min_cache_tokens = min_cache_tokens
+        self.set_pattern(pattern)
+        self._lock = threading.Lock()
+
+    def set_pattern(self, pattern):
+        self._pattern = itertools.cycle(pattern) if pattern else None
+
+    def next_outcome(self):
+        """'ok' or an HTTP status code for the next request"""
+        with self._lock:
+            if self._pattern is not None:
+                outcome = next(self._pattern)
+                if outcome != "ok":
+                    return int(outcome)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return "ok"
+
+    def delay(self, model=None):
+        base = self.model_latency.get(model, self.latency)
+        return base + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._reply(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+
+        stand_in = self.server.stand_in
+        stand_in.record(self.path, self.headers.get("x-goog-api-key"), body)
+
+        match = re.match(r"^/v1beta/models/([^/:]+):(\w+)", self.path)
+        model = match.group(1) if match else None
+
+        time.sleep(stand_in.behavior.delay(model))
+        outcome = stand_in.behavior.next_outcome()
+        if outcome != "ok":
+            headers = {"Retry-After": "1"} if outcome == 429 else None
+            return self._reply(outcome, {"error": {"code": outcome, "message": "injected"}}, headers)
+
+        if self.path.startswith("/v1beta/cachedContents"):
+            return self._create_cache(body)
+        if match and match.group(2) == "generateContent":
+            return self._reply(200, stand_in.generate(model, body))
+        if match and match.group(2) == "countTokens":
+            return self._reply(200, {"totalTokens": _estimate_tokens(json.dumps(body))})
+        return self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def _create_cache(self, body):
+        stand_in = self.server.stand_in
+        size = _estimate_tokens(json.dumps(body.get("systemInstruction", {})))
+        if size < stand_in.behavior.min_cache_tokens:
+            return self._reply(400, {"error": {
+                "code": 400,
+                "message": f"Cached content is too small ({size} < {stand_in.behavior.min_cache_tokens})"}})
+        name = stand_in.add_cache(body)
+        return self._reply(200, {"name": name, "model": body.get("model")})
+
+
+class StandInUpstream:
+    """In-process stand-in server; use start()/stop() or as a context manager"""
+
+    def __init__(self, host="127.0.0.1", port=0, behavior=None, responder=None, verbose=False,
+                 recorded=None, recorded_latency=False):
+        self.behavior = behavior or Behavior()
+        # responder(model, body) -> text, to override the canned answers
+        self.responder = responder
+        # RecordedResponses answering generateContent from a captured corpus,
+        # optionally with the latency measured while recording
+        self.recorded = recorded
+        self.recorded_latency = recorded_latency
+        self.requests = []
+        self.caches = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path, api_key, body):
+        with self._lock:
+            self.requests.append({"path": path, "api_key": api_key,
+                                  "bytes": len(json.dumps(body)), "time": time.time()})
+
+    def add_cache(self, body):
+        with self._lock:
+            name = f"cachedContents/standin-{len(self.caches) + 1}"
+            self.caches[name] = body
+            return name
+
+    def _system_text(self, body):
+        instruction = body.get("systemInstruction") or body.get("system_instruction")
+        if body.get("cachedContent"):
+            cache = self.caches.get(body["cachedContent"], {})
+            instruction = cache.get("systemInstruction")
+        parts = (instruction or {}).get("parts", [])
+        return " ".join(p.get("text", "") for p in parts)
+
+    def generate(self, model, body):
+        """Build a generateContent reply for a request body"""
+        if self.recorded is not None:
+            found = self.recorded.lookup(model, body)
+            if found is not None:
+                reply, elapsed = found
+                if self.recorded_latency:
+                    time.sleep(elapsed)
+                return reply
+
+        system = self._system_text(body)
+        user_text = " ".join(p.get("text", "") for c in body.get("contents", [])
+                             for p in c.get("parts", []))
+
+        if self.responder is not None:
+            text = self.responder(model, body)
+        elif "HAZARD_LEVEL" in system or "HAZARD_LEVEL" in user_text:
+            text = CANNED["hazard"]
+        elif "read text" in system.lower() or "read the text" in user_text.lower():
+            text = CANNED["text"]
+        else:
+            text = CANNED["general"]
+
+        prompt_tokens = _estimate_tokens(system + user_text) + 258 * sum(
+            1 for c in body.get("contents", []) for p in c.get("parts", []) if "inline_data" in p)
+        cached_tokens = _estimate_tokens(system) if body.get("cachedContent") else 0
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                            "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "cachedContentTokenCount": cached_tokens,
+                "candidatesTokenCount": _estimate_tokens(text),
+                "totalTokenCount": prompt_tokens + _estimate_tokens(text),
+            },
+            "modelVersion": model,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--pattern", default="", help="cycled outcomes, e.g. ok,ok,429,500")
+    parser.add_argument("--min-cache-tokens", type=int, default=0)
+    parser.add_argument("--replay", metavar="CORPUS",
+                        help="answer from the upstream responses recorded in a traffic corpus")
+    parser.add_argument("--recorded-latency", action="store_true",
+                        help="with --replay, also wait as long as the recorded upstream call took")
+    args = parser.parse_args()
+
+    behavior = Behavior(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        pattern=[p.strip() for p in args.pattern.split(",") if p.strip()],
+        min_cache_tokens=args.min_cache_tokens,
+    )
+    recorded = None
+    if args.replay:
+        recorded = RecordedResponses(os.path.join(args.replay, "upstream.jsonl"))
+        print(f"Replaying {len(recorded)} recorded responses from {args.replay}")
+    stand_in = StandInUpstream(args.host, args.port, behavior, verbose=True, recorded=recorded,
+                               recorded_latency=args.recorded_latency)
+    print(f"Gemini stand-in running at {stand_in.base_url}")
+    try:
+        stand_in.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping stand-in")
+        if recorded is not None:
+            print(f"Recorded answers: {recorded.hits} hits, {recorded.misses} misses (canned)")
+        stand_in.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,27 @@
 """
 Visual Buddy - System Test Script
 Tests all components before running the main application
+
+With --doctor, also measures each stage of a request on this machine (camera,
+Whisper, JPEG encoding, the vision upstream, disk writes) and reports which
+one is the bottleneck. Reports can be saved and compared across machines or
+releases.
+
+Usage:
+    python test_setup.py
+    python test_setup.py --doctor
+    python test_setup.py --doctor --standin --json doctor.json
+    python test_setup.py --doctor --compare doctor.json --clip command.wav
 """
 
+import argparse
+import json
+import platform
+import statistics
 import sys
 import os
+import tempfile
+import time
 
 def test_imports():
     """Test if all required packages are installed"""
@@ -80,6 +97,350 @@ def test_audio():
         print(f"  ❌ Audio test failed: {e}")
         return False
 
+# ==================== DOCTOR ====================
+
+COMMAND_SECONDS = 5.0  # a typical spoken command, for the per-request budget
+HISTORY_ENTRIES = 100  # entries per user in the hot history tier
+
+# Speech the Whisper timing runs on: 9.4 s of 16 kHz mono, synthesized with
+# espeak-ng (en-us, 135 wpm) so it carries no one's voice, reading DOCTOR_PHRASE
+DOCTOR_CLIP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'doctor_command.wav')
+DOCTOR_PHRASE = ("What do you see in front of me? Read the sign on the door, "
+                 "and tell me if there is anything dangerous on the floor near the stairs.")
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _timed(fn, repeat):
+    """Run fn repeat times; returns the durations in seconds and the last result"""
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def doctor_camera(frames):
+    """Camera open time, frames per second and per-read latency"""
+    print("\n📸 Camera...")
+    import cv2
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(0)
+    opened = time.perf_counter() - start
+    if not cap.isOpened():
+        print("  ⏭️  No camera; skipped")
+        return {'skipped': 'camera could not be opened'}, None
+    try:
+        first_start = time.perf_counter()
+        ok, frame = cap.read()
+        first = time.perf_counter() - first_start
+        if not ok:
+            return {'skipped': 'camera returned no frame'}, None
+        reads = []
+        loop_start = time.perf_counter()
+        for _ in range(frames):
+            read_start = time.perf_counter()
+            ok, latest = cap.read()
+            reads.append(time.perf_counter() - read_start)
+            if ok:
+                frame = latest
+        elapsed = time.perf_counter() - loop_start
+    finally:
+        cap.release()
+
+    result = {
+        'resolution': f"{frame.shape[1]}x{frame.shape[0]}",
+        'open_ms': _ms(opened),
+        'first_frame_ms': _ms(first),
+        'fps': round(frames / elapsed, 1),
+        'read_p50_ms': _ms(_percentile(reads, 0.5)),
+        'read_p95_ms': _ms(_percentile(reads, 0.95)),
+    }
+    print(f"  ✅ {result['resolution']} at {result['fps']} FPS "
+          f"(read p50 {result['read_p50_ms']} ms, p95 {result['read_p95_ms']} ms, "
+          f"first frame {result['first_frame_ms']} ms)")
+    return result, frame
+
+
+def _load_clip(path):
+    """16 kHz mono 16-bit WAVs are read directly (no ffmpeg needed); anything else goes through Whisper"""
+    import wave
+    import numpy as np
+    try:
+        with wave.open(path, 'rb') as f:
+            if (f.getframerate(), f.getnchannels(), f.getsampwidth()) == (16000, 1, 2):
+                return np.frombuffer(f.readframes(f.getnframes()), np.int16).astype(np.float32) / 32768.0
+    except (wave.Error, EOFError):
+        pass
+    import whisper
+    return whisper.load_audio(path)
+
+
+def doctor_whisper(clip, model_name):
+    """
+    Whisper model load time and real-time factor on a clip
+
+    Uses the bundled speech clip unless another one is given: Whisper's
+    decode time depends on what it hears, so only speech gives a real RTF.
+    """
+    print(f"\n🎙️  Whisper ('{model_name}')...")
+    try:
+        import whisper
+    except ImportError:
+        print("  ⏭️  openai-whisper not installed; skipped")
+        return {'skipped': 'openai-whisper not installed'}
+
+    clip = clip or DOCTOR_CLIP
+    if not os.path.exists(clip):
+        print(f"  ❌ Clip not found: {clip}")
+        return {'error': f"Clip not found: {clip}"}
+
+    start = time.perf_counter()
+    model = whisper.load_model(model_name)
+    load = time.perf_counter() - start
+
+    audio = _load_clip(clip)
+    seconds = len(audio) / 16000
+    model.transcribe(audio[:16000], language='en', fp16=False)  # warm-up
+    start = time.perf_counter()
+    text = model.transcribe(audio, language='en', fp16=False)['text'].strip()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'model': model_name,
+        'clip': os.path.basename(clip),
+        'load_s': round(load, 2),
+        'clip_s': round(seconds, 1),
+        'transcribe_s': round(elapsed, 2),
+        'rtf': round(elapsed / seconds, 3),
+        'words': len(text.split()),
+    }
+    print(f"  ✅ Loaded in {result['load_s']}s; {result['clip_s']}s clip in {result['transcribe_s']}s "
+          f"(RTF {result['rtf']}, {result['words']} words)")
+    return result
+
+
+def doctor_jpeg(frame, repeat):
+    """Time to re-encode an upload at each mode's target size"""
+    print("\n🖼️  JPEG encoding...")
+    import cv2
+    import numpy as np
+    from vision_engine import MAX_IMAGE_SIDE, encode_image
+
+    if frame is None:
+        # No camera: a detailed 1080p frame stands in for a phone upload
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur((rng.random((1080, 1920, 3)) * 255).astype(np.uint8), (0, 0), 1.5)
+    ok, upload = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    upload = upload.tobytes()
+
+    result = {'source': f"{frame.shape[1]}x{frame.shape[0]}"}
+    for mode, side in MAX_IMAGE_SIDE.items():
+        times, encoded = _timed(lambda: encode_image(upload, side), repeat)
+        result[mode] = {'side': side, 'ms': _ms(statistics.median(times)), 'bytes': len(encoded)}
+        print(f"  ✅ {mode:<8} {side}px: {result[mode]['ms']} ms ({len(encoded) // 1024} KB)")
+    return result
+
+
+def doctor_upstream(standin, samples):
+    """Round trip of a tiny text request and of one image request to the vision upstream"""
+    print("\n🌐 Vision upstream...")
+    from dotenv import load_dotenv
+    from upstream_pool import UpstreamPool, UpstreamError
+    from vision_engine import MAX_IMAGE_SIDE, image_part
+    from PIL import Image
+    import io
+
+    stand_in, saved_env = None, {}
+    if standin:
+        from standin_server import StandInUpstream
+        stand_in = StandInUpstream().start()
+        saved_env = {name: os.environ.get(name) for name in ('GEMINI_API_KEYS', 'GEMINI_BASE_URL')}
+        os.environ.update(GEMINI_API_KEYS='doctor', GEMINI_BASE_URL=stand_in.base_url)
+    else:
+        load_dotenv()
+    try:
+        try:
+            pool = UpstreamPool.from_env()
+        except ValueError as e:
+            print(f"  ⏭️  {e}; skipped (use --standin to measure a local stand-in)")
+            return {'skipped': str(e)}
+        target = pool.members[0].base_url
+        print(f"  ℹ️  Sending {samples + 1} small requests to {target}")
+
+        ping = {'contents': [{'role': 'user', 'parts': [{'text': 'Reply with the word OK.'}]}]}
+        buffer = io.BytesIO()
+        Image.new('RGB', (1280, 720), (120, 120, 120)).save(buffer, format='JPEG')
+        photo = {'contents': [{'role': 'user', 'parts': [
+            {'text': 'Describe this image in five words.'},
+            image_part(buffer.getvalue(), MAX_IMAGE_SIDE['general'])]}]}
+        try:
+            pings, _ = _timed(lambda: pool.generate(ping), samples)
+            images, _ = _timed(lambda: pool.generate(photo), 1)
+        except UpstreamError as e:
+            print(f"  ❌ Upstream request failed: {e}")
+            return {'target': target, 'error': str(e)}
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+            # Put back whatever the user had configured
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    result = {
+        'target': 'stand-in' if standin else target,
+        'text_p50_ms': _ms(statistics.median(pings)),
+        'text_max_ms': _ms(max(pings)),
+        'image_ms': _ms(images[0]),
+    }
+    print(f"  ✅ Text round trip p50 {result['text_p50_ms']} ms (max {result['text_max_ms']} ms); "
+          f"image request {result['image_ms']} ms")
+    return result
+
+
+def doctor_disk(directory, repeat):
+    """Write latency of the history store: history.json rewrite and archive appends"""
+    print(f"\n💾 Disk ({os.path.abspath(directory)})...")
+    import gzip
+    entry = {'timestamp': '2026-01-01T12:00:00', 'mode': 'general', 'description': 'x' * 300}
+    history = {f'user{n}@example.com': [entry] * HISTORY_ENTRIES for n in range(5)}
+
+    with tempfile.TemporaryDirectory(dir=directory, prefix='.doctor-') as scratch:
+        path = os.path.join(scratch, 'history.json')
+
+        def save():
+            # Same pattern as save_history(): write a temp file, swap it in
+            with open(path + '.tmp', 'w') as f:
+                json.dump(history, f, indent=2)
+            os.replace(path + '.tmp', path)
+
+        def append():
+            with open(os.path.join(scratch, 'segment.jsonl.gz'), 'ab') as f:
+                f.write(gzip.compress((json.dumps(entry) + '\n').encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+
+        saves, _ = _timed(save, repeat)
+        appends, _ = _timed(append, repeat)
+        size = os.path.getsize(path)
+
+    result = {
+        'history_bytes': size,
+        'history_save_p50_ms': _ms(_percentile(saves, 0.5)),
+        'history_save_p95_ms': _ms(_percentile(saves, 0.95)),
+        'append_fsync_p50_ms': _ms(_percentile(appends, 0.5)),
+        'append_fsync_p95_ms': _ms(_percentile(appends, 0.95)),
+    }
+    print(f"  ✅ history.json save ({size // 1024} KB) p50 {result['history_save_p50_ms']} ms, "
+          f"p95 {result['history_save_p95_ms']} ms; "
+          f"durable append p50 {result['append_fsync_p50_ms']} ms, p95 {result['append_fsync_p95_ms']} ms")
+    return result
+
+
+def request_budget(stages):
+    """
+    Time each stage adds to one interaction (ms), for the stages that were measured
+
+    A frame wait at the camera's FPS, re-encoding at the general size, one
+    image request upstream, transcribing a COMMAND_SECONDS command and one
+    history save.
+    """
+    budget = {}
+    camera, whisper, jpeg = stages.get('camera', {}), stages.get('whisper', {}), stages.get('jpeg', {})
+    upstream, disk = stages.get('upstream', {}), stages.get('disk', {})
+    if 'fps' in camera:
+        budget['camera frame'] = round(1000 / max(camera['fps'], 0.1), 1)
+    if 'general' in jpeg:
+        budget['jpeg encode'] = jpeg['general']['ms']
+    if 'image_ms' in upstream:
+        budget['upstream round trip'] = upstream['image_ms']
+    if 'rtf' in whisper:
+        budget['speech to text'] = round(whisper['rtf'] * COMMAND_SECONDS * 1000, 1)
+    if 'history_save_p50_ms' in disk:
+        budget['history write'] = disk['history_save_p50_ms']
+    return budget
+
+
+def _clip(report):
+    return report['stages'].get('whisper', {}).get('clip')
+
+
+def print_budget(report, previous=None):
+    budget = report['budget_ms']
+    if not budget:
+        return
+    total = sum(budget.values())
+    print("\n⏱️  Per-interaction budget on this machine:")
+    before = (previous or {}).get('budget_ms', {})
+    for stage, ms in sorted(budget.items(), key=lambda item: -item[1]):
+        line = f"  {stage:<20}{ms:>9.1f} ms  {ms / total:>4.0%}"
+        if stage in before:
+            line += f"   (was {before[stage]:.1f} ms, {ms - before[stage]:+.1f})"
+            if stage == 'speech to text' and _clip(report) != _clip(previous):
+                line += f"   [clip {_clip(previous)} -> {_clip(report)}]"
+        print(line)
+    stage = report['bottleneck']
+    print(f"\n🐢 Bottleneck: {stage} ({budget[stage]:.0f} of {total:.0f} ms)")
+    if previous:
+        print(f"   Compared with {previous['machine'].get('node')} at {previous.get('created_at')}")
+
+
+def doctor(args):
+    """Measure every stage and print (optionally save) the report"""
+    print("=" * 60)
+    print("🩺 VISUAL BUDDY - PERFORMANCE DOCTOR")
+    print("=" * 60)
+
+    stages = {}
+    stages['camera'], frame = doctor_camera(args.frames)
+    if not args.skip_whisper:
+        stages['whisper'] = doctor_whisper(args.clip, args.whisper_model)
+    stages['jpeg'] = doctor_jpeg(frame, args.repeat)
+    if not args.skip_upstream:
+        stages['upstream'] = doctor_upstream(args.standin, args.samples)
+    stages['disk'] = doctor_disk(args.history_dir, args.repeat)
+
+    budget = request_budget(stages)
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'node': platform.node(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+        },
+        'stages': stages,
+        'budget_ms': budget,
+        'bottleneck': max(budget, key=budget.get) if budget else None,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print("\n" + "=" * 60)
+    print_budget(report, previous)
+    print("=" * 60)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+    return report
+
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -117,5 +478,24 @@ def main():
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctor', action='store_true', help='Measure each stage and find the bottleneck')
+    parser.add_argument('--json', metavar='FILE', help='Save the doctor report')
+    parser.add_argument('--compare', metavar='FILE', help='Show changes against a saved report')
+    parser.add_argument('--standin', action='store_true',
+                        help='Measure a local Gemini stand-in instead of the configured upstream')
+    parser.add_argument('--skip-upstream', action='store_true', help='Send no upstream requests')
+    parser.add_argument('--skip-whisper', action='store_true', help='Do not load Whisper')
+    parser.add_argument('--clip', help=f'Audio file for the Whisper timing (default: {os.path.basename(DOCTOR_CLIP)})')
+    parser.add_argument('--whisper-model', default=os.getenv('WHISPER_MODEL', 'base'))
+    parser.add_argument('--frames', type=int, default=60, help='Camera frames to time')
+    parser.add_argument('--samples', type=int, default=3, help='Upstream text round trips')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions of local timings')
+    parser.add_argument('--history-dir', default='.', help='Directory the history store writes to')
+    args = parser.parse_args()
+
+    if args.doctor:
+        doctor(args)
+        sys.exit(0)
     success = main()
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Visual Buddy - Upstream Pool Test Script
+Exercises the multi-key pool against local Gemini stand-ins (no API key or
+network needed): failover, latency-weighted routing, breaker cooldowns,
+deadlines and the VisualAssistant request path.
+"""
+
+import io
+import os
+import sys
+import time
+
+try:
+    from .upstream_pool import (UpstreamPool, UpstreamMember, UpstreamError, PoolExhaustedError,
+                                DeadlineExceededError, CircuitBreaker, FAILURE_THRESHOLD,
+                                add_response_hook, _response_hooks)
+    from .standin_server import StandInUpstream, Behavior
+except ImportError:  # running as a script from the vision directory
+    from upstream_pool import (UpstreamPool, UpstreamMember, UpstreamError, PoolExhaustedError,
+                               DeadlineExceededError, CircuitBreaker, FAILURE_THRESHOLD,
+                               add_response_hook, _response_hooks)
+    from standin_server import StandInUpstream, Behavior
+
+BODY = {"contents": [{"role": "user", "parts": [{"text": "Describe this image."}]}]}
+
+
+def test_failover():
+    """Requests fail over to a healthy member and the failing one is isolated"""
+    with StandInUpstream(behavior=Behavior(error_rate=1.0)) as bad, StandInUpstream() as good:
+        bad_member = UpstreamMember("key-bad", base_url=bad.base_url)
+        pool = UpstreamPool([bad_member, UpstreamMember("key-good", base_url=good.base_url)])
+
+        for _ in range(20):
+            pool.generate(BODY)
+
+        assert len(bad.requests) <= FAILURE_THRESHOLD, f"bad member got {len(bad.requests)} requests"
+        assert len(good.requests) == 20
+
+
+def test_breaker_opens():
+    """Repeated failures open the breaker and stop traffic to the member"""
+    with StandInUpstream(behavior=Behavior(error_rate=1.0)) as bad:
+        member = UpstreamMember("key-bad", base_url=bad.base_url)
+        pool = UpstreamPool([member])
+
+        for _ in range(FAILURE_THRESHOLD + 2):
+            try:
+                pool.generate(BODY)
+            except PoolExhaustedError:
+                pass
+
+        assert member.breaker.state == CircuitBreaker.OPEN, member.stats()
+        assert len(bad.requests) == FAILURE_THRESHOLD
+
+
+def test_latency_routing():
+    """Faster members get most of the traffic"""
+    with StandInUpstream(behavior=Behavior(latency=0.5)) as slow, \
+            StandInUpstream(behavior=Behavior(latency=0.01)) as fast:
+        pool = UpstreamPool([UpstreamMember("key-slow", base_url=slow.base_url),
+                             UpstreamMember("key-fast", base_url=fast.base_url)])
+
+        for _ in range(40):
+            pool.generate(BODY)
+
+        assert len(fast.requests) > 3 * len(slow.requests), \
+            f"fast={len(fast.requests)} slow={len(slow.requests)}"
+
+
+def test_rate_limit_cooldown():
+    """A 429 opens the breaker for Retry-After seconds, then a probe closes it"""
+    with StandInUpstream(behavior=Behavior(pattern=["429", "ok"])) as stand_in:
+        member = UpstreamMember("key", base_url=stand_in.base_url)
+        pool = UpstreamPool([member])
+
+        try:
+            pool.generate(BODY)
+            raise AssertionError("expected the pool to be exhausted")
+        except PoolExhaustedError as e:
+            assert e.status == 429
+
+        assert member.breaker.state == CircuitBreaker.OPEN
+        time.sleep(1.1)  # the stand-in sends Retry-After: 1
+        pool.generate(BODY)
+        assert member.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_model_filter():
+    """Calls restricted to a model only reach members serving it"""
+    with StandInUpstream() as stand_in:
+        pool = UpstreamPool([UpstreamMember("k", "model-a", stand_in.base_url),
+                             UpstreamMember("k", "model-b", stand_in.base_url)])
+        for _ in range(5):
+            pool.generate(BODY, model="model-b")
+        assert all("model-b" in r["path"] for r in stand_in.requests)
+
+
+def test_deadline():
+    """A call is cut off at its deadline without counting against the member"""
+    with StandInUpstream(behavior=Behavior(latency=1.0)) as stand_in:
+        member = UpstreamMember("key", base_url=stand_in.base_url)
+        pool = UpstreamPool([member])
+
+        for _ in range(FAILURE_THRESHOLD + 1):
+            start = time.monotonic()
+            try:
+                pool.generate(BODY, deadline=start + 0.2)
+                raise AssertionError("expected the deadline to pass")
+            except DeadlineExceededError:
+                pass
+            assert time.monotonic() - start < 0.5, "the call was not cut off"
+
+        assert member.breaker.state == CircuitBreaker.CLOSED and member.errors == 0, member.stats()
+        try:
+            pool.generate(BODY, deadline=time.monotonic())
+            raise AssertionError("expected the deadline to pass")
+        except DeadlineExceededError:
+            pass
+        assert len(stand_in.requests) == FAILURE_THRESHOLD + 1, "a call was sent past its deadline"
+
+
+def test_vision_engine():
+    """VisualAssistant uses cached prompts when possible and records token stats"""
+    from PIL import Image
+    try:
+        from .vision_engine import VisualAssistant
+    except ImportError:
+        from vision_engine import VisualAssistant
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (2000, 1500), (120, 120, 120)).save(buffer, format="PNG")
+
+    for min_cache_tokens, expect_cached in ((0, True), (10 ** 6, False)):
+        with StandInUpstream(behavior=Behavior(min_cache_tokens=min_cache_tokens)) as stand_in:
+            os.environ["GEMINI_API_KEYS"] = "key-one,key-two"
+            os.environ["GEMINI_BASE_URL"] = stand_in.base_url
+            try:
+                assistant = VisualAssistant()
+                result = assistant.analyze_image(buffer.getvalue(), mode="hazard")
+            finally:
+                del os.environ["GEMINI_API_KEYS"], os.environ["GEMINI_BASE_URL"]
+
+            assert result.startswith("HAZARD_LEVEL"), result
+            stats = assistant.get_token_stats()["hazard"]
+            assert stats["prompt_cached"] is expect_cached, stats
+            assert (stats["cached_tokens"] > 0) is expect_cached, stats
+
+
+def test_cascade():
+    """Cheap model answers first; empty or high-hazard answers escalate"""
+    from PIL import Image
+    try:
+        from .vision_engine import VisualAssistant
+    except ImportError:
+        from vision_engine import VisualAssistant
+
+    def responder(model, body):
+        prompt = str(body)
+        if model == "lite":
+            if "Check this image for hazards" in prompt:
+                return "HAZARD_LEVEL: 3\n\nWHAT I SEE:\nA knife on the counter."
+            return "" if "Read the text" in prompt else "A tidy room with a desk and a chair."
+        if "Check this image for hazards" in prompt:
+            return "HAZARD_LEVEL: 3\n\nWHAT I SEE:\nA kitchen knife near the edge of the counter."
+        return "The sign says EXIT."
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (120, 120, 120)).save(buffer, format="JPEG")
+
+    with StandInUpstream(responder=responder) as stand_in:
+        os.environ.update(GEMINI_API_KEYS="k", GEMINI_MODELS="lite,full", GEMINI_BASE_URL=stand_in.base_url)
+        try:
+            assistant = VisualAssistant()
+        finally:
+            for name in ("GEMINI_API_KEYS", "GEMINI_MODELS", "GEMINI_BASE_URL"):
+                del os.environ[name]
+
+        assert assistant.analyze_image(buffer.getvalue(), "general").startswith("A tidy room")
+        assert assistant.analyze_image(buffer.getvalue(), "text") == "The sign says EXIT."
+        assert "kitchen knife" in assistant.analyze_image(buffer.getvalue(), "hazard")
+
+    stats = assistant.get_cascade_stats()
+    assert stats["general"]["escalations"] == 0 and stats["general"]["answered_by"] == {"lite": 1}, stats
+    assert stats["text"]["reasons"] == {"empty": 1}, stats
+    assert stats["hazard"]["reasons"] == {"hazard_level": 1}, stats
+    assert stats["hazard"]["answered_by"] == {"full": 1}, stats
+
+
+def test_cascade_top_model_down():
+    """A failed escalation returns the cheaper model's answer instead of an error"""
+    from PIL import Image
+    try:
+        from .vision_engine import VisualAssistant
+    except ImportError:
+        from vision_engine import VisualAssistant
+
+    def responder(model, body):
+        return "HAZARD_LEVEL: 3\n\nWHAT I SEE:\nA knife on the counter."
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (120, 120, 120)).save(buffer, format="JPEG")
+
+    with StandInUpstream(responder=responder) as stand_in:
+        os.environ.update(GEMINI_API_KEYS="k", GEMINI_MODELS="lite,full", GEMINI_BASE_URL=stand_in.base_url)
+        try:
+            assistant = VisualAssistant()
+        finally:
+            for name in ("GEMINI_API_KEYS", "GEMINI_MODELS", "GEMINI_BASE_URL"):
+                del os.environ[name]
+        for member in assistant.pool.members:
+            if member.model == "full":
+                member.base_url = "http://127.0.0.1:9"  # nothing listens there
+
+        result = assistant.analyze_image(buffer.getvalue(), "hazard")
+
+    assert result.startswith("HAZARD_LEVEL: 3") and "knife" in result, result
+    stats = assistant.get_cascade_stats()["hazard"]
+    assert stats["answered_by"] == {"lite": 1}, stats
+    assert stats["failed_escalations"] == 1 and stats["reasons"] == {"hazard_level": 1}, stats
+
+
+def test_model_swap():
+    """Swapped-in models are warmed before they serve; kept members stay shared"""
+    try:
+        from .vision_engine import VisualAssistant
+    except ImportError:
+        from vision_engine import VisualAssistant
+
+    with StandInUpstream() as stand_in:
+        os.environ.update(GEMINI_API_KEYS="k", GEMINI_MODELS="old", GEMINI_BASE_URL=stand_in.base_url)
+        try:
+            assistant = VisualAssistant()
+        finally:
+            for name in ("GEMINI_API_KEYS", "GEMINI_MODELS", "GEMINI_BASE_URL"):
+                del os.environ[name]
+        kept = assistant.pool.members[0]
+
+        assert assistant.swap_models(["new", "old"], cascade="general=new") == ["new", "old"]
+        assert assistant.pool.members[1] is kept
+        assert assistant.cascade["general"] == ["new"] and assistant.model_name == "new"
+        new_paths = [r["path"] for r in stand_in.requests if "models/new:" in r["path"]]
+        assert new_paths, "the new model was not warmed up"
+        assert len(stand_in.caches) == len(assistant.prompts), "prompt caches not created"
+
+        stand_in.behavior.set_pattern(["503"])
+        try:
+            assistant.swap_models(["broken"])
+            raise AssertionError("swap to an unreachable model succeeded")
+        except UpstreamError:
+            pass
+        assert assistant.pool.models == ["new", "old"], "a failed swap changed the pool"
+
+
+def test_failing_response_hook():
+    """A response hook that raises does not fail the call or the member"""
+    def broken_recorder(model, body, reply, elapsed):
+        raise OSError("No space left on device")
+
+    seen = []
+    add_response_hook(broken_recorder)
+    add_response_hook(lambda model, body, reply, elapsed: seen.append(model))
+    try:
+        with StandInUpstream() as stand_in:
+            member = UpstreamMember("key", base_url=stand_in.base_url)
+            pool = UpstreamPool([member])
+            reply = pool.generate(BODY)
+        assert reply["candidates"], reply
+        assert seen == [member.model], "hooks after the failing one did not run"
+        assert member.errors == 0 and len(stand_in.requests) == 1, member.stats()
+    finally:
+        del _response_hooks[-2:]
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("👁️  VISUAL BUDDY - UPSTREAM POOL TEST")
+    print("=" * 60)
+
+    tests = [test_failover, test_breaker_opens, test_latency_routing, test_rate_limit_cooldown,
+             test_model_filter, test_deadline, test_vision_engine, test_cascade, test_cascade_top_model_down,
+             test_model_swap, test_failing_response_hook]
+    failed = []
+    for test in tests:
+        try:
+            test()
+            print(f"  ✅ {test.__doc__}")
+        except Exception as e:
+            print(f"  ❌ {test.__doc__}: {e}")
+            failed.append(test.__name__)
+
+    print("\n" + "=" * 60)
+    if failed:
+        print(f"❌ FAILED: {', '.join(failed)}")
+    else:
+        print("✅ ALL TESTS PASSED!")
+    print("=" * 60)
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,384 @@
+"""
+Upstream pool for the Gemini API
+Holds several API keys / model endpoints, routes each request to a healthy
+member weighted by observed latency, and isolates failing members with a
+circuit breaker and cooldown.
+
+Calls can carry a deadline (a time.monotonic() value): attempts are cut off
+when it passes, and failing over stops there. A call cut off by its
+deadline is not held against the member.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger('echosight.vision')
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_TIMEOUT = 30.0
+
+LATENCY_ALPHA = 0.3          # weight of the newest sample in the latency average
+INITIAL_LATENCY = 1.0        # seconds, assumed until a member has been measured
+ERROR_PENALTY = 5.0          # seconds fed into the latency average for a failed call
+FAILURE_THRESHOLD = 3        # consecutive failures before a breaker opens
+COOLDOWN = 15.0              # seconds a breaker stays open after opening
+MAX_COOLDOWN = 300.0         # cap for the doubling cooldown of a flapping member
+RATE_LIMIT_COOLDOWN = 60.0   # default cooldown after a 429 without Retry-After
+AUTH_COOLDOWN = 600.0        # bad / revoked key
+
+
+# Callables (model, body, reply, elapsed) run after every successful
+# generateContent, e.g. the traffic capture's response recorder
+_response_hooks = []
+
+
+def add_response_hook(hook):
+    """Register a callable(model, body, reply, elapsed) run after each generateContent reply"""
+    _response_hooks.append(hook)
+
+
+class UpstreamError(Exception):
+    """An upstream call failed"""
+
+    def __init__(self, message, status=None, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class PoolExhaustedError(UpstreamError):
+    """No pool member could serve the request"""
+
+
+class DeadlineExceededError(UpstreamError, TimeoutError):
+    """The caller's deadline passed before the upstream answered"""
+
+    def __init__(self, message="Deadline exceeded"):
+        super().__init__(message, retryable=False)
+
+
+def time_left(deadline, timeout=DEFAULT_TIMEOUT):
+    """
+    Timeout for the next attempt, capped at the deadline
+
+    Args:
+        deadline: time.monotonic() value, or None for no deadline
+        timeout: Per-attempt timeout without a deadline
+
+    Raises:
+        DeadlineExceededError: the deadline has passed
+    """
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededError()
+    return min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe after cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may be sent now (one probe at a time when half-open)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def available(self):
+        """Like allow() but without claiming the half-open probe"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not (self.state == self.HALF_OPEN and self._probing)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._probing = False
+
+    def record_failure(self, cooldown=None):
+        """Count a failure; cooldown forces the breaker open for that long"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN:
+                # The probe failed: back off harder
+                self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+                self._open()
+            elif cooldown is not None or self.failures >= self.failure_threshold:
+                if cooldown is not None:
+                    self.cooldown = cooldown
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a half-open probe slot that ended without a verdict"""
+        with self._lock:
+            self._probing = False
+
+
+class UpstreamMember:
+    """One API key + model endpoint"""
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=DEFAULT_BASE_URL,
+                 weight=1.0, name=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.weight = weight
+        self.name = name or f"{model}#{api_key[-4:] if api_key else '----'}"
+        self.breaker = CircuitBreaker()
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.sessions = {}  # per-member state owned by the caller (e.g. prompt caches)
+        self._lock = threading.Lock()
+
+    # ---------- HTTP ----------
+
+    def request(self, path, body, timeout=DEFAULT_TIMEOUT):
+        """POST a JSON body to {base_url}/v1beta/{path} and return the JSON reply"""
+        url = f"{self.base_url}/v1beta/{path}"
+        req = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode("utf-8"),
+            headers={
+                "Content-Type": "application/json",
+                "x-goog-api-key": self.api_key,
+            },
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")[:300]
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            raise UpstreamError(
+                f"{self.name}: HTTP {e.code} {detail}",
+                status=e.code,
+                # Client errors other than auth / rate limits won't get better elsewhere
+                retryable=e.code in (401, 403, 408, 429) or e.code >= 500,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        except (urllib.error.URLError, TimeoutError, ConnectionError, OSError) as e:
+            raise UpstreamError(f"{self.name}: {e}", retryable=True)
+
+    def generate(self, body, timeout=DEFAULT_TIMEOUT):
+        """Call models/{model}:generateContent"""
+        start = time.monotonic()
+        reply = self.request(f"models/{self.model}:generateContent", body, timeout)
+        elapsed = time.monotonic() - start
+        for hook in _response_hooks:
+            # Observers only: a failing hook must not fail a call that succeeded
+            try:
+                hook(self.model, body, reply, elapsed)
+            except Exception:
+                logger.exception("Response hook %r failed", hook)
+        return reply
+
+    # ---------- Health ----------
+
+    def score(self):
+        """Routing weight: configured weight divided by the latency average"""
+        latency = self.latency if self.latency is not None else INITIAL_LATENCY
+        return self.weight / max(latency, 0.01)
+
+    def record(self, elapsed, error=None):
+        with self._lock:
+            self.requests += 1
+            if error is not None:
+                self.errors += 1
+                # Failures count as very slow samples so routing shifts away quickly
+                elapsed = max(elapsed, ERROR_PENALTY)
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency = LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * self.latency
+
+        if error is None:
+            self.breaker.record_success()
+        elif error.status == 429:
+            self.breaker.record_failure(cooldown=error.retry_after or RATE_LIMIT_COOLDOWN)
+        elif error.status in (401, 403):
+            self.breaker.record_failure(cooldown=AUTH_COOLDOWN)
+        elif error.retryable:
+            self.breaker.record_failure()
+        else:
+            # Bad request: the member is fine
+            self.breaker.release()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "model": self.model,
+            "state": self.breaker.state,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "weight": self.weight,
+        }
+
+
+class UpstreamPool:
+    """Weighted, breaker-guarded routing over a set of UpstreamMembers"""
+
+    def __init__(self, members):
+        if not members:
+            raise ValueError("UpstreamPool needs at least one member")
+        self.members = list(members)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a pool from the environment:
+            GEMINI_API_KEYS   comma-separated keys (falls back to GEMINI_API_KEY)
+            GEMINI_MODELS     comma-separated models (default gemini-2.5-flash)
+            GEMINI_BASE_URL   API base URL (point at a local stand-in for tests)
+        Every key is paired with every model.
+        """
+        keys = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
+        if not keys and os.getenv("GEMINI_API_KEY"):
+            keys = [os.getenv("GEMINI_API_KEY")]
+        if not keys:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        models = [m.strip() for m in os.getenv("GEMINI_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+        base_url = os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL)
+
+        return cls([UpstreamMember(key, model, base_url) for model in models for key in keys])
+
+    @property
+    def models(self):
+        """Distinct model names in pool order"""
+        return list(dict.fromkeys(m.model for m in self.members))
+
+    def with_models(self, models):
+        """
+        A pool serving other models with the same keys and base URL
+
+        Members of models that stay are shared with this pool (keeping their
+        breakers, latency and prompt caches); the others are created.
+        """
+        keys = list(dict.fromkeys(m.api_key for m in self.members))
+        base_url = self.members[0].base_url
+        existing = {(m.model, m.api_key): m for m in self.members}
+        return UpstreamPool([existing.get((model, key)) or UpstreamMember(key, model, base_url)
+                             for model in models for key in keys])
+
+    def _candidates(self, model=None):
+        """Available members, the first picked by weighted random, the rest by score"""
+        members = [m for m in self.members
+                   if (model is None or m.model == model) and m.breaker.available()]
+        if len(members) <= 1:
+            return members
+
+        scores = [m.score() for m in members]
+        first = random.choices(range(len(members)), weights=scores)[0]
+        rest = sorted((m for i, m in enumerate(members) if i != first),
+                      key=lambda m: m.score(), reverse=True)
+        return [members[first]] + rest
+
+    def call(self, fn, model=None, max_attempts=None, deadline=None):
+        """
+        Run fn(member) on the best available member, failing over on errors
+
+        Args:
+            fn: Callable taking an UpstreamMember; raises UpstreamError on failure
+            model: Restrict to members serving this model
+            max_attempts: Members to try before giving up (default: all)
+            deadline: time.monotonic() after which no attempt is started; fn
+                      should cap its timeout with time_left(deadline)
+
+        Returns:
+            Whatever fn returns
+        """
+        candidates = self._candidates(model)
+        if max_attempts is not None:
+            candidates = candidates[:max_attempts]
+
+        last_error = None
+        for member in candidates:
+            time_left(deadline)
+            if not member.breaker.allow():
+                continue
+
+            with member._lock:
+                member.in_flight += 1
+            start = time.monotonic()
+            try:
+                result = fn(member)
+            except UpstreamError as e:
+                if deadline is not None and time.monotonic() >= deadline:
+                    # Cut off by the caller's deadline, not the member's fault
+                    member.breaker.release()
+                    if isinstance(e, DeadlineExceededError):
+                        raise
+                    raise DeadlineExceededError(f"Deadline exceeded ({e})") from e
+                member.record(time.monotonic() - start, e)
+                last_error = e
+                if not e.retryable:
+                    raise
+                continue
+            except Exception:
+                member.breaker.release()
+                raise
+            finally:
+                with member._lock:
+                    member.in_flight -= 1
+
+            member.record(time.monotonic() - start)
+            return result
+
+        raise PoolExhaustedError(
+            f"No upstream available for {model or 'any model'}"
+            + (f" (last error: {last_error})" if last_error else ""),
+            status=getattr(last_error, "status", None),
+        )
+
+    def generate(self, body, model=None, timeout=DEFAULT_TIMEOUT, deadline=None):
+        """generateContent on the best available member"""
+        return self.call(lambda member: member.generate(body, time_left(deadline, timeout)),
+                         model=model, deadline=deadline)
+
+    def stats(self):
+        return [m.stats() for m in self.members]
@@ -1,8 +1,100 @@
-import google.generativeai as genai
+import base64
+import io
+import logging
 import os
+import re
+import threading
+import time
 from PIL import Image
 from dotenv import load_dotenv
 
+try:
+    from .upstream_pool import (UpstreamPool, UpstreamError, PoolExhaustedError, DeadlineExceededError,
+                                time_left, DEFAULT_TIMEOUT)
+    from .cascade import parse_cascade, escalation_reason, CascadeStats
+except ImportError:  # running as a script from the vision directory
+    from upstream_pool import (UpstreamPool, UpstreamError, PoolExhaustedError, DeadlineExceededError,
+                               time_left, DEFAULT_TIMEOUT)
+    from cascade import parse_cascade, escalation_reason, CascadeStats
+
+PROMPT_CACHE_TTL = 3600  # seconds
+CACHE_RETRY_DELAY = 300  # seconds before retrying a cache the upstream failed to create
+
+# Longest image side sent per mode (text needs more detail than scene descriptions)
+MAX_IMAGE_SIDE = {
+    "general": 1024,
+    "text": 1600,
+    "hazard": 1024
+}
+JPEG_QUALITY = 85
+SWAP_DRAIN_TIMEOUT = 60  # seconds to wait for requests on replaced models
+
+# Several images in one request: the answer is split on these markers
+BATCH_MARKER_RE = re.compile(r'^[\s*#]*(IMAGE\s+(\d+)|SUMMARY)[\s*]*:[\s*]*', re.IGNORECASE | re.MULTILINE)
+SUMMARY_PROMPT = """These are descriptions of {count} photos taken one after another by someone \
+with visual impairment (for example while sweeping the camera around a room):
+
+{descriptions}
+
+Combine them into one or two short sentences that can be read aloud. Mention \
+anything important only once, and keep any hazards or readable text."""
+CHANGES_PROMPT = """Earlier, the scene in front of someone with visual impairment was described as:
+"{context}"
+
+This image shows the part of the scene that has changed since then. In one short \
+sentence, say only what is new, has moved or is gone. Do not describe the rest of \
+the scene again. If nothing important changed, answer "No important change."."""
+
+logger = logging.getLogger('echosight.vision')
+
+
+def encode_image(image, max_side):
+    """
+    Load an image and return JPEG bytes no larger than max_side on either edge
+    
+    Args:
+        image: Path to an image file, or raw encoded image bytes
+        max_side: Longest allowed edge in pixels
+        
+    Returns:
+        JPEG-encoded bytes (the original bytes if already a small enough JPEG)
+    """
+    if isinstance(image, str):
+        with open(image, 'rb') as f:
+            image = f.read()
+    
+    with Image.open(io.BytesIO(image)) as img:
+        if img.format == 'JPEG' and max(img.size) <= max_side:
+            return image
+        # Let the JPEG decoder scale down by up to 8x instead of decoding full size
+        scale = max_side / max(img.size)
+        img.draft('RGB', (max(int(img.width * scale), 1), max(int(img.height * scale), 1)))
+        # Close the converted copy too: its pixels can be tens of MB per upload
+        with img.convert('RGB') as rgb:
+            rgb.thumbnail((max_side, max_side))
+            buffer = io.BytesIO()
+            rgb.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+            return buffer.getvalue()
+
+
+def image_part(image, max_side):
+    """Inline image part for a generateContent request"""
+    return {
+        'inline_data': {
+            'mime_type': 'image/jpeg',
+            'data': base64.b64encode(encode_image(image, max_side)).decode('ascii')
+        }
+    }
+
+
+def reply_text(reply):
+    """Concatenated text of the first candidate of a generateContent reply"""
+    candidates = reply.get('candidates') or []
+    if not candidates:
+        return ''
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts)
+
 class VisualAssistant:
     """Vision-powered assistant using Google Gemini API"""
     
@@ -10,12 +102,13 @@ class VisualAssistant:
         """Initialize the assistant with API configuration"""
         load_dotenv()
         
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        # Raises ValueError when no GEMINI_API_KEY(S) are configured
+        self.pool = UpstreamPool.from_env()
+        self.model_name = self.pool.models[0]
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Cheap-first model chain per mode (see cascade.py)
+        self.cascade = parse_cascade(os.getenv('VISION_CASCADE'), self.pool.models)
+        self.cascade_stats = CascadeStats()
         
         # Define prompts for different modes
         self.prompts = {
@@ -80,54 +173,424 @@ IMPORTANT:
 - Keep "What to do" to 5 words or less
 - Err on the side of safety"""
         }
+        
+        # Short per-request instructions; the long mode prompts above live in
+        # the per-mode sessions as system instructions and are not resent
+        self.instructions = {
+            "general": "Describe this image.",
+            "text": "Read the text in this image.",
+            "hazard": "Check this image for hazards."
+        }
+        
+        self.token_stats = {}
+        self._lock = threading.Lock()
+    
+    def _create_session(self, member, mode):
+        """
+        Create the upstream prompt cache for a mode on one pool member.
+        
+        Returns:
+            (cache_name, refresh_at); cache_name is None when the upstream
+            refused (prompts below the minimum cacheable size are rejected)
+        """
+        try:
+            reply = member.request('cachedContents', {
+                'model': f"models/{member.model}",
+                'displayName': f"visual-assistant-{mode}",
+                'systemInstruction': {'parts': [{'text': self.prompts[mode]}]},
+                'ttl': f"{PROMPT_CACHE_TTL}s"
+            }, timeout=10)
+            # Recreate a little before the upstream cache expires
+            return reply['name'], time.monotonic() + PROMPT_CACHE_TTL - 300
+        except (UpstreamError, KeyError) as e:
+            logger.info("Prompt cache unavailable for '%s' on %s (%s); using system instruction",
+                        mode, member.name, e)
+            # A 400 means "not cacheable" for good; anything else may be transient
+            retry_at = None if getattr(e, 'status', None) == 400 else time.monotonic() + CACHE_RETRY_DELAY
+            return None, retry_at
+    
+    def _session_fields(self, member, mode):
+        """
+        Request fields that carry the mode prompt for a member: a cachedContent
+        reference when available, otherwise the prompt as system instruction
+        
+        Returns:
+            (fields, cached)
+        """
+        with self._lock:
+            session = member.sessions.get(mode)
+        
+        if session is None or (session[1] is not None and time.monotonic() >= session[1]):
+            session = self._create_session(member, mode)
+            with self._lock:
+                member.sessions[mode] = session
+        
+        if session[0]:
+            return {'cachedContent': session[0]}, True
+        return {'systemInstruction': {'parts': [{'text': self.prompts[mode]}]}}, False
+    
+    def _drop_session(self, member, mode):
+        with self._lock:
+            member.sessions.pop(mode, None)
+    
+    def _generate(self, parts, mode=None, timeout=DEFAULT_TIMEOUT, model=None, deadline=None, pool=None):
+        """
+        Run generateContent through the upstream pool
+        
+        Args:
+            parts: User content parts (text / inline_data)
+            mode: Prompt mode whose session to use, or None for no system prompt
+            timeout: Per-attempt timeout in seconds
+            model: Restrict to pool members serving this model
+            deadline: time.monotonic() by which the answer is needed (attempts
+                      are cut off there and DeadlineExceededError is raised)
+            pool: UpstreamPool to use (default: the current one)
+            
+        Returns:
+            Response text ('' if the model returned nothing)
+        """
+        def attempt(member):
+            fields, cached = self._session_fields(member, mode) if mode else ({}, False)
+            body = dict(fields, contents=[{'role': 'user', 'parts': parts}])
+            try:
+                return member.generate(body, time_left(deadline, timeout)), cached
+            except UpstreamError as e:
+                if not cached or e.status not in (400, 403, 404):
+                    raise
+                # The upstream cache may have been evicted; rebuild once
+                self._drop_session(member, mode)
+                fields, cached = self._session_fields(member, mode)
+                body = dict(fields, contents=[{'role': 'user', 'parts': parts}])
+                return member.generate(body, time_left(deadline, timeout)), cached
+        
+        reply, cached = (pool or self.pool).call(attempt, model=model, deadline=deadline)
+        if mode:
+            self._record_usage(mode, reply, cached)
+        return reply_text(reply)
+    
+    def _cascade(self, parts, mode, rule, deadline=None):
+        """
+        Try the models of a cascade rule in order until one gives an acceptable answer
+        
+        Args:
+            parts: User content parts
+            mode: Prompt mode (None for custom prompts)
+            rule: Cascade rule name (the mode, or "custom")
+            deadline: time.monotonic() by which the answer is needed; once it
+                      has passed, the answer so far is kept instead of escalating
+            
+        Returns:
+            Response text of the accepted (or last) model
+        """
+        # One request stays on the pool and chain it started with across a model swap
+        with self._lock:
+            pool, cascade = self.pool, self.cascade
+        chain = cascade.get(rule) or cascade['*']
+        stages = []
+        text, answered_by = '', None
+        
+        for index, model in enumerate(chain):
+            if text and deadline is not None and time.monotonic() >= deadline:
+                logger.info("Not escalating '%s' past %s: deadline reached", rule, stages[-1][0])
+                break
+            start = time.perf_counter()
+            try:
+                reply = self._generate(parts, mode=mode, model=model, deadline=deadline, pool=pool)
+            except PoolExhaustedError as e:
+                # Every member serving this model is down: move on to the next one
+                stages.append((model, time.perf_counter() - start, 'unavailable'))
+                if index < len(chain) - 1:
+                    logger.info("Escalating '%s' from %s (unavailable: %s)", rule, model, e)
+                    continue
+                if not text:
+                    raise
+                logger.warning("Escalating '%s' to %s failed, keeping %s's answer: %s",
+                               rule, model, answered_by, e)
+                break
+            except UpstreamError as e:
+                # Includes DeadlineExceededError; an earlier answer beats none
+                if not text:
+                    raise
+                stages.append((model, time.perf_counter() - start, 'failed'))
+                logger.warning("Escalating '%s' to %s failed, keeping %s's answer: %s",
+                               rule, model, answered_by, e)
+                break
+            
+            text, answered_by = reply, model
+            reason = escalation_reason(rule, text)
+            stages.append((model, time.perf_counter() - start, reason))
+            if reason is None:
+                break
+            if index < len(chain) - 1:
+                logger.info("Escalating '%s' from %s (%s)", rule, model, reason)
+        
+        self.cascade_stats.record(rule, stages, answered_by)
+        return text
+    
+    def get_cascade_stats(self):
+        """Escalation rate, per-model latency and estimated latency saved per mode"""
+        return self.cascade_stats.snapshot(self.cascade)
+    
+    def _record_usage(self, mode, response, cached):
+        """Accumulate token usage reported by the API for a mode"""
+        usage = response.get('usageMetadata')
+        with self._lock:
+            stats = self.token_stats.setdefault(mode, {
+                'requests': 0,
+                'prompt_tokens': 0,
+                'cached_tokens': 0,
+                'output_tokens': 0,
+                'prompt_cached': cached
+            })
+            stats['requests'] += 1
+            stats['prompt_cached'] = cached
+            if usage:
+                stats['prompt_tokens'] += usage.get('promptTokenCount', 0)
+                stats['cached_tokens'] += usage.get('cachedContentTokenCount', 0)
+                stats['output_tokens'] += usage.get('candidatesTokenCount', 0)
     
-    def analyze_image(self, image_path, mode="general"):
+    def get_token_stats(self):
+        """
+        Token usage per mode since startup
+        
+        Returns:
+            Dict of mode -> requests, prompt/cached/output token totals,
+            average prompt tokens per request and whether the prompt is cached
+        """
+        with self._lock:
+            result = {}
+            for mode, stats in self.token_stats.items():
+                entry = dict(stats)
+                requests = max(stats['requests'], 1)
+                entry['avg_prompt_tokens'] = round(stats['prompt_tokens'] / requests, 1)
+                entry['avg_uncached_prompt_tokens'] = round(
+                    (stats['prompt_tokens'] - stats['cached_tokens']) / requests, 1)
+                result[mode] = entry
+            return result
+    
+    def get_upstream_stats(self):
+        """Health, latency and breaker state of every upstream pool member"""
+        return self.pool.stats()
+    
+    def swap_models(self, models, cascade=None, drain_timeout=SWAP_DRAIN_TIMEOUT):
+        """
+        Switch to other Gemini models without a cold start
+        
+        The new pool members get their prompt caches created and each new
+        model answers a short request before traffic switches over; requests
+        already running finish on the old members, which are then dropped.
+        
+        Args:
+            models: Model names, first one the default
+            cascade: VISION_CASCADE-style spec (default: the current one's spec)
+            drain_timeout: Seconds to wait for requests on the old members
+            
+        Raises:
+            UpstreamError: a new model could not be reached (nothing switched)
+        """
+        pool = self.pool.with_models(models)
+        chains = parse_cascade(cascade if cascade is not None else os.getenv('VISION_CASCADE'),
+                               pool.models)
+        
+        added = [m for m in pool.members if m not in self.pool.members]
+        for member in added:
+            for mode in self.prompts:
+                self._session_fields(member, mode)
+        for model in dict.fromkeys(m.model for m in added):
+            pool.call(lambda member: member.generate({
+                'contents': [{'role': 'user', 'parts': [{'text': 'Reply with OK.'}]}],
+                'generationConfig': {'maxOutputTokens': 1}
+            }, timeout=10), model=model)
+        
+        with self._lock:
+            old, self.pool = self.pool, pool
+            self.cascade = chains
+            self.model_name = pool.models[0]
+        
+        retired = [m for m in old.members if m not in pool.members]
+        stop_at = time.monotonic() + drain_timeout
+        while any(m.in_flight for m in retired) and time.monotonic() < stop_at:
+            time.sleep(0.05)
+        logger.info("Switched to %s (%d member(s) retired)", ', '.join(pool.models), len(retired))
+        return pool.models
+    
+    def analyze_image(self, image_path, mode="general", instruction=None, deadline=None):
         """
         Analyze an image using the specified mode
         
         Args:
-            image_path: Path to the image file
+            image_path: Path to the image file (or raw encoded image bytes)
             mode: Analysis mode - "general", "text", or "hazard"
+            instruction: Per-request instruction replacing the mode's short
+                         default (the mode prompt still applies)
+            deadline: time.monotonic() by which the answer is needed
             
         Returns:
             String description of the image
+            
+        Raises:
+            DeadlineExceededError: no answer before the deadline
         """
         try:
             # Load and validate image
-            if not os.path.exists(image_path):
+            if isinstance(image_path, str) and not os.path.exists(image_path):
                 return "Error: Image file not found"
             
-            img = Image.open(image_path)
-            
-            # Get appropriate prompt
-            prompt = self.prompts.get(mode, self.prompts["general"])
+            if mode not in self.prompts:
+                mode = "general"
             
-            # Generate response
-            response = self.model.generate_content([prompt, img])
+            parts = [
+                {'text': instruction or self.instructions[mode]},
+                image_part(image_path, MAX_IMAGE_SIDE[mode])
+            ]
+            text = self._cascade(parts, mode, mode, deadline)
             
-            if response.text:
-                return response.text.strip()
+            if text:
+                return text.strip()
             else:
                 return "I couldn't generate a description for this image."
                 
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            logger.warning("Vision engine error: %s", e)
+            return f"Analysis failed: {str(e)}"
+    
+    def analyze_images(self, images, mode="general", summary=False, deadline=None):
+        """
+        Analyze several images in one multimodal request
+        
+        Args:
+            images: List of image paths or raw encoded image bytes
+            mode: Analysis mode - "general" or "text"
+            summary: Also ask for one summary covering all the images
+            deadline: time.monotonic() by which the answer is needed
+            
+        Returns:
+            Dict with 'descriptions' (one per image, in order) and 'summary'
+            (None unless requested). Images the answer did not cover are
+            analyzed one by one; past the deadline their description is None
+            and 'partial' is True.
+            
+        Raises:
+            DeadlineExceededError: nothing was answered before the deadline
+        """
+        if mode not in self.prompts:
+            mode = "general"
+        
+        instruction = (f"{self.instructions[mode]} There are {len(images)} images, numbered in "
+                       f"the order given. Answer for each one separately, starting each answer "
+                       f"with a line 'IMAGE <number>:'.")
+        if summary:
+            instruction += (" After the last answer, add a line 'SUMMARY:' with one or two "
+                            "sentences covering all the images together.")
+        
+        parts = [{'text': instruction}]
+        for number, image in enumerate(images, 1):
+            parts.append({'text': f"IMAGE {number}:"})
+            parts.append(image_part(image, MAX_IMAGE_SIDE[mode]))
+        
+        try:
+            text = self._cascade(parts, mode, mode, deadline)
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            logger.warning("Batch analysis failed, analyzing images one by one: %s", e)
+            text = ''
+        
+        sections = {}
+        markers = list(BATCH_MARKER_RE.finditer(text))
+        for marker, following in zip(markers, markers[1:] + [None]):
+            body = text[marker.end():following.start() if following else len(text)].strip()
+            key = int(marker.group(2)) if marker.group(2) else 'summary'
+            if body:
+                sections[key] = body
+        
+        missing = [n for n in range(1, len(images) + 1) if n not in sections]
+        if missing:
+            logger.info("Batch answer covered %d of %d images", len(images) - len(missing), len(images))
+        descriptions = []
+        for n in range(1, len(images) + 1):
+            try:
+                descriptions.append(sections.get(n) or self.analyze_image(images[n - 1], mode,
+                                                                          deadline=deadline))
+            except DeadlineExceededError:
+                descriptions.append(None)
+        partial = None in descriptions
+        
+        merged = None
+        if summary:
+            merged = sections.get('summary')
+            if merged is None and not partial:
+                merged = self.summarize(descriptions, deadline)
+        return {'descriptions': descriptions, 'summary': merged, 'partial': partial}
+    
+    def summarize(self, descriptions, deadline=None):
+        """
+        Merge several image descriptions into one short summary (text only)
+        
+        Args:
+            descriptions: Descriptions in capture order
+            deadline: time.monotonic() by which the answer is needed
+            
+        Returns:
+            Summary string
+        """
+        listed = '\n'.join(f"{number}. {text}" for number, text in enumerate(descriptions, 1))
+        try:
+            text = self._cascade([{'text': SUMMARY_PROMPT.format(count=len(descriptions),
+                                                                descriptions=listed)}],
+                                 None, "summary", deadline)
+            return text.strip() if text else "No summary generated"
+        except DeadlineExceededError:
+            raise
+        except Exception as e:
+            return f"Summary failed: {str(e)}"
+    
+    def describe_changes(self, image_path, context, deadline=None):
+        """
+        Narrate only what changed in a scene described earlier
+        
+        Args:
+            image_path: Path or bytes of the changed region (or whole frame)
+            context: The earlier description of the scene
+            deadline: time.monotonic() by which the answer is needed
+            
+        Returns:
+            Short description of the differences
+        """
+        try:
+            parts = [
+                {'text': CHANGES_PROMPT.format(context=context)},
+                image_part(image_path, MAX_IMAGE_SIDE["general"])
+            ]
+            text = self._cascade(parts, None, "changes", deadline)
+            return text.strip() if text else "No response generated"
+        except DeadlineExceededError:
+            raise
         except Exception as e:
-            print(f"Vision engine error: {e}")
             return f"Analysis failed: {str(e)}"
     
-    def analyze_with_custom_prompt(self, image_path, custom_prompt):
+    def analyze_with_custom_prompt(self, image_path, custom_prompt, deadline=None):
         """
         Analyze an image with a custom prompt
         
         Args:
-            image_path: Path to the image file
+            image_path: Path to the image file (or raw encoded image bytes)
             custom_prompt: Custom prompt for the analysis
+            deadline: time.monotonic() by which the answer is needed
             
         Returns:
             String description of the image
         """
         try:
-            img = Image.open(image_path)
-            response = self.model.generate_content([custom_prompt, img])
-            return response.text.strip() if response.text else "No response generated"
+            parts = [
+                {'text': custom_prompt},
+                image_part(image_path, MAX_IMAGE_SIDE["general"])
+            ]
+            text = self._cascade(parts, None, "custom", deadline)
+            return text.strip() if text else "No response generated"
+        except DeadlineExceededError:
+            raise
         except Exception as e:
-            return f"Analysis failed: {str(e)}"
\ No newline at end of file
+            return f"Analysis failed: {str(e)}"
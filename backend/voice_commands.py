@@ -0,0 +1,63 @@
+"""
+Spoken command routing for /api/ask
+Maps a transcribed command to a VisualAssistant mode, using the same keywords
+as the web app's VoiceControl. A real question ("what colour is this shirt?")
+becomes a custom prompt instead of a generic description.
+"""
+
+import re
+
+HAZARD_WORDS = ('danger', 'hazard', 'safe', 'obstacle')
+TEXT_WORDS = ('read', 'text', 'sign', 'label')
+GENERAL_PHRASES = ('analyze', 'analyse', 'look', 'see', 'what', 'check', 'scan', 'describe', 'tell me')
+
+# Words that carry no question of their own ("what do you see in front of me")
+FILLER_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'do', 'does', 'you', 'i', 'me', 'my', 'can', 'could',
+    'please', 'this', 'that', 'there', 'here', 'it', 'in', 'front', 'of', 'at', 'around',
+    'now', 'hey', 'ok', 'okay', 'tell', 'whats', "what's", 'going', 'on', 'to', 'for', 'us',
+    'image', 'picture', 'scene', 'camera', 'view', 'room', 'again', 'just', 'quickly',
+}
+
+CUSTOM_PROMPT = (
+    'The user, who is blind or has low vision, asked: "{question}"\n'
+    'Answer the question about this image directly in one or two short sentences '
+    'that can be read aloud. If the image does not show the answer, say so.'
+)
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _contains(text, words):
+    """Whole-word match, allowing common endings (signs, reading, dangerous)"""
+    return any(re.search(r'\b' + re.escape(word) + r'(s|es|ing|ous|ly|ty)?\b', text) for word in words)
+
+
+def route_command(command, default_mode='general'):
+    """
+    Decide how to answer a spoken command
+
+    Args:
+        command: Transcribed command text
+        default_mode: Mode used when the command is empty or a plain "describe"
+
+    Returns:
+        (mode, prompt): prompt is None for a standard mode, otherwise the
+        custom prompt for analyze_with_custom_prompt (mode is then 'custom')
+    """
+    text = (command or '').lower().strip()
+    if not text:
+        return default_mode, None
+
+    if _contains(text, HAZARD_WORDS):
+        return 'hazard', None
+    if _contains(text, TEXT_WORDS):
+        return 'text', None
+
+    words = _WORD_RE.findall(text)
+    general = [w for w in words if any(w.startswith(p) for p in GENERAL_PHRASES if ' ' not in p)]
+    content = [w for w in words if w not in FILLER_WORDS and w not in general]
+    if general and not content:
+        return default_mode, None
+
+    return 'custom', CUSTOM_PROMPT.format(question=command.strip())
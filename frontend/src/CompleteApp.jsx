@@ -108,15 +108,17 @@ export default function App() {
         setCurrentDescription(result.description);
         speak(result.description);
         
-        // Add to history
-        await api.addHistory(user.email, {
-          type: 'vision',
-          mode: analysisMode,
-          result: result.description
-        });
-        
-        // Reload history
-        loadHistory(user.email);
+        // Frames rejected by the quality gate only get a hint, not a history entry
+        if (!result.skipped) {
+          await api.addHistory(user.email, {
+            type: 'vision',
+            mode: analysisMode,
+            result: result.description
+          });
+          
+          // Reload history
+          loadHistory(user.email);
+        }
       } else {
         speak('Analysis failed. Please try again.');
       }
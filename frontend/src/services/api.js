@@ -76,6 +76,37 @@ export const api = {
     return response.json();
   },
 
+  // entries: [{ email, entry, idempotency_key }] applied in order in one request
+  addHistoryBatch: async (entries, batchId = null) => {
+    const response = await fetch(`${API_BASE_URL}/history/add-batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        batch_id: batchId,
+        entries
+      })
+    });
+    return response.json();
+  },
+
+  // filters: { mode, type, date_from, date_to, limit }
+  searchHistory: async (email, query, filters = {}) => {
+    const response = await fetch(`${API_BASE_URL}/history/search`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        email,
+        query,
+        ...filters
+      })
+    });
+    return response.json();
+  },
+
   clearHistory: async (email) => {
     const response = await fetch(`${API_BASE_URL}/history/clear`, {
       method: 'POST',
@@ -89,10 +120,22 @@ export const api = {
 
   // ==================== VISION ANALYSIS ====================
 
-  analyzeImage: async (imageBlob, mode = 'general') => {
+  // priority: 'emergency' | 'command' | 'routine' (hazard mode is always served first)
+  // mode 'changes' narrates only what changed since the last call with the same sessionId
+  // deadlineMs: how long the caller will wait; the server gives up (504) after that
+  analyzeImage: async (imageBlob, mode = 'general', priority = null, sessionId = null, deadlineMs = null) => {
     const formData = new FormData();
     formData.append('image', imageBlob, 'capture.jpg');
     formData.append('mode', mode);
+    if (priority) {
+      formData.append('priority', priority);
+    }
+    if (sessionId) {
+      formData.append('session_id', sessionId);
+    }
+    if (deadlineMs) {
+      formData.append('deadline_ms', deadlineMs);
+    }
 
     const response = await fetch(`${API_BASE_URL}/analyze`, {
       method: 'POST',
@@ -101,11 +144,36 @@ export const api = {
     return response.json();
   },
 
+  // Several images in one call; strategy: 'parallel' (one analysis per image)
+  // or 'single' (one multimodal request). Returns { results, summary }
+  analyzeBatch: async (imageBlobs, mode = 'general', { strategy = 'parallel', summary = false } = {}) => {
+    const formData = new FormData();
+    imageBlobs.forEach((blob, index) => {
+      formData.append('image', blob, `capture-${index}.jpg`);
+    });
+    formData.append('mode', mode);
+    formData.append('strategy', strategy);
+    formData.append('summary', summary ? 'true' : 'false');
+
+    const response = await fetch(`${API_BASE_URL}/analyze/batch`, {
+      method: 'POST',
+      body: formData
+    });
+    return response.json();
+  },
+
   // ==================== SPEECH TRANSCRIPTION ====================
 
-  transcribeAudio: async (audioBlob) => {
+  // deadlineMs: past it the server returns what was transcribed so far ({ partial: true })
+  transcribeAudio: async (audioBlob, priority = null, deadlineMs = null) => {
     const formData = new FormData();
     formData.append('audio', audioBlob, 'audio.webm');
+    if (priority) {
+      formData.append('priority', priority);
+    }
+    if (deadlineMs) {
+      formData.append('deadline_ms', deadlineMs);
+    }
 
     const response = await fetch(`${API_BASE_URL}/transcribe`, {
       method: 'POST',
@@ -114,6 +182,22 @@ export const api = {
     return response.json();
   },
 
+  // ==================== VOICE + VISION ====================
+
+  // Spoken command and current frame in one request; returns { command, description, mode }
+  ask: async (audioBlob, imageBlob, mode = 'general') => {
+    const formData = new FormData();
+    formData.append('audio', audioBlob, 'audio.webm');
+    formData.append('image', imageBlob, 'capture.jpg');
+    formData.append('mode', mode);
+
+    const response = await fetch(`${API_BASE_URL}/ask`, {
+      method: 'POST',
+      body: formData
+    });
+    return response.json();
+  },
+
   // ==================== HEALTH CHECK ====================
 
   healthCheck: async () => {